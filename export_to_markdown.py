@@ -5,7 +5,6 @@
 """
 import os
 import sys
-import time
 import re
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
@@ -17,24 +16,35 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from src.weread_api import (
     initialize_api,
     get_notebooklist,
-    get_bookmark_list,
-    get_chapter_info,
-    get_bookinfo,
-    get_review_list
+    get_chapter_infos,
+    set_request_rate
 )
+from src.book_fetcher import BookPrefetcher, fetch_book_data, books_missing_chapters
+from src.response_cache import BookResponseCache
+from src.chapter_index import ChapterIndex
+from src.logseq_page import LogseqPage
+from src.config_manager import config, ConfigSnapshot, load_environment
 
 
 class WeReadExporter:
     """微信读书笔记导出器"""
 
-    def __init__(self, output_dir: str = "exported_notes"):
+    def __init__(
+        self,
+        output_dir: str = "exported_notes",
+        use_cache: bool = True,
+        settings: Optional[ConfigSnapshot] = None
+    ):
         """
         初始化导出器
         
         Args:
             output_dir: 导出目录，默认为 exported_notes
+            use_cache: 是否使用本地 API 响应缓存
+            settings: 配置快照，默认使用启动时解析好的全局配置
         """
         self.output_dir = output_dir
+        self.settings = settings or config.snapshot
         
         # 创建输出目录
         if not os.path.exists(output_dir):
@@ -52,13 +62,20 @@ class WeReadExporter:
                 "参考文档：docs/COOKIE_GUIDE.md"
             )
         print("✅ API 初始化成功\n")
+        
+        # 并发预取线程数和全局请求速率
+        self.fetch_workers = self.settings.fetch_workers
+        set_request_rate(*self.settings.weread_rate_limit)
+        
+        # 本地 API 响应缓存（书籍没有变化时不再请求）
+        self.response_cache = None
+        if use_cache and self.settings.cache_enabled:
+            self.response_cache = BookResponseCache(self.settings.cache_dir)
 
-    def get_chapter_name(self, chapters: List[Dict], chapter_uid: int) -> str:
-        """根据章节 UID 获取章节名称"""
-        for chapter in chapters:
-            if chapter.get("chapterUid") == chapter_uid:
-                return chapter.get("title", "未知章节")
-        return "未知章节"
+    def close(self):
+        """关闭本地响应缓存"""
+        if self.response_cache is not None:
+            self.response_cache.close()
 
     def sanitize_filename(self, name: str) -> str:
         """清理文件名，移除不合法字符"""
@@ -113,64 +130,6 @@ class WeReadExporter:
         cleaned = re.sub(r'^\[.*?\]', '', author).strip()
         return cleaned if cleaned else author
 
-    def extract_existing_ids(self, filepath: str) -> tuple:
-        """
-        从现有文件中提取已存在的划线ID和想法ID
-        
-        Returns:
-            (set of 划线id, set of 想法id)
-        """
-        highlight_ids = set()
-        thought_ids = set()
-        
-        if not os.path.exists(filepath):
-            return highlight_ids, thought_ids
-        
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 提取划线ID: 划线id:: xxx
-            for match in re.finditer(r'划线id::\s*(\S+)', content):
-                highlight_ids.add(match.group(1))
-            
-            # 提取想法ID: 想法id:: xxx
-            for match in re.finditer(r'想法id::\s*(\S+)', content):
-                thought_ids.add(match.group(1))
-                
-        except Exception as e:
-            print(f"   ⚠️ 读取现有文件失败: {e}")
-        
-        return highlight_ids, thought_ids
-
-    def find_chapter_insert_position(self, content: str, chapter_name: str) -> int:
-        """
-        在现有内容中找到指定章节的插入位置（章节末尾）
-        
-        Returns:
-            插入位置的字符索引，如果找不到章节返回 -1
-        """
-        # 查找章节标题
-        pattern = rf'\t- {re.escape(chapter_name)}\n\t  heading:: true'
-        match = re.search(pattern, content)
-        if not match:
-            return -1
-        
-        # 从章节开始位置向后查找，找到下一个同级章节或笔记结束
-        start_pos = match.end()
-        
-        # 查找下一个章节（以 \t- 开头且有 heading:: true）
-        next_chapter = re.search(r'\n\t- [^\n]+\n\t  heading:: true', content[start_pos:])
-        if next_chapter:
-            return start_pos + next_chapter.start()
-        
-        # 如果没有下一个章节，找到文件末尾的 -
-        end_marker = content.rfind('\n-')
-        if end_marker > start_pos:
-            return end_marker
-        
-        return len(content)
-
     def get_category_name(self, categories: List[Dict]) -> str:
         """从分类列表中获取分类名称"""
         if not categories:
@@ -184,13 +143,19 @@ class WeReadExporter:
             return f"{parts[0]}-{parts[-1]}"
         return title
 
-    def export_book(self, book: Dict, merge: bool = False) -> Optional[str]:
+    def export_book(
+        self,
+        book: Dict,
+        merge: bool = False,
+        data: Optional[Dict] = None
+    ) -> Optional[str]:
         """
         导出单本书的笔记
         
         Args:
             book: 书籍信息
             merge: 是否增量合并（只添加新内容）
+            data: 预取的书籍数据（见 fetch_book_data），不提供则当场拉取
             
         Returns:
             导出的文件路径，失败返回 None
@@ -202,8 +167,18 @@ class WeReadExporter:
         
         print(f"\n📚 正在处理: 《{book_title}》- {author}")
         
-        # 获取完整的书籍信息（包含简介、ISBN等）
-        full_book_info = get_bookinfo(book_id)
+        # 获取书籍数据（划线、章节、笔记、书籍信息）
+        if data is None:
+            data = fetch_book_data(book, cache=self.response_cache)
+        
+        # 划线列表
+        bookmarks = data["bookmarks"]
+        if not bookmarks:
+            print(f"   ⚠️ 没有划线数据，跳过")
+            return None
+        
+        # 完整的书籍信息（包含简介、ISBN等）
+        full_book_info = data["book_info"]
         if full_book_info:
             print(f"   ✓ 获取到书籍详情")
         else:
@@ -213,19 +188,13 @@ class WeReadExporter:
         if "bookId" not in full_book_info:
             full_book_info["bookId"] = book_id
         
-        # 获取划线列表
-        bookmarks = get_bookmark_list(book_id)
-        if not bookmarks:
-            print(f"   ⚠️ 没有划线数据，跳过")
-            return None
-        
         print(f"   ✓ 获取到 {len(bookmarks)} 条划线")
         
-        # 获取章节信息
-        chapters = get_chapter_info(book_id)
+        # 章节索引
+        chapter_index = data["chapter_index"]
         
-        # 获取笔记（想法）- 包含所有评论
-        reviews = get_review_list(book_id)
+        # 笔记（想法）- 包含所有评论
+        reviews = data["reviews"]
         review_map = {}  # bookmark_id -> review_content（用于关联划线的评论）
         thoughts_with_abstract = []  # 有原文的想法（abstract + content）
         book_reviews = []  # 书评（type=4，没有原文）
@@ -273,7 +242,13 @@ class WeReadExporter:
         
         # 如果是增量合并模式
         if merge and os.path.exists(filepath):
-            existing_highlight_ids, existing_thought_ids = self.extract_existing_ids(filepath)
+            # 现有页面只读取、解析一次：已有 ID 和章节位置都来自同一个页面模型
+            try:
+                page = LogseqPage.load(filepath)
+            except Exception as e:
+                print(f"   ⚠️ 读取现有文件失败: {e}")
+                return None
+            existing_highlight_ids, existing_thought_ids = page.highlight_ids, page.thought_ids
             print(f"   ✓ 发现现有文件，已有 {len(existing_highlight_ids)} 条划线，{len(existing_thought_ids)} 条想法")
             
             # 过滤出新的划线和想法
@@ -283,7 +258,6 @@ class WeReadExporter:
             # 生成新内容（只包含新的划线和想法）
             new_content = self._generate_incremental_content(
                 book_id=book_id,
-                chapters=chapters,
                 chapter_bookmarks=chapter_bookmarks,
                 review_map=review_map,
                 thoughts_with_abstract=thoughts_with_abstract,
@@ -292,15 +266,11 @@ class WeReadExporter:
             )
             
             if new_content["highlights"] or new_content["thoughts"]:
-                # 读取现有文件
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    existing_content = f.read()
-                
                 # 追加新内容到对应章节
-                updated_content = self._merge_content(existing_content, new_content, chapters)
+                self._merge_content(page, new_content, chapter_index)
                 
                 with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(updated_content)
+                    f.write(page.render())
                 
                 print(f"   ✅ 增量更新: 新增 {new_content['new_highlights_count']} 条划线，{new_content['new_thoughts_count']} 条想法")
             else:
@@ -311,7 +281,7 @@ class WeReadExporter:
         # 全量导出模式
         md_content = self._generate_markdown(
             book_info=full_book_info,
-            chapters=chapters,
+            chapter_index=chapter_index,
             chapter_bookmarks=chapter_bookmarks,
             review_map=review_map,
             thoughts_with_abstract=thoughts_with_abstract,
@@ -327,7 +297,7 @@ class WeReadExporter:
     def _generate_markdown(
         self,
         book_info: Dict,
-        chapters: List[Dict],
+        chapter_index: ChapterIndex,
         chapter_bookmarks: Dict[int, List[Dict]],
         review_map: Dict[str, str],
         thoughts_with_abstract: List[Dict] = None,
@@ -420,19 +390,9 @@ class WeReadExporter:
         lines.append("  heading:: true")
         lines.append("  部分:: 笔记")
         
-        # 创建章节 UID 到信息的映射
-        chapter_map = {ch.get("chapterUid"): ch for ch in chapters}
-        
-        # 获取所有有划线的章节，并按原书顺序排序
+        # 获取所有有划线的章节
         chapter_uids_with_bookmarks = list(chapter_bookmarks.keys())
         
-        # 尝试按章节索引排序
-        def get_chapter_index(uid):
-            ch = chapter_map.get(uid, {})
-            return ch.get("chapterIdx", uid)
-        
-        chapter_uids_with_bookmarks.sort(key=get_chapter_index)
-        
         # 将有原文的想法按章节组织
         thoughts_by_chapter = defaultdict(list)
         if thoughts_with_abstract:
@@ -444,7 +404,8 @@ class WeReadExporter:
         all_chapter_uids = set(chapter_uids_with_bookmarks)
         all_chapter_uids.update(thoughts_by_chapter.keys())
         all_chapter_uids = list(all_chapter_uids)
-        all_chapter_uids.sort(key=get_chapter_index)
+        # 按原书章节顺序排序
+        all_chapter_uids.sort(key=chapter_index.sort_key)
         
         for chapter_uid in all_chapter_uids:
             bookmarks = chapter_bookmarks.get(chapter_uid, [])
@@ -454,7 +415,7 @@ class WeReadExporter:
             if not bookmarks and not chapter_thoughts:
                 continue
             
-            chapter_name = self.get_chapter_name(chapters, chapter_uid)
+            chapter_name = chapter_index.get_title(chapter_uid)
             
             # 章节标题（作为笔记的子项）
             lines.append(f"\t- {chapter_name}")
@@ -524,7 +485,6 @@ class WeReadExporter:
     def _generate_incremental_content(
         self,
         book_id: str,
-        chapters: List[Dict],
         chapter_bookmarks: Dict[int, List[Dict]],
         review_map: Dict[str, str],
         thoughts_with_abstract: List[Dict],
@@ -544,9 +504,6 @@ class WeReadExporter:
             "new_thoughts_count": 0
         }
         
-        # 创建章节映射
-        chapter_map = {ch.get("chapterUid"): ch for ch in chapters}
-        
         # 处理划线
         for chapter_uid, bookmarks in chapter_bookmarks.items():
             bookmarks.sort(key=lambda x: x.get("createTime", 0))
@@ -627,71 +584,24 @@ class WeReadExporter:
         
         return result
 
-    def _merge_content(self, existing_content: str, new_content: Dict, chapters: List[Dict]) -> str:
+    def _merge_content(self, page: LogseqPage, new_content: Dict, chapter_index: ChapterIndex):
         """
-        将新内容合并到现有文件中
+        将新内容合并到已解析的页面中
+        
+        已有章节的新划线和想法追加到章节末尾；新章节按原书顺序添加到笔记部分末尾
         
         Args:
-            existing_content: 现有文件内容
+            page: 现有页面
             new_content: 新增内容（按章节组织）
-            chapters: 章节信息列表
-        
-        Returns:
-            合并后的内容
+            chapter_index: 章节索引
         """
-        result = existing_content
-        
-        # 创建章节映射
-        chapter_map = {ch.get("chapterUid"): ch.get("title", "未知章节") for ch in chapters}
-        
-        # 合并所有有新内容的章节
         all_chapter_uids = set(new_content["highlights"].keys())
         all_chapter_uids.update(new_content["thoughts"].keys())
         
-        for chapter_uid in all_chapter_uids:
-            chapter_name = chapter_map.get(chapter_uid, "未知章节")
+        for chapter_uid in sorted(all_chapter_uids, key=chapter_index.sort_key):
             highlights = new_content["highlights"].get(chapter_uid, [])
             thoughts = new_content["thoughts"].get(chapter_uid, [])
-            
-            if not highlights and not thoughts:
-                continue
-            
-            # 构建要插入的内容
-            insert_content = ""
-            for h in highlights:
-                insert_content += h + "\n"
-            for t in thoughts:
-                insert_content += t + "\n"
-            
-            # 查找章节位置
-            # 先尝试精确匹配章节标题
-            chapter_pattern = rf'(\t- {re.escape(chapter_name)}\n\t  heading:: true\n)'
-            match = re.search(chapter_pattern, result)
-            
-            if match:
-                # 找到章节，在章节内容末尾插入
-                # 查找下一个章节或笔记块结束位置
-                start_pos = match.end()
-                
-                # 查找下一个同级章节
-                next_chapter = re.search(r'\n\t- [^\n]+\n\t  heading:: true', result[start_pos:])
-                if next_chapter:
-                    insert_pos = start_pos + next_chapter.start()
-                else:
-                    # 没有下一个章节，找到结尾的 -
-                    end_marker = result.rfind('\n-')
-                    insert_pos = end_marker if end_marker > start_pos else len(result)
-                
-                result = result[:insert_pos] + insert_content + result[insert_pos:]
-            else:
-                # 章节不存在，需要创建新章节
-                # 在 [[笔记]] 块的末尾添加新章节
-                end_marker = result.rfind('\n-')
-                if end_marker > 0:
-                    new_chapter = f"\t- {chapter_name}\n\t  heading:: true\n{insert_content}"
-                    result = result[:end_marker] + new_chapter + result[end_marker:]
-        
-        return result
+            page.add_blocks(chapter_index.get_title(chapter_uid), highlights + thoughts)
 
     def export_by_title(self, title_keyword: str, merge: bool = False) -> Optional[str]:
         """
@@ -768,21 +678,35 @@ class WeReadExporter:
         
         print(f"✅ 找到 {len(books)} 本有笔记的书籍\n")
         
+        # 批量预取章节信息（已有缓存的书籍跳过）
+        chapters_by_book = get_chapter_infos(
+            [book.get("bookId") for book in books_missing_chapters(books, self.response_cache)]
+        )
+        
         exported_files = []
         failed_books = []
         
-        for i, book in enumerate(books, 1):
+        # 后台并发拉取后续书籍的数据，这里按顺序逐本写入
+        prefetcher = BookPrefetcher(
+            lambda book: fetch_book_data(
+                book,
+                chapters=chapters_by_book.get(str(book.get("bookId"))),
+                cache=self.response_cache
+            ),
+            max_workers=self.fetch_workers
+        )
+        
+        for i, (book, data, fetch_error) in enumerate(prefetcher.iter_books(books), 1):
             book_title = book.get("book", {}).get("title", "未知")
             print(f"\n[{i}/{len(books)}] 处理中...")
             
             try:
-                filepath = self.export_book(book, merge=merge)
+                if fetch_error is not None:
+                    raise fetch_error
+                
+                filepath = self.export_book(book, merge=merge, data=data)
                 if filepath:
                     exported_files.append(filepath)
-                
-                # 添加延迟，避免请求过快
-                if i < len(books):
-                    time.sleep(1)
                     
             except Exception as e:
                 print(f"   ❌ 导出失败: {e}")
@@ -845,10 +769,25 @@ class WeReadExporter:
         
         all_content.append("\n---\n")
         
+        # 批量预取章节信息（已有缓存的书籍跳过）
+        chapters_by_book = get_chapter_infos(
+            [book.get("bookId") for book in books_missing_chapters(books, self.response_cache)]
+        )
+        
         total_bookmarks = 0
         
-        for i, book in enumerate(books, 1):
-            book_id = book.get("bookId")
+        # 后台并发拉取后续书籍的数据（合并模式不需要书籍详情）
+        prefetcher = BookPrefetcher(
+            lambda book: fetch_book_data(
+                book,
+                chapters=chapters_by_book.get(str(book.get("bookId"))),
+                with_book_info=False,
+                cache=self.response_cache
+            ),
+            max_workers=self.fetch_workers
+        )
+        
+        for i, (book, data, fetch_error) in enumerate(prefetcher.iter_books(books), 1):
             book_info = book.get("book", {})
             book_title = book_info.get("title", "未知书名")
             author = book_info.get("author", "未知作者")
@@ -856,13 +795,16 @@ class WeReadExporter:
             print(f"[{i}/{len(books)}] 处理: 《{book_title}》")
             
             try:
+                if fetch_error is not None:
+                    raise fetch_error
+                
                 # 获取数据
-                bookmarks = get_bookmark_list(book_id)
+                bookmarks = data["bookmarks"]
                 if not bookmarks:
                     continue
                 
-                chapters = get_chapter_info(book_id)
-                reviews = get_review_list(book_id)
+                chapter_index = data["chapter_index"]
+                reviews = data["reviews"]
                 
                 review_map = {r.get("bookmarkId"): r.get("content", "") for r in reviews if r.get("bookmarkId")}
                 
@@ -882,12 +824,9 @@ class WeReadExporter:
                 all_content.append("\n---\n")
                 
                 # 按章节输出
-                chapter_map = {ch.get("chapterUid"): ch for ch in chapters}
-                
-                for chapter_uid in sorted(chapter_bookmarks.keys(), 
-                                          key=lambda x: chapter_map.get(x, {}).get("chapterIdx", x)):
+                for chapter_uid in sorted(chapter_bookmarks.keys(), key=chapter_index.sort_key):
                     bms = chapter_bookmarks[chapter_uid]
-                    chapter_name = self.get_chapter_name(chapters, chapter_uid)
+                    chapter_name = chapter_index.get_title(chapter_uid)
                     
                     all_content.append(f"\n## {chapter_name}\n")
                     
@@ -905,10 +844,6 @@ class WeReadExporter:
                         all_content.append("\n")
                 
                 all_content.append("\n---\n")
-                
-                # 延迟
-                if i < len(books):
-                    time.sleep(1)
                     
             except Exception as e:
                 print(f"   ❌ 处理失败: {e}")
@@ -979,10 +914,18 @@ def main():
         help="增量合并模式：只添加新的划线和想法，保留现有内容"
     )
     
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="忽略本地 API 响应缓存，重新获取所有书籍数据"
+    )
+    
     args = parser.parse_args()
+    load_environment()
     
+    exporter = None
     try:
-        exporter = WeReadExporter(output_dir=args.output)
+        exporter = WeReadExporter(output_dir=args.output, use_cache=not args.no_cache)
         
         if args.book:
             # 只导出指定书籍
@@ -999,6 +942,9 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        if exporter is not None:
+            exporter.close()
 
 
 if __name__ == "__main__":
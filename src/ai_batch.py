@@ -0,0 +1,343 @@
+"""
+AI 批量处理
+把同一本书的多条划线放进一次请求，同时生成标签和摘要，
+按序号把结果对应回每条划线；返回格式不正确时可回退为逐条调用
+"""
+import json
+import re
+import threading
+import requests
+from concurrent.futures import Executor
+from typing import Dict, List, Optional
+from .rate_limiter import rate_limiter
+from .ai_cache import ai_cache_key
+from .ai_tags import AITagGenerator
+from .ai_summary import AISummaryGenerator
+
+# 默认的批量提示词（可通过 ai.batch_prompt 覆盖）
+DEFAULT_BATCH_PROMPT = """请为《{book_title}》（{author}）中的以下 {count} 条划线分别生成标签和摘要。
+
+{requirements}
+
+只返回 JSON，不要其他内容，格式如下：
+{{"results": [{{"index": 0, "tags": ["#标签"], "summary": ""}}]}}
+每条划线对应一个结果，index 为划线前方括号中的序号。
+
+划线列表：
+{items}
+"""
+
+# 批量请求中的标签要求
+BATCH_TAG_REQUIREMENT = (
+    "标签要求（只为标记了“标签”的划线生成，其余 tags 为空数组）：\n"
+    "每条 1-3 个主题标签，简洁准确、体现核心主题，优先使用中文，每个标签以#开头。"
+)
+
+
+class AIBatchEnricher:
+    """批量生成 AI 标签和摘要"""
+
+    def __init__(
+        self,
+        tag_generator: AITagGenerator,
+        summary_generator: AISummaryGenerator,
+        batch_size: int = 5,
+        fallback: bool = True
+    ):
+        """
+        初始化批量处理器
+
+        Args:
+            tag_generator: AI 标签生成器（复用其接口配置和缓存）
+            summary_generator: AI 摘要生成器（复用其接口配置和缓存）
+            batch_size: 每次请求包含的划线数，小于 2 时逐条调用
+            fallback: 批量结果缺失或格式不正确时是否逐条调用补齐
+        """
+        self.tag_generator = tag_generator
+        self.summary_generator = summary_generator
+        self.batch_size = batch_size
+        self.fallback = fallback
+
+        self.api_key = summary_generator.api_key
+        self.api_base = summary_generator.api_base
+        self.model = summary_generator.model
+        # 空缓存的 len() 为 0，不能用 or 判断
+        self.cache = summary_generator.cache if summary_generator.cache is not None else tag_generator.cache
+        self.settings = summary_generator.settings
+
+        # 批量请求次数和回退为逐条调用的划线数
+        self.batch_requests = 0
+        self.fallback_items = 0
+        self._counter_lock = threading.Lock()
+
+    def _tags_via_api(self) -> bool:
+        """标签是否需要调用 AI 接口"""
+        return (
+            self.tag_generator.is_enabled()
+            and self.tag_generator.provider == 'openai'
+            and bool(self.tag_generator.api_key)
+        )
+
+    def is_enabled(self) -> bool:
+        """是否启用批量处理"""
+        return (
+            self.batch_size > 1
+            and bool(self.api_key)
+            and (self._tags_via_api() or self.summary_generator.is_enabled())
+        )
+
+    def enrich(
+        self,
+        book_title: str,
+        author: str,
+        texts: List[str],
+        executor: Optional[Executor] = None
+    ) -> List[Dict]:
+        """
+        为同一本书的多条划线生成标签和摘要
+
+        Args:
+            book_title: 书名
+            author: 作者
+            texts: 划线内容列表
+            executor: 提供时各批请求并发发送，否则依次发送
+
+        Returns:
+            与 texts 一一对应的结果列表，每项包含 ai_tags 和 ai_summary
+        """
+        results = [{"ai_tags": [], "ai_summary": None} for _ in texts]
+        tags_via_api = self._tags_via_api()
+
+        # 先处理不需要接口的部分（本地规则标签、缓存命中），剩余的放入批量请求；
+        # 逐条调用的结果来自配置的提示词，可以直接使用，批量结果只在自己的命名空间中查找
+        pending = []
+        for i, text in enumerate(texts):
+            need_tags = False
+            if tags_via_api:
+                cached = self._cache_lookup(
+                    self.tag_generator.cache_key(book_title, text),
+                    self._batch_cache_key('tags', book_title, text)
+                )
+                if cached is None:
+                    need_tags = True
+                else:
+                    results[i]["ai_tags"] = cached
+            elif self.tag_generator.is_enabled():
+                results[i]["ai_tags"] = self.tag_generator.generate_tags(book_title, author, text)
+
+            need_summary = False
+            if self.summary_generator.should_summarize(text):
+                cached = self._cache_lookup(
+                    self.summary_generator.cache_key(book_title, text),
+                    self._batch_cache_key('summary', book_title, text)
+                )
+                if cached is None:
+                    need_summary = True
+                else:
+                    results[i]["ai_summary"] = cached
+
+            if need_tags or need_summary:
+                pending.append((i, need_tags, need_summary))
+
+        batches = [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+        if executor is not None and len(batches) > 1:
+            # 各批写入 results 中互不重叠的位置，可以并发处理
+            list(executor.map(lambda batch: self._process_batch(book_title, author, texts, batch, results), batches))
+        else:
+            for batch in batches:
+                self._process_batch(book_title, author, texts, batch, results)
+
+        return results
+
+    def _process_batch(
+        self,
+        book_title: str,
+        author: str,
+        texts: List[str],
+        batch: List[tuple],
+        results: List[Dict]
+    ):
+        """发送一批划线并把结果写回 results（缺失的按配置逐条补齐）"""
+        answered = self._request_batch(book_title, author, texts, batch)
+
+        for i, need_tags, need_summary in batch:
+            answer = answered.get(i) or {}
+            tags = answer.get("tags") if need_tags else None
+            summary = answer.get("summary") if need_summary else None
+            if tags:
+                results[i]["ai_tags"] = tags
+                self._cache_set(self._batch_cache_key('tags', book_title, texts[i]), tags)
+            if summary:
+                results[i]["ai_summary"] = summary
+                self._cache_set(self._batch_cache_key('summary', book_title, texts[i]), summary)
+
+            # 模型漏掉这条划线，或返回了空的标签/摘要，都按缺失处理
+            missing_tags = need_tags and not tags
+            missing_summary = need_summary and not summary
+            if self.fallback and (missing_tags or missing_summary):
+                with self._counter_lock:
+                    self.fallback_items += 1
+                if missing_tags:
+                    results[i]["ai_tags"] = self.tag_generator.generate_tags(book_title, author, texts[i])
+                if missing_summary:
+                    results[i]["ai_summary"] = self.summary_generator.generate_summary(
+                        texts[i], book_title, author
+                    )
+
+    def _request_batch(
+        self,
+        book_title: str,
+        author: str,
+        texts: List[str],
+        batch: List[tuple]
+    ) -> Dict[int, Dict]:
+        """
+        发送一次批量请求
+
+        Returns:
+            划线序号 -> {"tags": [...], "summary": str}；请求失败或格式不正确时返回空字典
+        """
+        try:
+            content = self._call_api(self._build_prompt(book_title, author, texts, batch), len(batch))
+            answered = self._parse_results(content, {i for i, _, _ in batch})
+        except Exception as e:
+            print(f"   ⚠️  AI 批量处理失败: {e}")
+            return {}
+
+        if len(answered) < len(batch):
+            print(f"   ⚠️  AI 批量结果不完整（{len(answered)}/{len(batch)} 条）")
+        return answered
+
+    def _build_prompt(
+        self,
+        book_title: str,
+        author: str,
+        texts: List[str],
+        batch: List[tuple]
+    ) -> str:
+        """构建批量提示词"""
+        requirements = []
+        if any(need_tags for _, need_tags, _ in batch):
+            requirements.append(BATCH_TAG_REQUIREMENT)
+        if any(need_summary for _, _, need_summary in batch):
+            summary_prompt = self.settings.ai_summary_prompt.format(
+                highlight_text='（见下方划线列表）',
+                book_title=book_title,
+                author=author
+            )
+            requirements.append(
+                "摘要要求（只为标记了“摘要”的划线生成，其余 summary 为空字符串）：\n"
+                + summary_prompt.strip()
+            )
+
+        items = []
+        for i, need_tags, need_summary in batch:
+            wanted = "、".join(name for name, needed in (("标签", need_tags), ("摘要", need_summary)) if needed)
+            items.append(f"[{i}]（{wanted}）{texts[i]}")
+
+        template = self.settings.ai_batch_prompt or DEFAULT_BATCH_PROMPT
+        return template.format(
+            book_title=book_title,
+            author=author,
+            count=len(batch),
+            requirements="\n\n".join(requirements),
+            items="\n".join(items)
+        )
+
+    def _call_api(self, prompt: str, count: int) -> str:
+        """调用 OpenAI 格式的 API，返回模型输出的文本"""
+        url = f"{self.api_base.rstrip('/')}/chat/completions"
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        data = {
+            'model': self.model,
+            'messages': [
+                {'role': 'user', 'content': prompt}
+            ],
+            'temperature': 0.7,
+            # 单条标签 100、摘要 150，再加上 JSON 结构的开销
+            'max_tokens': 300 * count
+        }
+
+        rate_limiter.acquire(url)
+        with self._counter_lock:
+            self.batch_requests += 1
+        response = requests.post(url, headers=headers, json=data, timeout=30 + 15 * count)
+        response.raise_for_status()
+
+        result = response.json()
+        return result['choices'][0]['message']['content'].strip()
+
+    def _parse_results(self, content: str, indexes: set) -> Dict[int, Dict]:
+        """
+        解析批量结果，只保留序号属于本批的条目
+
+        Raises:
+            ValueError: 返回内容不是预期的 JSON
+        """
+        # 去掉可能包裹的代码块标记，只取最外层的 JSON
+        content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip())
+        start = min((pos for pos in (content.find("{"), content.find("[")) if pos >= 0), default=-1)
+        if start < 0:
+            raise ValueError("返回内容中没有 JSON")
+        data = json.loads(content[start:max(content.rfind("}"), content.rfind("]")) + 1])
+
+        entries = data.get("results") if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            raise ValueError("返回的 JSON 中没有 results 列表")
+
+        max_tags = self.settings.max_ai_tags
+        answered = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                index = int(entry.get("index"))
+            except (TypeError, ValueError):
+                continue
+            if index not in indexes:
+                continue
+
+            raw_tags = entry.get("tags") or []
+            if isinstance(raw_tags, str):
+                raw_tags = raw_tags.split()
+            tags = []
+            for tag in raw_tags:
+                tag = str(tag).strip()
+                if tag and tag != "#":
+                    tags.append(tag if tag.startswith("#") else f"#{tag}")
+
+            summary = entry.get("summary") or ""
+            answered[index] = {
+                "tags": tags[:max_tags],
+                "summary": summary.strip() if isinstance(summary, str) else ""
+            }
+        return answered
+
+    def _batch_cache_key(self, kind: str, book_title: str, highlight_text: str) -> str:
+        """
+        批量结果的缓存键
+
+        批量提示词和逐条调用的提示词不同，结果放在单独的命名空间（batch_tags / batch_summary），
+        键中包含批量模板、标签要求和摘要提示词，任何一个修改后都不会命中旧结果
+        """
+        prompt_template = "\n\0".join((
+            self.settings.ai_batch_prompt or DEFAULT_BATCH_PROMPT,
+            BATCH_TAG_REQUIREMENT,
+            self.settings.ai_summary_prompt
+        ))
+        return ai_cache_key(
+            f"batch_{kind}", self.tag_generator.provider, self.model,
+            prompt_template, highlight_text, book_title
+        )
+
+    def _cache_lookup(self, item_key: str, batch_key: str) -> Optional[object]:
+        """先查逐条调用的结果，再查批量结果"""
+        return self.cache.get_first((item_key, batch_key)) if self.cache is not None else None
+
+    def _cache_set(self, key: str, value):
+        """写入 AI 结果缓存（与逐条调用共用同一个数据库）"""
+        if self.cache is not None:
+            self.cache.set(key, value)
@@ -0,0 +1,113 @@
+"""
+AI 结果缓存
+按 (提供商, 模型, 提示词模板, 划线内容, 书名) 的哈希缓存 AI 标签和摘要，
+重试和重新运行时不再重复调用 AI 接口；超过容量时淘汰最久未使用的条目
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Iterable, Optional
+
+
+def ai_cache_key(
+    kind: str,
+    provider: str,
+    model: str,
+    prompt_template: str,
+    highlight_text: str,
+    book_title: str
+) -> str:
+    """计算缓存键（内容哈希）"""
+    raw = json.dumps(
+        [kind, provider, model, prompt_template, highlight_text, book_title],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """AI 结果的持久化 LRU 缓存（线程安全）"""
+
+    def __init__(self, cache_dir: str = ".cache", max_entries: int = 5000):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_entries: 最多保存的条目数，超出时淘汰最久未使用的条目
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "ai_responses.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_results_last_used ON ai_results (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，命中时刷新最近使用时间；未命中返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM ai_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ai_results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def get_first(self, keys: Iterable[str]) -> Optional[Any]:
+        """按顺序查找多个键，返回第一个命中的值；整次查找只记一次命中或未命中"""
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT value FROM ai_results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    break
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE ai_results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_results (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if self.max_entries > 0:
+                self._conn.execute(
+                    "DELETE FROM ai_results WHERE key IN ("
+                    "SELECT key FROM ai_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ai_results").fetchone()[0]
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,82 @@
+"""
+AI 处理阶段
+在渲染和发送之前，并发地为一本书的待同步划线生成 AI 标签和摘要，
+同时进行的请求数不超过 max_in_flight，请求速率由全局限流器按 AI 接口主机控制
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from .ai_tags import AITagGenerator
+from .ai_summary import AISummaryGenerator
+from .ai_batch import AIBatchEnricher
+
+
+class AIEnrichmentStage:
+    """为划线并发生成 AI 标签和摘要"""
+
+    def __init__(
+        self,
+        tag_generator: AITagGenerator,
+        summary_generator: AISummaryGenerator,
+        batcher: Optional[AIBatchEnricher] = None,
+        max_in_flight: int = 4
+    ):
+        """
+        初始化 AI 处理阶段
+
+        Args:
+            tag_generator: AI 标签生成器（支持本地规则和 OpenAI 格式的接口）
+            summary_generator: AI 摘要生成器
+            batcher: 批量处理器，启用时按批发送，否则逐条调用
+            max_in_flight: 同时进行的 AI 请求数上限，1 表示依次调用
+        """
+        self.tag_generator = tag_generator
+        self.summary_generator = summary_generator
+        self.batcher = batcher
+        self.max_in_flight = max(1, max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if self.max_in_flight > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="ai")
+
+    def is_enabled(self) -> bool:
+        """是否需要生成 AI 标签或摘要"""
+        return self.tag_generator.is_enabled() or self.summary_generator.is_enabled()
+
+    def enrich(self, book_title: str, author: str, texts: List[str]) -> List[Dict]:
+        """
+        为同一本书的多条划线生成 AI 标签和摘要
+
+        Args:
+            book_title: 书名
+            author: 作者
+            texts: 划线内容列表
+
+        Returns:
+            与 texts 一一对应的结果列表，每项包含 ai_tags 和 ai_summary
+        """
+        if self.batcher is not None and self.batcher.is_enabled():
+            return self.batcher.enrich(book_title, author, texts, executor=self._executor)
+
+        results = [{"ai_tags": [], "ai_summary": None} for _ in texts]
+        tasks = []
+        for i, text in enumerate(texts):
+            if self.tag_generator.is_enabled():
+                tasks.append((i, "ai_tags", self.tag_generator.generate_tags, (book_title, author, text)))
+            if self.summary_generator.should_summarize(text):
+                tasks.append((i, "ai_summary", self.summary_generator.generate_summary, (text, book_title, author)))
+
+        if self._executor is None or len(tasks) < 2:
+            for i, field, func, args in tasks:
+                results[i][field] = func(*args)
+            return results
+
+        # 同一条划线的标签和摘要也并发请求；生成器内部已处理异常
+        futures = [(i, field, self._executor.submit(func, *args)) for i, field, func, args in tasks]
+        for i, field, future in futures:
+            results[i][field] = future.result()
+        return results
+
+    def close(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -5,26 +5,42 @@ AI 摘要生成器
 import os
 import requests
 from typing import Optional
-from .config_manager import config
+from .config_manager import config, ConfigSnapshot
+from .rate_limiter import rate_limiter
+from .ai_cache import AIResponseCache, ai_cache_key
 
 
 class AISummaryGenerator:
     """AI 摘要生成器"""
 
-    def __init__(self):
-        """初始化 AI 摘要生成器"""
-        self.provider = config.get_ai_provider()
-        self.api_key = config.get_ai_api_key()
-        self.api_base = config.get_ai_api_base()
-        self.model = config.get_ai_model()
+    def __init__(
+        self,
+        cache: Optional[AIResponseCache] = None,
+        settings: Optional[ConfigSnapshot] = None
+    ):
+        """
+        初始化 AI 摘要生成器
+
+        Args:
+            cache: AI 结果缓存，不提供则每次都调用接口
+            settings: 配置快照，默认使用当前的全局配置
+        """
+        self.cache = cache
+        self.settings = settings or config.snapshot
+        self.provider = self.settings.ai_provider
+        self.api_key = self.settings.ai_api_key
+        self.api_base = self.settings.ai_api_base
+        self.model = self.settings.ai_model
+
+        if self.api_base:
+            rate_limiter.configure(self.api_base, *self.settings.ai_rate_limit)
         
         # 摘要启用阈值（字符数）
-        self.min_length = config.get('ai.summary_min_length', 100)
+        self.min_length = self.settings.ai_summary_min_length
 
     def is_enabled(self) -> bool:
         """检查 AI 摘要是否启用"""
-        enable_summary = config.get('ai.enable_summary', False, env_key='ENABLE_AI_SUMMARY')
-        return enable_summary and self.provider == 'openai' and bool(self.api_key)
+        return self.settings.enable_ai_summary and self.provider == 'openai' and bool(self.api_key)
 
     def should_summarize(self, text: str) -> bool:
         """
@@ -59,11 +75,36 @@ class AISummaryGenerator:
             return None
 
         try:
-            return self._generate_with_openai(highlight_text, book_title, author)
+            return self._generate_cached(highlight_text, book_title, author)
         except Exception as e:
             print(f"   ⚠️  AI 摘要生成失败: {e}")
             return None
 
+    def cache_key(self, book_title: Optional[str], highlight_text: str) -> str:
+        """AI 结果缓存中这条划线的摘要对应的键"""
+        return ai_cache_key(
+            'summary', self.provider, self.model,
+            self.settings.ai_summary_prompt, highlight_text, book_title or ''
+        )
+
+    def _generate_cached(
+        self,
+        highlight_text: str,
+        book_title: Optional[str] = None,
+        author: Optional[str] = None
+    ) -> Optional[str]:
+        """优先读取缓存，未命中时调用 OpenAI 格式的 API（失败结果不缓存）"""
+        if self.cache is None:
+            return self._generate_with_openai(highlight_text, book_title, author)
+
+        key = self.cache_key(book_title, highlight_text)
+        summary = self.cache.get(key)
+        if summary is None:
+            summary = self._generate_with_openai(highlight_text, book_title, author)
+            if summary:
+                self.cache.set(key, summary)
+        return summary
+
     def _generate_with_openai(
         self,
         highlight_text: str,
@@ -75,7 +116,7 @@ class AISummaryGenerator:
             return None
 
         # 构建提示词
-        prompt = config.get('ai.summary_prompt', '').format(
+        prompt = self.settings.ai_summary_prompt.format(
             highlight_text=highlight_text,
             book_title=book_title or '',
             author=author or ''
@@ -96,6 +137,7 @@ class AISummaryGenerator:
             'max_tokens': 150
         }
 
+        rate_limiter.acquire(url)
         response = requests.post(url, headers=headers, json=data, timeout=30)
         response.raise_for_status()
 
@@ -5,22 +5,66 @@ AI 标签生成器
 import os
 import requests
 from typing import List, Optional
-from .config_manager import config
+from .config_manager import config, ConfigSnapshot
+from .rate_limiter import rate_limiter
+from .ai_cache import AIResponseCache, ai_cache_key
+from .keyword_matcher import KeywordMatcher
+
+# 本地规则使用的关键词 -> 标签
+LOCAL_KEYWORD_TAGS = {
+    '思维': '#思维模型',
+    '认知': '#认知科学',
+    '心理': '#心理学',
+    '效率': '#效率提升',
+    '时间': '#时间管理',
+    '习惯': '#习惯养成',
+    '沟通': '#沟通技巧',
+    '领导': '#领导力',
+    '管理': '#管理',
+    '创新': '#创新思维',
+    '决策': '#决策',
+    '学习': '#学习方法',
+    '成长': '#个人成长',
+    '目标': '#目标管理',
+    '专注': '#专注力',
+    '情绪': '#情绪管理',
+    '关系': '#人际关系',
+    '健康': '#健康',
+    '财富': '#财富',
+    '投资': '#投资理财',
+}
 
 
 class AITagGenerator:
     """AI 标签生成器"""
 
-    def __init__(self):
-        """初始化 AI 标签生成器"""
-        self.provider = config.get_ai_provider()
-        self.api_key = config.get_ai_api_key()
-        self.api_base = config.get_ai_api_base()
-        self.model = config.get_ai_model()
+    def __init__(
+        self,
+        cache: Optional[AIResponseCache] = None,
+        settings: Optional[ConfigSnapshot] = None
+    ):
+        """
+        初始化 AI 标签生成器
+
+        Args:
+            cache: AI 结果缓存，不提供则每次都调用接口
+            settings: 配置快照，默认使用当前的全局配置
+        """
+        self.cache = cache
+        self.settings = settings or config.snapshot
+        self.provider = self.settings.ai_provider
+        self.api_key = self.settings.ai_api_key
+        self.api_base = self.settings.ai_api_base
+        self.model = self.settings.ai_model
+        # 本地规则的关键词匹配器（首次使用时构建）
+        self._local_matcher: Optional[KeywordMatcher] = None
+
+        if self.api_base:
+            rate_limiter.configure(self.api_base, *self.settings.ai_rate_limit)
 
     def is_enabled(self) -> bool:
         """检查 AI 标签是否启用"""
-        return config.should_enable_ai_tags() and self.provider != 'none'
+        return self.settings.enable_ai_tags and self.provider != 'none'
 
     def generate_tags(
         self,
@@ -44,7 +88,7 @@ class AITagGenerator:
 
         try:
             if self.provider == 'openai':
-                return self._generate_with_openai(book_title, author, highlight_text)
+                return self._generate_cached(book_title, author, highlight_text)
             elif self.provider == 'local':
                 return self._generate_with_local(book_title, author, highlight_text)
             else:
@@ -54,6 +98,31 @@ class AITagGenerator:
             print(f"⚠️  AI 标签生成失败: {e}")
             return []
 
+    def cache_key(self, book_title: str, highlight_text: str) -> str:
+        """AI 结果缓存中这条划线的标签对应的键"""
+        return ai_cache_key(
+            'tags', self.provider, self.model,
+            self.settings.ai_tag_prompt, highlight_text, book_title
+        )
+
+    def _generate_cached(
+        self,
+        book_title: str,
+        author: str,
+        highlight_text: str
+    ) -> List[str]:
+        """优先读取缓存，未命中时调用 OpenAI 格式的 API（空结果不缓存）"""
+        if self.cache is None or not self.api_key:
+            return self._generate_with_openai(book_title, author, highlight_text)
+
+        key = self.cache_key(book_title, highlight_text)
+        tags = self.cache.get(key)
+        if tags is None:
+            tags = self._generate_with_openai(book_title, author, highlight_text)
+            if tags:
+                self.cache.set(key, tags)
+        return tags
+
     def _generate_with_openai(
         self,
         book_title: str,
@@ -66,7 +135,7 @@ class AITagGenerator:
             return []
 
         # 构建提示词
-        prompt = config.get('ai.tag_prompt', '').format(
+        prompt = self.settings.ai_tag_prompt.format(
             book_title=book_title,
             author=author,
             highlight_text=highlight_text
@@ -87,6 +156,7 @@ class AITagGenerator:
             'max_tokens': 100
         }
 
+        rate_limiter.acquire(url)
         response = requests.post(url, headers=headers, json=data, timeout=30)
         response.raise_for_status()
 
@@ -95,7 +165,7 @@ class AITagGenerator:
 
         # 解析标签
         tags = self._parse_tags(content)
-        return tags[:config.get('tags.max_ai_tags', 3)]
+        return tags[:self.settings.max_ai_tags]
 
     def _generate_with_local(
         self,
@@ -104,42 +174,15 @@ class AITagGenerator:
         highlight_text: str
     ) -> List[str]:
         """使用本地规则生成标签（基于关键词匹配）"""
-        tags = []
-
-        # 定义关键词到标签的映射
-        keyword_tags = {
-            '思维': '#思维模型',
-            '认知': '#认知科学',
-            '心理': '#心理学',
-            '效率': '#效率提升',
-            '时间': '#时间管理',
-            '习惯': '#习惯养成',
-            '沟通': '#沟通技巧',
-            '领导': '#领导力',
-            '管理': '#管理',
-            '创新': '#创新思维',
-            '决策': '#决策',
-            '学习': '#学习方法',
-            '成长': '#个人成长',
-            '目标': '#目标管理',
-            '专注': '#专注力',
-            '情绪': '#情绪管理',
-            '关系': '#人际关系',
-            '健康': '#健康',
-            '财富': '#财富',
-            '投资': '#投资理财',
-        }
-
-        # 检查文本中的关键词
-        text = f"{highlight_text} {book_title}".lower()
-
-        for keyword, tag in keyword_tags.items():
-            if keyword in text and tag not in tags:
-                tags.append(tag)
-                if len(tags) >= config.get('tags.max_ai_tags', 3):
-                    break
-
-        return tags
+        if self._local_matcher is None:
+            # 用户在 ai.local_keywords 中配置的词表优先于内置词表
+            self._local_matcher = KeywordMatcher(
+                list(self.settings.ai_local_keywords) + list(LOCAL_KEYWORD_TAGS.items())
+            )
+
+        # 一次扫描找出文本中的所有关键词，按词表顺序取前几个标签
+        tags = self._local_matcher.find_all(f"{highlight_text} {book_title}")
+        return tags[:max(1, self.settings.max_ai_tags)]
 
     def _parse_tags(self, content: str) -> List[str]:
         """
@@ -0,0 +1,183 @@
+"""
+书籍数据并发预取
+在线程池中提前拉取后续几本书的划线、章节、笔记和书籍信息，
+调用方仍按笔记本顺序逐本消费结果
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .weread_api import (
+    get_bookmark_list,
+    get_chapter_info,
+    get_bookinfo,
+    get_review_delta,
+    get_review_list
+)
+from .response_cache import BookResponseCache, book_version
+from .chapter_index import ChapterIndex
+
+
+def _cached_fetch(
+    book: Dict,
+    kind: str,
+    fetch: Callable[[], Any],
+    cache: Optional[BookResponseCache],
+    is_complete: Callable[[Any], bool]
+) -> Any:
+    """优先读取缓存，未命中时请求 API，结果完整时写回缓存
+
+    API 函数失败时也会返回空结果，is_complete 用来避免把失败结果当作缓存保存。
+    """
+    if cache is not None:
+        cached = cache.get(book, kind)
+        if cached is not None:
+            return cached
+
+    result = fetch()
+    if cache is not None and is_complete(result):
+        cache.set(book, kind, result)
+    return result
+
+
+def fetch_book_data(
+    book: Dict,
+    chapters: Optional[List[Dict]] = None,
+    with_reviews: bool = True,
+    with_book_info: bool = True,
+    cache: Optional[BookResponseCache] = None,
+    needs_details: Optional[Callable[[List[Dict]], bool]] = None
+) -> Dict:
+    """
+    拉取单本书的全部数据
+
+    没有划线的书（或 needs_details 判断不需要详情的书）不会再请求章节、笔记和书籍信息。
+    提供 cache 时，笔记本条目没有变化的书直接使用本地缓存。
+
+    Args:
+        book: 笔记本列表中的书籍信息
+        chapters: 预先批量获取的章节信息，不提供则单独请求
+        with_reviews: 是否获取笔记
+        with_book_info: 是否获取书籍详细信息
+        cache: 响应缓存
+        needs_details: 根据划线列表判断是否还需要章节、笔记等详情，返回 False 时只返回划线
+
+    Returns:
+        包含 bookmarks、chapters、chapter_index、reviews、book_info 的字典
+    """
+    book_id = book.get("bookId")
+    data = {
+        "bookmarks": [],
+        "chapters": chapters or [],
+        "chapter_index": ChapterIndex([]),
+        "reviews": [],
+        "book_info": None
+    }
+
+    # ⚠️ 先获取划线列表，再获取章节信息
+    data["bookmarks"] = _cached_fetch(
+        book, "bookmarks", lambda: get_bookmark_list(book_id), cache,
+        lambda result: bool(result) or book.get("bookmarkCount") == 0
+    )
+    if not data["bookmarks"]:
+        return data
+    if needs_details is not None and not needs_details(data["bookmarks"]):
+        return data
+
+    if chapters is None:
+        data["chapters"] = _cached_fetch(
+            book, "chapters", lambda: get_chapter_info(book_id), cache, bool
+        )
+    elif cache is not None and chapters:
+        cache.set(book, "chapters", chapters)
+    data["chapter_index"] = ChapterIndex(data["chapters"])
+
+    if with_reviews:
+        if cache is not None:
+            data["reviews"] = fetch_reviews_incremental(book, cache)
+        else:
+            data["reviews"] = get_review_list(book_id)
+
+    if with_book_info:
+        data["book_info"] = _cached_fetch(
+            book, "book_info", lambda: get_bookinfo(book_id), cache,
+            lambda result: result is not None
+        )
+
+    return data
+
+
+def fetch_reviews_incremental(book: Dict, cache: BookResponseCache) -> List[Dict]:
+    """
+    增量获取书籍的笔记
+
+    书籍没有变化时直接使用本地笔记集合；否则用上次保存的 syncKey
+    只拉取变化部分并合并。请求失败时退回本地已有的笔记。
+    """
+    stored = cache.get_review_set(book)
+    if stored and stored["version"] == book_version(book):
+        cache.record_lookup(hit=True)
+        return stored["reviews"]
+
+    cache.record_lookup(hit=False)
+    sync_key = stored["sync_key"] if stored else 0
+    delta = get_review_delta(book.get("bookId"), sync_key)
+    if delta is None:
+        return stored["reviews"] if stored else []
+    return cache.merge_review_delta(book, delta)
+
+
+def books_missing_chapters(books: List[Dict], cache: Optional[BookResponseCache]) -> List[Dict]:
+    """筛选出章节信息没有有效缓存、需要批量请求的书籍"""
+    if cache is None:
+        return list(books)
+    return [book for book in books if not cache.has(book, "chapters")]
+
+
+class BookPrefetcher:
+    """按顺序产出书籍数据的并发预取器"""
+
+    def __init__(self, fetch_func: Callable[[Dict], Dict], max_workers: int = 4):
+        """
+        初始化预取器
+
+        Args:
+            fetch_func: 拉取单本书数据的函数
+            max_workers: 线程数，同时也是最多提前拉取的书籍数
+        """
+        self.fetch_func = fetch_func
+        self.max_workers = max(1, max_workers)
+
+    def iter_books(self, books: Iterable[Dict]) -> Iterator[Tuple[Dict, Optional[Dict], Optional[Exception]]]:
+        """
+        按原顺序逐本产出 (书籍, 数据, 异常)
+
+        调用方提前结束迭代时，尚未开始的预取任务会被取消。
+        """
+        book_iter = iter(books)
+        pending: Deque[Tuple[Dict, Future]] = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def submit_next() -> bool:
+            book = next(book_iter, None)
+            if book is None:
+                return False
+            pending.append((book, executor.submit(self.fetch_func, book)))
+            return True
+
+        try:
+            for _ in range(self.max_workers):
+                if not submit_next():
+                    break
+
+            while pending:
+                book, future = pending.popleft()
+                submit_next()
+                try:
+                    yield book, future.result(), None
+                except Exception as e:
+                    yield book, None, e
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
@@ -0,0 +1,201 @@
+"""
+书籍调度
+只根据笔记本列表中的元数据（最近活动时间、划线数量）和本地同步状态，
+在请求任何书籍详情之前决定处理顺序，并把本次配额分配给各本书
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 排序方式
+ORDER_RECENT = "recent"  # 最近有划线/更新的书优先
+ORDER_API = "api"  # 保持接口返回的顺序
+
+# 配额分配方式
+ALLOCATION_GREEDY = "greedy"  # 按顺序，每本书用到没有新划线为止
+ALLOCATION_FAIR = "fair"  # 各本书平均分配
+ALLOCATION_WEIGHTED = "weighted"  # 按权重比例分配
+
+
+def last_activity(book: Dict) -> int:
+    """书籍最近一次划线/笔记的时间（笔记本列表的 sort 字段）"""
+    return int(book.get("sort") or book.get("updatedTime") or 0)
+
+
+def notebook_highlight_count(book: Dict) -> int:
+    """笔记本列表中记录的划线数量"""
+    return max(int(book.get("noteCount") or 0), int(book.get("bookmarkCount") or 0))
+
+
+def pending_estimate(book: Dict, handled_counts: Dict[str, int]) -> int:
+    """
+    估算书籍尚未同步的划线数
+
+    Args:
+        book: 笔记本列表中的书籍信息
+        handled_counts: bookId -> 已同步或已在发件箱中的划线数
+
+    Returns:
+        估算值（只用于排序和分配，实际数量以划线列表为准）
+    """
+    handled = handled_counts.get(str(book.get("bookId")), 0)
+    return max(0, notebook_highlight_count(book) - handled)
+
+
+def prefilter_books(
+    books: List[Dict],
+    handled_counts: Dict[str, int],
+    last_handled_at: Dict[str, float],
+    cutoff: Optional[float] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    只根据笔记本列表和同步状态，筛掉不可能有可同步划线的书
+
+    以下情况跳过（不再请求划线、章节、笔记）：
+    - 最近活动时间早于时间限制（days_limit）：所有划线都超出范围
+    - 笔记本列表中没有划线
+    - 划线都已同步或在发件箱中，且上次同步之后没有新的活动
+
+    Args:
+        books: 笔记本列表
+        handled_counts: bookId -> 已同步或已在发件箱中的划线数
+        last_handled_at: bookId -> 最近一次同步/入队的时间戳
+        cutoff: 时间限制对应的时间戳，None 表示不限制
+
+    Returns:
+        (需要处理的书籍, 跳过的书籍)
+    """
+    candidates, skipped = [], []
+    for book in books:
+        book_id = str(book.get("bookId"))
+        activity = last_activity(book)
+        if cutoff is not None and activity and activity < cutoff:
+            skipped.append(book)
+        elif notebook_highlight_count(book) == 0 and ("noteCount" in book or "bookmarkCount" in book):
+            skipped.append(book)
+        elif (
+            pending_estimate(book, handled_counts) == 0
+            and book_id in last_handled_at
+            and activity <= last_handled_at[book_id]
+        ):
+            skipped.append(book)
+        else:
+            candidates.append(book)
+    return candidates, skipped
+
+
+class BookScheduler:
+    """决定书籍处理顺序和每本书的配额"""
+
+    def __init__(
+        self,
+        order: str = ORDER_RECENT,
+        allocation: str = ALLOCATION_FAIR,
+        weight_func: Optional[Callable[[Dict], float]] = None
+    ):
+        """
+        初始化调度器
+
+        Args:
+            order: 排序方式（recent / api）
+            allocation: 配额分配方式（greedy / fair / weighted）
+            weight_func: weighted 模式下计算书籍权重的函数，默认所有书权重为 1
+        """
+        self.order = order
+        self.allocation = allocation
+        self.weight_func = weight_func or (lambda book: 1.0)
+
+    def schedule(self, books: List[Dict], handled_counts: Dict[str, int]) -> List[Dict]:
+        """
+        排序书籍
+
+        recent 模式下先按最近活动时间、再按待同步数量从高到低排序；
+        估算没有待同步划线的书排在最后。
+        """
+        if self.order != ORDER_RECENT:
+            return list(books)
+        return sorted(
+            books,
+            key=lambda book: (
+                pending_estimate(book, handled_counts) > 0,
+                last_activity(book),
+                pending_estimate(book, handled_counts)
+            ),
+            reverse=True
+        )
+
+    def allocate(
+        self,
+        books: List[Dict],
+        handled_counts: Dict[str, int],
+        total: int
+    ) -> Dict[str, int]:
+        """
+        把本次配额分配给各本书
+
+        books 应为预筛选后的候选书籍：估算为 0 但仍是候选的书（有新的活动，
+        可能是删除旧划线后又添加了新划线）按 1 条计算。
+
+        Args:
+            books: 已排序的书籍列表
+            handled_counts: bookId -> 已同步或已在发件箱中的划线数
+            total: 本次总配额
+
+        Returns:
+            bookId -> 分配到的划线数（分配不到的书不在结果中）
+        """
+        demands = {
+            str(book.get("bookId")): max(1, pending_estimate(book, handled_counts))
+            for book in books
+        }
+        if not demands or total <= 0:
+            return {}
+
+        if self.allocation == ALLOCATION_GREEDY:
+            result, left = {}, total
+            for book_id, pending in demands.items():
+                if left <= 0:
+                    break
+                result[book_id] = min(pending, left)
+                left -= result[book_id]
+            return result
+
+        if self.allocation == ALLOCATION_WEIGHTED:
+            weights = {
+                str(book.get("bookId")): max(0.0, float(self.weight_func(book)))
+                for book in books
+                if str(book.get("bookId")) in demands
+            }
+        else:
+            weights = {book_id: 1.0 for book_id in demands}
+        return _water_fill(demands, weights, total)
+
+
+def _water_fill(demands: Dict[str, int], weights: Dict[str, float], total: int) -> Dict[str, int]:
+    """
+    按权重比例分配配额，每本书不超过自己的需求，分不完的部分再分给其他书
+
+    demands 的顺序即优先级：按比例取整后剩余的零头优先给排在前面的书。
+    """
+    result = {book_id: 0 for book_id in demands}
+    left = total
+    active = [book_id for book_id in demands if weights.get(book_id, 0) > 0]
+
+    while left > 0 and active:
+        weight_sum = sum(weights[book_id] for book_id in active)
+        shares = {book_id: int(left * weights[book_id] / weight_sum) for book_id in active}
+
+        # 取整后的零头按顺序逐本补 1
+        remainder = left - sum(shares.values())
+        for book_id in active:
+            if remainder <= 0:
+                break
+            shares[book_id] += 1
+            remainder -= 1
+
+        for book_id in active:
+            grant = min(shares[book_id], demands[book_id] - result[book_id])
+            result[book_id] += grant
+            left -= grant
+
+        active = [book_id for book_id in active if result[book_id] < demands[book_id]]
+
+    return {book_id: count for book_id, count in result.items() if count > 0}
@@ -0,0 +1,53 @@
+"""
+章节索引
+每本书构建一次，按 chapterUid 预先计算章节名称和原书顺序，
+划线查找章节时不再线性扫描整个章节列表
+"""
+from typing import Dict, List
+
+
+class ChapterIndex:
+    """按 chapterUid 索引的章节信息"""
+
+    def __init__(self, chapters: List[Dict]):
+        """
+        构建章节索引
+
+        Args:
+            chapters: get_chapter_info 返回的章节列表
+        """
+        self._titles: Dict[int, str] = {}
+        self._display_names: Dict[int, str] = {}
+        self._order: Dict[int, int] = {}
+
+        for chapter in chapters or []:
+            uid = chapter.get("chapterUid")
+            # 与线性查找保持一致：重复的 chapterUid 以第一个为准
+            if uid is None or uid in self._titles:
+                continue
+
+            title = chapter.get("title", "未知章节")
+            self._titles[uid] = title
+            self._order[uid] = chapter.get("chapterIdx", uid)
+
+            if chapter.get("title"):
+                level = chapter.get("level", 1)
+                self._display_names[uid] = f"第{level}章 - {chapter['title']}"
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __contains__(self, chapter_uid: int) -> bool:
+        return chapter_uid in self._titles
+
+    def get_title(self, chapter_uid: int, default: str = "未知章节") -> str:
+        """获取章节标题（导出 Markdown 使用）"""
+        return self._titles.get(chapter_uid, default)
+
+    def get_display_name(self, chapter_uid: int) -> str:
+        """获取带层级的章节名称（同步到 flomo 使用），如 "第1章 - 标题" """
+        return self._display_names.get(chapter_uid, "")
+
+    def sort_key(self, chapter_uid: int) -> int:
+        """章节在原书中的顺序（chapterIdx），未知章节按 UID 排序"""
+        return self._order.get(chapter_uid, chapter_uid)
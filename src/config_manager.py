@@ -2,15 +2,53 @@
 配置管理器 - 支持环境变量和 YAML 配置
 
 优先级：环境变量 > config.yaml > 默认值
+
+导入本模块没有副作用：.env 由入口调用 load_environment() 加载，
+config.yaml 在首次访问全局 config 时才读取。
 """
 import os
-import yaml
-from typing import Dict, Any, Optional
+import json
+import hashlib
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 from pathlib import Path
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+try:
+    from .keyword_matcher import KeywordMatcher
+except ImportError:
+    # 直接运行本文件时
+    from keyword_matcher import KeywordMatcher
+
+_environment_loaded = False
+
+
+def load_environment():
+    """加载 .env 中的环境变量（由程序入口调用，重复调用没有效果）"""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    _environment_loaded = True
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def build_category_matcher(categories: Optional[Dict[str, Any]]) -> KeywordMatcher:
+    """
+    由 book_categories 配置构建分类关键词匹配器
+
+    Args:
+        categories: 分类名称 -> 分类配置（keywords / tags / template）
+
+    Returns:
+        关键词 -> 分类名称的匹配器（排在前面的分类优先）
+    """
+    return KeywordMatcher(
+        (keyword, category_name)
+        for category_name, category_config in (categories or {}).items()
+        for keyword in (category_config or {}).get('keywords', []) or []
+    )
 
 
 class ConfigManager:
@@ -25,6 +63,23 @@ class ConfigManager:
         """
         self.config_path = config_path
         self.config = self.load_config()
+        # 启动时解析一次的只读配置，同步过程中的热路径只读取它
+        self.snapshot = ConfigSnapshot(self)
+
+    def reload(self) -> "ConfigSnapshot":
+        """
+        重新读取 config.yaml 和环境变量，原子地替换配置快照
+
+        新快照完整构建后才替换，其他线程读取 config.snapshot 时
+        只会拿到旧快照或新快照，不会看到部分更新的配置。
+
+        Returns:
+            新的配置快照
+        """
+        fresh = ConfigManager(self.config_path)
+        self.config = fresh.config
+        self.snapshot = fresh.snapshot
+        return self.snapshot
 
     def load_config(self) -> Dict[str, Any]:
         """加载配置文件"""
@@ -32,6 +87,8 @@ class ConfigManager:
             print(f"⚠️  配置文件不存在: {self.config_path}，使用默认配置")
             return self.get_default_config()
 
+        import yaml
+
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 config = yaml.safe_load(f)
@@ -152,19 +209,7 @@ class ConfigManager:
         Returns:
             分类名称，如果无法分类则返回None
         """
-        categories = self.get('book_categories', {})
-
-        # 检查每个分类的关键词
-        for category_name, category_config in categories.items():
-            keywords = category_config.get('keywords', [])
-
-            # 检查书名或作者是否包含关键词
-            text = f"{book_title} {author}".lower()
-            for keyword in keywords:
-                if keyword.lower() in text:
-                    return category_name
-
-        return None
+        return self.snapshot.book_category(book_title, author)
 
     def get_category_tags(self, category: str) -> list:
         """
@@ -228,9 +273,97 @@ class ConfigManager:
         return self.get('sync.max_highlights_per_sync', 50, env_key='SYNC_MAX_HIGHLIGHTS')
 
     def get_request_delay(self) -> float:
-        """获取请求延迟"""
+        """获取请求延迟（flomo 未单独配置速率限制时使用）"""
         return self.get('advanced.request_delay', 1.0, env_key='REQUEST_DELAY')
     
+    def get_fetch_workers(self) -> int:
+        """获取并发预取书籍数据的线程数"""
+        return self.get('advanced.fetch_workers', 4, env_key='FETCH_WORKERS')
+
+    def get_rate_limit(self, name: str, default_rate: float = 0.0, default_burst: float = 1) -> Tuple[float, float]:
+        """
+        获取某个出站接口的速率限制
+
+        Args:
+            name: rate_limits 下的接口名（weread / flomo / ai）
+            default_rate: 默认持续速率（请求/秒，0 表示不限制）
+            default_burst: 默认突发请求数
+
+        Returns:
+            (rate, burst)
+        """
+        rate = self.get(f'rate_limits.{name}.rate', default_rate, env_key=f'{name.upper()}_RATE_LIMIT')
+        burst = self.get(f'rate_limits.{name}.burst', default_burst)
+        return float(rate or 0), float(burst or 1)
+
+    def get_flomo_rate_limit(self) -> Tuple[float, float]:
+        """获取 flomo API 的速率限制，未配置时沿用 advanced.request_delay"""
+        request_delay = self.get_request_delay()
+        default_rate = 1.0 / request_delay if request_delay and request_delay > 0 else 0.0
+        return self.get_rate_limit('flomo', default_rate)
+    
+    def get_sync_state_path(self) -> str:
+        """获取同步状态数据库路径"""
+        return self.get('sync.state_file', 'sync_state.db', env_key='SYNC_STATE_FILE')
+
+    def is_coalesce_enabled(self) -> bool:
+        """是否启用合并模式（同一章节的多条划线合并为一条 memo）"""
+        return self.get('sync.coalesce.enabled', False, env_key='SYNC_COALESCE')
+
+    def get_coalesce_max_highlights(self) -> int:
+        """获取合并模式下每条 memo 最多包含的划线数"""
+        return int(self.get('sync.coalesce.max_highlights', 10, env_key='SYNC_COALESCE_MAX'))
+
+    def get_coalesce_max_chars(self) -> int:
+        """获取合并模式下每条 memo 的最大字符数（划线、笔记和摘要合计）"""
+        return int(self.get('sync.coalesce.max_chars', 3000))
+
+    def get_schedule_order(self) -> str:
+        """获取书籍排序方式（recent / api）"""
+        return self.get('sync.schedule.order', 'recent', env_key='SYNC_SCHEDULE_ORDER')
+
+    def get_schedule_allocation(self) -> str:
+        """获取配额分配方式（greedy / fair / weighted）"""
+        return self.get('sync.schedule.allocation', 'fair', env_key='SYNC_SCHEDULE_ALLOCATION')
+
+    def get_book_weight(self, book_title: str, author: str = "") -> float:
+        """
+        获取 weighted 分配模式下书籍的权重
+
+        先按书名查找，再按书籍分类查找，都没有配置时为 1
+        """
+        weights = self.get('sync.schedule.weights', {}) or {}
+        if book_title in weights:
+            return float(weights[book_title])
+        category = self.get_book_category(book_title, author)
+        if category and category in weights:
+            return float(weights[category])
+        return 1.0
+
+    def get_flomo_daily_limit(self) -> int:
+        """获取 flomo 每日 API 调用上限"""
+        return int(self.get('sync.flomo_daily_limit', 100, env_key='FLOMO_DAILY_LIMIT'))
+
+    def get_quota_file(self) -> str:
+        """获取 flomo 配额账本路径"""
+        return self.get('sync.quota_file', 'flomo_quota.json', env_key='FLOMO_QUOTA_FILE')
+
+    def get_checkpoint_every(self) -> int:
+        """获取同步记录的检查点间隔（条）"""
+        return int(self.get('sync.checkpoint_every', 20, env_key='CHECKPOINT_EVERY'))
+
+    def is_cache_enabled(self) -> bool:
+        """是否启用本地 API 响应缓存"""
+        return self.get('cache.enabled', True, env_key='ENABLE_CACHE')
+
+    def get_ai_cache_max_entries(self) -> int:
+        """获取 AI 结果缓存的最大条目数（0 表示关闭 AI 缓存）"""
+        return int(self.get('cache.ai_max_entries', 5000, env_key='AI_CACHE_MAX_ENTRIES'))
+
+    def get_cache_dir(self) -> str:
+        """获取本地缓存目录"""
+        return self.get('cache.dir', '.cache', env_key='CACHE_DIR')
+    
     def get_log_level(self) -> str:
         """获取日志级别"""
         return self.get('advanced.log_level', 'INFO', env_key='LOG_LEVEL')
@@ -259,13 +392,284 @@ class ConfigManager:
         """是否启用AI摘要"""
         return self.get('ai.enable_summary', False, env_key='ENABLE_AI_SUMMARY')
     
+    def get_ai_batch_size(self) -> int:
+        """获取 AI 批量处理时每次请求包含的划线数（小于 2 表示逐条调用）"""
+        return int(self.get('ai.batch_size', 5, env_key='AI_BATCH_SIZE'))
+
+    def is_ai_batch_fallback_enabled(self) -> bool:
+        """批量结果缺失或格式不正确时是否回退为逐条调用"""
+        return self.get('ai.batch_fallback', True, env_key='AI_BATCH_FALLBACK')
+
+    def get_ai_max_in_flight(self) -> int:
+        """获取同时进行的 AI 请求数上限（1 表示依次调用）"""
+        return int(self.get('ai.max_in_flight', 4, env_key='AI_MAX_IN_FLIGHT'))
+
     def get_ai_summary_min_length(self) -> int:
         """获取AI摘要的最小文本长度"""
         return self.get('ai.summary_min_length', 100, env_key='AI_SUMMARY_MIN_LENGTH')
 
 
-# 全局配置实例
-config = ConfigManager()
+class ConfigSnapshot:
+    """
+    配置快照（只读）
+
+    按 环境变量 > config.yaml > 默认值 的优先级一次性解析好常用配置，
+    字段都已转换为对应的类型，读取时不再查环境变量和拆分配置路径。
+    动态的 ConfigManager.get 只留给工具脚本和不常用的配置。
+    """
+
+    __slots__ = (
+        # 同步
+        "days_limit", "max_highlights", "sync_reviews", "fetch_workers",
+        "coalesce_enabled", "coalesce_max_highlights", "coalesce_max_chars",
+        "sync_state_path", "checkpoint_every",
+        # flomo 和出站速率
+        "flomo_rate_limit", "flomo_daily_limit", "quota_file", "max_retries",
+        "weread_rate_limit", "ai_rate_limit",
+        # 书籍调度
+        "schedule_order", "schedule_allocation", "schedule_weights",
+        # 模板和标签
+        "default_template", "use_hierarchical_tags", "add_book_title_tag", "add_author_tag",
+        "default_tags", "enable_ai_tags", "max_ai_tags",
+        "templates", "fallback_template", "category_tags", "category_templates",
+        # AI
+        "ai_provider", "ai_api_key", "ai_api_base", "ai_model",
+        "enable_ai_summary", "ai_summary_min_length",
+        "ai_tag_prompt", "ai_summary_prompt", "ai_batch_prompt",
+        "ai_batch_size", "ai_batch_fallback", "ai_max_in_flight", "ai_local_keywords",
+        # 缓存
+        "cache_enabled", "cache_dir", "ai_cache_max_entries",
+        # 书籍分类（配置指纹和关键词匹配器）
+        "category_fingerprint", "_category_matcher",
+    )
+
+    days_limit: int
+    max_highlights: int
+    sync_reviews: bool
+    fetch_workers: int
+    coalesce_enabled: bool
+    coalesce_max_highlights: int
+    coalesce_max_chars: int
+    sync_state_path: str
+    checkpoint_every: int
+    flomo_rate_limit: Tuple[float, float]
+    flomo_daily_limit: int
+    quota_file: str
+    max_retries: int
+    weread_rate_limit: Tuple[float, float]
+    ai_rate_limit: Tuple[float, float]
+    schedule_order: str
+    schedule_allocation: str
+    schedule_weights: Mapping[str, float]
+    default_template: str
+    use_hierarchical_tags: bool
+    add_book_title_tag: bool
+    add_author_tag: bool
+    default_tags: Tuple[str, ...]
+    enable_ai_tags: bool
+    max_ai_tags: int
+    templates: Mapping[str, str]
+    fallback_template: str
+    category_tags: Mapping[str, Tuple[str, ...]]
+    category_templates: Mapping[str, str]
+    ai_provider: str
+    ai_api_key: str
+    ai_api_base: str
+    ai_model: str
+    enable_ai_summary: bool
+    ai_summary_min_length: int
+    ai_tag_prompt: str
+    ai_summary_prompt: str
+    ai_batch_prompt: str
+    ai_batch_size: int
+    ai_batch_fallback: bool
+    ai_max_in_flight: int
+    ai_local_keywords: Tuple[Tuple[str, str], ...]
+    cache_enabled: bool
+    cache_dir: str
+    ai_cache_max_entries: int
+    category_fingerprint: str
+
+    def __init__(self, manager: ConfigManager):
+        """
+        从配置管理器解析快照
+
+        Args:
+            manager: 配置管理器（提供 yaml 配置和各项默认值）
+        """
+        templates = {
+            name: template['format']
+            for name, template in (manager.get('templates', {}) or {}).items()
+            if isinstance(template, dict) and template.get('format')
+        }
+        categories = manager.get('book_categories', {}) or {}
+        weights = manager.get('sync.schedule.weights', {}) or {}
+
+        values = {
+            "days_limit": int(manager.get_days_limit()),
+            "max_highlights": int(manager.get_max_highlights()),
+            "sync_reviews": bool(manager.should_sync_reviews()),
+            "fetch_workers": int(manager.get_fetch_workers()),
+            "coalesce_enabled": bool(manager.is_coalesce_enabled()),
+            "coalesce_max_highlights": manager.get_coalesce_max_highlights(),
+            "coalesce_max_chars": manager.get_coalesce_max_chars(),
+            "sync_state_path": str(manager.get_sync_state_path()),
+            "checkpoint_every": manager.get_checkpoint_every(),
+            "flomo_rate_limit": manager.get_flomo_rate_limit(),
+            "flomo_daily_limit": manager.get_flomo_daily_limit(),
+            "quota_file": str(manager.get_quota_file()),
+            "max_retries": int(manager.get_max_retries()),
+            "weread_rate_limit": manager.get_rate_limit('weread', 3.0, 3),
+            "ai_rate_limit": manager.get_rate_limit('ai'),
+            "schedule_order": str(manager.get_schedule_order()),
+            "schedule_allocation": str(manager.get_schedule_allocation()),
+            "schedule_weights": MappingProxyType({str(k): float(v) for k, v in weights.items()}),
+            "default_template": str(os.getenv('DEFAULT_TEMPLATE') or manager.get('default_template', 'simple')),
+            "use_hierarchical_tags": bool(manager.get('tags.use_hierarchical_tags', True)),
+            "add_book_title_tag": bool(manager.should_add_book_title_tag()),
+            "add_author_tag": bool(manager.should_add_author_tag()),
+            "default_tags": tuple(manager.get('tags.default', ['#微信读书']) or ()),
+            "enable_ai_tags": bool(manager.should_enable_ai_tags()),
+            "max_ai_tags": int(manager.get_max_ai_tags()),
+            "templates": MappingProxyType(templates),
+            "fallback_template": manager.get_default_template(),
+            "category_tags": MappingProxyType({
+                name: tuple((category_config or {}).get('tags', []) or ())
+                for name, category_config in categories.items()
+            }),
+            "category_templates": MappingProxyType({
+                name: (category_config or {}).get('template')
+                for name, category_config in categories.items()
+                if (category_config or {}).get('template')
+            }),
+            "ai_provider": str(manager.get_ai_provider()),
+            "ai_api_key": manager.get_ai_api_key() or '',
+            "ai_api_base": manager.get_ai_api_base() or '',
+            "ai_model": manager.get_ai_model() or '',
+            "enable_ai_summary": bool(manager.should_enable_ai_summary()),
+            "ai_summary_min_length": int(manager.get_ai_summary_min_length()),
+            "ai_tag_prompt": manager.get('ai.tag_prompt', '') or '',
+            "ai_summary_prompt": manager.get('ai.summary_prompt', '') or '',
+            "ai_batch_prompt": manager.get('ai.batch_prompt', '') or '',
+            "ai_batch_size": manager.get_ai_batch_size(),
+            "ai_batch_fallback": bool(manager.is_ai_batch_fallback_enabled()),
+            "ai_max_in_flight": manager.get_ai_max_in_flight(),
+            "ai_local_keywords": tuple((manager.get('ai.local_keywords', {}) or {}).items()),
+            "cache_enabled": bool(manager.is_cache_enabled()),
+            "cache_dir": str(manager.get_cache_dir()),
+            "ai_cache_max_entries": manager.get_ai_cache_max_entries(),
+            "category_fingerprint": hashlib.sha1(
+                json.dumps(categories, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+            ).hexdigest(),
+            "_category_matcher": build_category_matcher(categories),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def book_category(self, book_title: str, author: str = "") -> Optional[str]:
+        """
+        根据书名和作者判断书籍分类（排在前面的分类优先）
+
+        快照只读、不缓存结果；同步时的分类结果按 (书名, 作者) 保存在同步状态数据库中，
+        category_fingerprint 变化时失效
+
+        Args:
+            book_title: 书名
+            author: 作者
+
+        Returns:
+            分类名称，如果无法分类则返回None
+        """
+        return self._category_matcher.first(f"{book_title} {author}")
+
+    def template(self, template_name: Optional[str] = None) -> str:
+        """
+        获取模板内容
+
+        Args:
+            template_name: 模板名称，如果不指定则使用默认模板
+
+        Returns:
+            模板字符串（未配置时为内置默认模板）
+        """
+        return self.templates.get(template_name or self.default_template, self.fallback_template)
+
+    def book_template(self, category: Optional[str]) -> str:
+        """
+        获取书籍使用的模板：分类指定了模板时用分类模板，否则用默认模板
+
+        Args:
+            category: 书籍分类
+
+        Returns:
+            模板字符串
+        """
+        return self.template(self.category_templates.get(category) if category else None)
+
+    def book_weight(self, book_title: str, author: str = "", category: Optional[str] = None) -> float:
+        """
+        获取 weighted 分配模式下书籍的权重
+
+        先按书名查找，再按书籍分类查找，都没有配置时为 1
+
+        Args:
+            book_title: 书名
+            author: 作者
+            category: 已知的书籍分类，不提供时按书名和作者匹配
+
+        Returns:
+            书籍权重
+        """
+        weight = self.schedule_weights.get(book_title)
+        if weight is not None:
+            return weight
+        if category is None:
+            category = self.book_category(book_title, author)
+        if category and category in self.schedule_weights:
+            return self.schedule_weights[category]
+        return 1.0
+
+    def __setattr__(self, name, value):
+        raise AttributeError("配置快照是只读的，修改配置后请调用 config.reload()")
+
+    def __delattr__(self, name):
+        raise AttributeError("配置快照是只读的，修改配置后请调用 config.reload()")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}=***" if name == "ai_api_key" else f"{name}={getattr(self, name)!r}"
+            for name in self.__slots__
+            if not name.startswith("_")
+        )
+        return f"ConfigSnapshot({fields})"
+
+
+class _LazyConfig:
+    """全局配置的延迟代理：首次访问时才加载 .env 和 config.yaml"""
+
+    def __init__(self):
+        object.__setattr__(self, "_manager", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self) -> ConfigManager:
+        manager = self._manager
+        if manager is None:
+            with self._lock:
+                if self._manager is None:
+                    load_environment()
+                    object.__setattr__(self, "_manager", ConfigManager())
+                manager = self._manager
+        return manager
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._load(), name, value)
+
+
+# 全局配置实例（延迟加载）
+config = _LazyConfig()
 
 
 if __name__ == "__main__":
@@ -2,67 +2,162 @@
 Flomo API 客户端
 """
 import os
+import time
 import requests
-import json
-from typing import Dict, Optional
-from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 
-load_dotenv()
+try:
+    from .rate_limiter import rate_limiter
+    from .quota_ledger import QuotaLedger, DEFAULT_QUOTA_FILE
+except ImportError:
+    # 直接运行本文件时
+    from rate_limiter import rate_limiter
+    from quota_ledger import QuotaLedger, DEFAULT_QUOTA_FILE
+
+# flomo 明确拒绝、没有创建 memo 的状态码（503 只有带 Retry-After 时才重试）
+RETRYABLE_STATUS_CODES = {429, 503}
+
+# 单次重试的最长等待时间（秒）
+MAX_RETRY_DELAY = 60.0
 
 
 class FlomoClient:
     """Flomo API 客户端"""
 
-    def __init__(self, api_url: Optional[str] = None):
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        rate_limit: float = 0,
+        burst: float = 1,
+        max_retries: int = 3,
+        backoff_factor: float = 1.0,
+        quota_ledger: Optional[QuotaLedger] = None
+    ):
         """
         初始化 Flomo 客户端
 
         Args:
             api_url: flomo API 地址，如果不提供则从环境变量读取
+            rate_limit: 发送速率限制（次/秒），0 表示不限制
+            burst: 允许连续发送的次数
+            max_retries: 可重试错误的最大重试次数
+            backoff_factor: 指数退避的基数（秒），第 n 次重试等待 backoff_factor * 2^(n-1)
+            quota_ledger: 每日配额账本，不提供则使用 FLOMO_QUOTA_FILE（默认 flomo_quota.json），每日 100 次
         """
         self.api_url = api_url or os.getenv("FLOMO_API")
         if not self.api_url:
             raise ValueError("请设置 FLOMO_API 环境变量或提供 api_url 参数")
 
-        self.daily_limit = 100
-        self.request_count = 0
+        rate_limiter.configure(self.api_url, rate_limit, burst)
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_factor = backoff_factor
+
+        # 复用连接（keep-alive），避免每条 memo 都重新建立 TCP/TLS 连接
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # 每日配额记录在磁盘上，多次运行、多个进程共享
+        self.quota_ledger = quota_ledger or QuotaLedger(
+            os.getenv("FLOMO_QUOTA_FILE", DEFAULT_QUOTA_FILE)
+        )
+        self.daily_limit = self.quota_ledger.daily_limit
+        self.request_count = 0  # 本次运行的调用次数
+
+        # 最近一次发送失败的原因，以及是否属于可重试（暂时性）错误
+        self.last_error: Optional[str] = None
+        self.last_error_retryable = False
 
     def send_memo(self, content: str) -> bool:
         """
         发送笔记到 flomo
 
+        flomo 的接口不是幂等的，只有确定 flomo 没有创建 memo 时才重试：
+        连接阶段失败（请求没有发出）、429，以及带 Retry-After 的 503。
+        读取超时、连接中途断开和其他 5xx 时 flomo 可能已经创建了 memo，不再重发，
+        作为不可重试的错误返回，失败类型可通过 last_error / last_error_retryable 判断。
+
+        每次到达 flomo 的请求都占用一次配额：第一次发送前预留一次，
+        上一次请求到达了 flomo 时重试前再预留一次；最后一次请求没有发出时退还。
+
         Args:
             content: 笔记内容，支持 Markdown 和标签（使用 # 符号）
 
         Returns:
             bool: 是否成功
         """
-        if self.request_count >= self.daily_limit:
-            print(f"已达到每日API调用限制（{self.daily_limit}次）")
-            return False
+        self.last_error = None
+        self.last_error_retryable = False
 
-        try:
-            data = {"content": content}
-            response = requests.post(
-                self.api_url,
-                headers={"Content-Type": "application/json"},
-                json=data,
-                timeout=10
-            )
-
-            self.request_count += 1
-
-            if response.ok:
-                print(f"✓ 成功发送笔记到 flomo (第 {self.request_count} 次)")
-                return True
-            else:
-                print(f"✗ 发送失败: {response.status_code} - {response.text}")
-                return False
-
-        except Exception as e:
-            print(f"✗ 发送笔记时出错: {e}")
+        quota_date = self.quota_ledger.today()
+        if not self._reserve_quota():
             return False
 
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            # 预留的配额是否被这次请求用掉（请求已经到达或可能到达 flomo）
+            reached = False
+            try:
+                rate_limiter.acquire(self.api_url)
+                response = self.session.post(self.api_url, json={"content": content}, timeout=10)
+
+                self.request_count += 1
+                reached = True
+
+                if response.ok:
+                    print(f"✓ 成功发送笔记到 flomo (第 {self.request_count} 次)")
+                    return True
+
+                self.last_error = f"{response.status_code} - {response.text}"
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                self.last_error_retryable = response.status_code in RETRYABLE_STATUS_CODES and (
+                    response.status_code != 503 or retry_after is not None
+                )
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.last_error = str(e)
+                if _request_not_sent(e):
+                    self.last_error_retryable = True
+                else:
+                    # 读取超时或连接中途断开：flomo 可能已经收到，重发会产生重复的 memo
+                    reached = True
+                    self.last_error_retryable = False
+            except Exception as e:
+                self.last_error = str(e)
+                self.last_error_retryable = False
+
+            if not self.last_error_retryable or attempt >= self.max_retries:
+                break
+
+            delay = retry_after if retry_after is not None else self.backoff_factor * (2 ** attempt)
+            delay = min(delay, MAX_RETRY_DELAY)
+            print(f"⚠️  发送失败: {self.last_error}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+            if reached:
+                quota_date = self.quota_ledger.today()
+                if not self._reserve_quota():
+                    return False
+
+        if not reached:
+            self.quota_ledger.refund(date=quota_date)
+        print(f"✗ 发送失败: {self.last_error}")
+        return False
+
+    def _reserve_quota(self) -> bool:
+        """预留一次配额，配额用完时记录为可重试的错误（配额重置后可以再发）"""
+        if self.quota_ledger.try_consume():
+            return True
+        print(f"已达到每日API调用限制（{self.daily_limit}次）")
+        self.last_error = "已达到每日API调用限制"
+        self.last_error_retryable = True
+        return False
+
     def send_weread_highlight(
         self,
         book_title: str,
@@ -122,16 +217,55 @@ class FlomoClient:
         return self.send_memo(content)
 
     def get_request_count(self) -> int:
-        """获取当前请求计数"""
+        """获取本次运行的请求计数"""
         return self.request_count
 
+    def get_used_quota(self) -> int:
+        """获取今天已使用的配额（包括其他进程和之前的运行）"""
+        return self.quota_ledger.used()
+
+    def remaining_quota(self) -> int:
+        """获取今天剩余的配额"""
+        return self.quota_ledger.remaining()
+
     def reset_count(self):
         """重置请求计数"""
         self.request_count = 0
 
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+def _request_not_sent(error: requests.RequestException) -> bool:
+    """请求是否确定没有发出（连接超时或无法建立连接），其他网络错误时 flomo 可能已经收到"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or isinstance(error, requests.exceptions.SSLError):
+        return False
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
 if __name__ == "__main__":
     # 测试代码
+    from dotenv import load_dotenv
+
+    load_dotenv()
     client = FlomoClient()
 
     # 测试发送简单笔记
@@ -148,4 +282,4 @@ if __name__ == "__main__":
     )
 
     print(f"\n发送结果: {'成功' if success else '失败'}")
-    print(f"API 调用次数: {client.get_request_count()}/{client.daily_limit}")
+    print(f"API 调用次数: {client.get_used_quota()}/{client.daily_limit}")
@@ -0,0 +1,106 @@
+"""
+多关键词匹配
+基于 Aho-Corasick 自动机：由关键词列表构建一次，之后对任意文本只需扫描一遍，
+耗时与文本长度成正比，与关键词数量无关；匹配结果按关键词的先后（优先级）排序
+"""
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """编译好的多关键词匹配器"""
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]], ignore_case: bool = True):
+        """
+        构建匹配器
+
+        Args:
+            entries: (关键词, 对应的值) 列表，越靠前优先级越高；
+                同一个值可以对应多个关键词，空关键词匹配任意文本
+            ignore_case: 是否忽略大小写
+        """
+        self.ignore_case = ignore_case
+        self._values: List[Any] = []
+        # 空关键词（总是匹配）的序号
+        self._always: List[int] = []
+
+        # 状态 0 为根；_goto[状态][字符] -> 下一状态，_output[状态] 为在此结束的关键词序号
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for keyword, value in entries:
+            index = len(self._values)
+            self._values.append(value)
+            keyword = str(keyword)
+            if ignore_case:
+                keyword = keyword.lower()
+            if not keyword:
+                self._always.append(index)
+                continue
+
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        """按广度优先计算失配指针，并把后缀状态的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _matched_indexes(self, text: str) -> List[int]:
+        """扫描文本，返回匹配到的关键词序号（按优先级排序、去重）"""
+        if self.ignore_case:
+            text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+
+        matched = set(self._always)
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched.update(output[state])
+        return sorted(matched)
+
+    def find_all(self, text: str) -> List[Any]:
+        """
+        找出文本中出现的所有关键词对应的值
+
+        Returns:
+            按优先级排序、去重后的值列表
+        """
+        values = []
+        for index in self._matched_indexes(text):
+            value = self._values[index]
+            if value not in values:
+                values.append(value)
+        return values
+
+    def first(self, text: str) -> Optional[Any]:
+        """返回文本中出现的优先级最高的关键词对应的值，没有匹配时返回 None"""
+        indexes = self._matched_indexes(text)
+        return self._values[indexes[0]] if indexes else None
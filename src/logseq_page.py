@@ -0,0 +1,139 @@
+"""
+Logseq 页面模型
+增量合并时把导出的书籍页面一次性解析为 头部属性 / 顶层块 / 章节块，
+记录已有的划线id 和想法id；新内容作为块插入对应章节，最后整体序列化一次
+"""
+import re
+from typing import Dict, List, Optional, Set
+
+# 章节标题块：第一行为 "\t- 章节名"，第二行为 heading 属性
+CHAPTER_PREFIX = "\t- "
+CHAPTER_HEADING = "\t  heading:: true"
+# 笔记部分的顶层块（新章节添加到这里）
+NOTES_SECTION = "- [[笔记]]"
+
+_HIGHLIGHT_ID = re.compile(r'划线id::\s*(\S+)')
+_THOUGHT_ID = re.compile(r'想法id::\s*(\S+)')
+
+
+class LogseqChapter:
+    """章节块：标题行、heading 属性及其下的所有行"""
+
+    def __init__(self, title: str, lines: List[str]):
+        self.title = title
+        self.lines = lines
+
+
+class LogseqSection:
+    """顶层块（以 "-" 开头），如 [[简介]]、[[读后感]]、[[笔记]] 和结尾的空块"""
+
+    def __init__(self, lines: List[str]):
+        # 顶层块自身的行（第一个章节之前）
+        self.lines = lines
+        self.chapters: List[LogseqChapter] = []
+
+
+class LogseqPage:
+    """按行解析的 Logseq 书籍页面"""
+
+    def __init__(self, content: str = ""):
+        """
+        解析页面内容（只扫描一遍）
+
+        Args:
+            content: 页面的完整文本
+        """
+        self.header: List[str] = []
+        self.sections: List[LogseqSection] = []
+        self.highlight_ids: Set[str] = set()
+        self.thought_ids: Set[str] = set()
+        self._chapters: Dict[str, LogseqChapter] = {}
+
+        lines = content.split("\n") if content else []
+        current = self.header
+        for i, line in enumerate(lines):
+            if line.startswith("-"):
+                section = LogseqSection([])
+                self.sections.append(section)
+                current = section.lines
+            elif (
+                line.startswith(CHAPTER_PREFIX)
+                and self.sections
+                and i + 1 < len(lines)
+                and lines[i + 1].rstrip() == CHAPTER_HEADING
+            ):
+                chapter = LogseqChapter(line[len(CHAPTER_PREFIX):], [])
+                self.sections[-1].chapters.append(chapter)
+                # 同名章节以第一个为准
+                self._chapters.setdefault(chapter.title, chapter)
+                current = chapter.lines
+            elif "id::" in line:
+                self._collect_ids(line)
+            current.append(line)
+
+    @classmethod
+    def load(cls, filepath: str) -> "LogseqPage":
+        """读取并解析页面文件"""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return cls(f.read())
+
+    def _collect_ids(self, line: str):
+        """记录一行中的划线id / 想法id"""
+        for match in _HIGHLIGHT_ID.finditer(line):
+            self.highlight_ids.add(match.group(1))
+        for match in _THOUGHT_ID.finditer(line):
+            self.thought_ids.add(match.group(1))
+
+    def find_chapter(self, title: str) -> Optional[LogseqChapter]:
+        """按章节名查找章节块"""
+        return self._chapters.get(title)
+
+    def _notes_section(self) -> LogseqSection:
+        """新章节所在的顶层块：[[笔记]]，没有时为结尾空块之前的最后一个顶层块"""
+        for section in self.sections:
+            if section.lines and section.lines[0].rstrip() == NOTES_SECTION:
+                return section
+
+        candidates = [s for s in self.sections if not (s.lines and s.lines[0].strip() == "-")]
+        if candidates:
+            return candidates[-1]
+
+        # 页面中没有笔记部分：在结尾空块之前新建
+        section = LogseqSection([NOTES_SECTION, "  heading:: true", "  部分:: 笔记"])
+        position = len(self.sections)
+        if self.sections and self.sections[-1].lines and self.sections[-1].lines[0].strip() == "-":
+            position -= 1
+        self.sections.insert(position, section)
+        return section
+
+    def add_blocks(self, chapter_title: str, blocks: List[str]):
+        """
+        把新的划线/想法块追加到章节末尾，章节不存在时在笔记部分末尾新建
+
+        Args:
+            chapter_title: 章节名
+            blocks: 渲染好的块文本（可包含多行）
+        """
+        if not blocks:
+            return
+
+        chapter = self._chapters.get(chapter_title)
+        if chapter is None:
+            chapter = LogseqChapter(chapter_title, [CHAPTER_PREFIX + chapter_title, CHAPTER_HEADING])
+            self._notes_section().chapters.append(chapter)
+            self._chapters[chapter_title] = chapter
+
+        for block in blocks:
+            for line in block.split("\n"):
+                if "id::" in line:
+                    self._collect_ids(line)
+                chapter.lines.append(line)
+
+    def render(self) -> str:
+        """序列化为页面文本"""
+        lines = list(self.header)
+        for section in self.sections:
+            lines.extend(section.lines)
+            for chapter in section.chapters:
+                lines.extend(chapter.lines)
+        return "\n".join(lines)
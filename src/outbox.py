@@ -0,0 +1,118 @@
+"""
+发件箱后台发送
+渲染好的 memo 先写入 SyncStateStore 的发件箱，由后台线程按 flomo 允许的速率发送，
+渲染和 AI 处理不必等待 flomo 的响应；配额用完或服务不可用时剩余 memo 留到下次运行
+"""
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from .sync_state import SyncStateStore
+
+if TYPE_CHECKING:
+    from .flomo_client import FlomoClient
+
+
+class OutboxDrainer:
+    """在后台线程中发送发件箱里的 memo"""
+
+    def __init__(
+        self,
+        store: SyncStateStore,
+        flomo_client: "FlomoClient",
+        on_sent: Optional[Callable[[Dict], None]] = None,
+        on_failed: Optional[Callable[[Dict, str], None]] = None,
+        batch_size: int = 20
+    ):
+        """
+        初始化发件箱发送器
+
+        Args:
+            store: 同步状态存储（包含发件箱）
+            flomo_client: flomo 客户端
+            on_sent: 每条 memo 发送成功后的回调
+            on_failed: 每条 memo 发送失败后的回调，参数为条目和失败原因
+            batch_size: 每次从发件箱读取的条数
+        """
+        self.store = store
+        self.flomo_client = flomo_client
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.batch_size = batch_size
+
+        self.sent_count = 0
+        self.failed_count = 0
+        # 提前停止的原因（配额用完、服务不可用），None 表示正常发送完毕
+        self.stop_reason: Optional[str] = None
+
+        self._wakeup = threading.Event()
+        self._closing = threading.Event()
+        self._aborted = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台发送线程（会先发送上次运行留下的 memo）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-drainer", daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """有新的 memo 入队"""
+        self._wakeup.set()
+
+    def is_running(self) -> bool:
+        """发送线程是否仍在工作（配额用完等原因会提前退出）"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def finish(self):
+        """不再有新 memo 入队，等待发件箱发送完毕（或提前停止）"""
+        self._closing.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def abort(self):
+        """立即停止发送，未发送的 memo 留在发件箱中"""
+        self._aborted.set()
+        self.finish()
+
+    def _run(self):
+        while not self._aborted.is_set():
+            items = self.store.pending_outbox(limit=self.batch_size)
+            if not items:
+                if self._closing.is_set():
+                    return
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+
+            for item in items:
+                if self._aborted.is_set():
+                    return
+                if not self._send(item):
+                    return
+
+    def _send(self, item: Dict) -> bool:
+        """发送一条 memo，返回是否继续发送后续 memo"""
+        if self.flomo_client.remaining_quota() <= 0:
+            self.stop_reason = "已达到 flomo 每日API调用限制"
+            return False
+
+        if self.flomo_client.send_memo(item["content"]):
+            self.store.mark_sent(item)
+            self.sent_count += 1
+            if self.on_sent:
+                self.on_sent(item)
+            return True
+
+        error = self.flomo_client.last_error or "未知错误"
+        retryable = self.flomo_client.last_error_retryable
+        self.store.mark_failed(item, error, retryable=retryable)
+        if self.on_failed:
+            self.on_failed(item, error)
+
+        # 重试后仍是暂时性错误（或配额用完）时停止发送，剩余 memo 留到下次运行
+        if retryable:
+            self.stop_reason = error
+            return False
+        self.failed_count += 1
+        return True
@@ -0,0 +1,118 @@
+"""
+flomo 每日配额账本
+把当天已使用的 API 次数保存在本地 JSON 文件中，按北京时间零点切换日期，
+通过文件锁在多个进程（本地运行和定时任务同时进行）之间共享
+"""
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只做进程内加锁
+    fcntl = None
+
+# flomo 按北京时间零点重置每日配额
+QUOTA_TIMEZONE = timezone(timedelta(hours=8))
+
+DEFAULT_QUOTA_FILE = "flomo_quota.json"
+
+
+class QuotaLedger:
+    """持久化的每日配额账本（线程安全，支持多进程）"""
+
+    def __init__(self, path: str = DEFAULT_QUOTA_FILE, daily_limit: int = 100):
+        """
+        初始化配额账本
+
+        Args:
+            path: 账本文件路径
+            daily_limit: 每日最多调用次数
+        """
+        self.path = path
+        self.daily_limit = daily_limit
+        self._lock = threading.Lock()
+
+        ledger_dir = os.path.dirname(path)
+        if ledger_dir:
+            os.makedirs(ledger_dir, exist_ok=True)
+
+    @staticmethod
+    def today() -> str:
+        """当前配额日期（北京时间）"""
+        return datetime.now(QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+    @contextmanager
+    def _locked(self):
+        """同时持有线程锁和文件锁"""
+        with self._lock:
+            with open(self.path + ".lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self) -> Dict:
+        """读取账本，日期已切换时从 0 开始"""
+        today = self.today()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        if data.get("date") != today:
+            data = {"date": today, "used": 0}
+        return data
+
+    def _write(self, data: Dict):
+        """原子写入账本（先写临时文件再替换）"""
+        data["updated_at"] = datetime.now(QUOTA_TIMEZONE).isoformat(timespec="seconds")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def used(self) -> int:
+        """今天已使用的次数"""
+        with self._locked():
+            return int(self._read().get("used", 0))
+
+    def remaining(self) -> int:
+        """今天剩余的次数"""
+        return max(0, self.daily_limit - self.used())
+
+    def try_consume(self, count: int = 1) -> bool:
+        """
+        预留配额（检查和扣减在同一把锁内完成）
+
+        Returns:
+            配额充足并已扣减返回 True，否则返回 False
+        """
+        with self._locked():
+            data = self._read()
+            if int(data.get("used", 0)) + count > self.daily_limit:
+                return False
+            data["used"] = int(data.get("used", 0)) + count
+            self._write(data)
+            return True
+
+    def refund(self, count: int = 1, date: Optional[str] = None):
+        """
+        退还预留但没有用掉的配额
+
+        Args:
+            count: 退还的次数
+            date: 预留时的配额日期，已跨过北京时间零点时不再退还（新的一天从 0 开始计数）
+        """
+        with self._locked():
+            data = self._read()
+            if date is not None and data["date"] != date:
+                return
+            data["used"] = max(0, int(data.get("used", 0)) - count)
+            self._write(data)
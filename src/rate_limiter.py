@@ -0,0 +1,115 @@
+"""
+出站请求速率限制
+按主机维护令牌桶：桶里有令牌时立即放行，只有额度耗尽时才等待，
+微信读书、flomo 和 AI 接口共用同一个限流器
+"""
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+
+class TokenBucket:
+    """令牌桶（线程安全）"""
+
+    def __init__(self, rate: float = 0, burst: float = 1):
+        """
+        初始化令牌桶
+
+        Args:
+            rate: 持续速率（令牌/秒），0 表示不限制
+            burst: 桶容量，即空闲后允许连续放行的请求数
+        """
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+
+    def configure(self, rate: float, burst: float = 1):
+        """重新设置速率和容量（桶会被装满）"""
+        with self._lock:
+            self.rate = max(0.0, float(rate or 0))
+            self.capacity = max(1.0, float(burst or 1))
+            self._tokens = self.capacity
+            self._updated = time.monotonic()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        取出令牌，额度不足时阻塞等待
+
+        令牌在加锁时预先扣除（可以为负），并发调用会按到达顺序依次排队。
+
+        Returns:
+            实际等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class RateLimiter:
+    """按主机划分的令牌桶集合，未配置的主机不限速"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def configure(self, host_or_url: str, rate: float, burst: float = 1):
+        """
+        设置某个主机的速率限制
+
+        Args:
+            host_or_url: 主机名或该主机下的任意 URL
+            rate: 持续速率（请求/秒），0 表示不限制
+            burst: 允许的突发请求数
+        """
+        host = _host_of(host_or_url)
+        if not host:
+            return
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                self._buckets[host] = TokenBucket(rate, burst)
+            else:
+                bucket.configure(rate, burst)
+
+    def get_bucket(self, host_or_url: str) -> Optional[TokenBucket]:
+        """获取主机对应的令牌桶，未配置时返回 None"""
+        with self._lock:
+            return self._buckets.get(_host_of(host_or_url))
+
+    def acquire(self, url: str) -> float:
+        """请求 url 前调用，必要时等待；返回等待的秒数"""
+        bucket = self.get_bucket(url)
+        if bucket is None:
+            return 0.0
+        return bucket.acquire()
+
+
+def _host_of(host_or_url: str) -> str:
+    """从 URL 中取出主机名（传入的已经是主机名时原样返回）"""
+    if not host_or_url:
+        return ""
+    if "://" in host_or_url:
+        return (urlparse(host_or_url).hostname or "").lower()
+    return host_or_url.split("/")[0].split(":")[0].lower()
+
+
+# 全局限流器（所有出站请求共享）
+rate_limiter = RateLimiter()
+
+
+class RateLimitedSession(requests.Session):
+    """每个请求发出前都经过全局限流器的 session"""
+
+    def request(self, method, url, *args, **kwargs):
+        rate_limiter.acquire(url)
+        return super().request(method, url, *args, **kwargs)
@@ -0,0 +1,176 @@
+"""
+微信读书 API 响应缓存
+把每本书的划线、章节、笔记和书籍信息按笔记本条目的更新时间存入本地 SQLite，
+书籍没有变化时直接使用缓存，不再请求 API
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+# 笔记本条目中用于判断书籍是否有变化的字段
+BOOK_VERSION_FIELDS = ("sort", "updatedTime", "bookmarkCount", "reviewCount", "noteCount")
+
+
+def book_version(book: Dict) -> str:
+    """根据笔记本条目计算书籍版本，任一字段变化都会使缓存失效"""
+    return "|".join(str(book.get(field, "")) for field in BOOK_VERSION_FIELDS)
+
+
+class BookResponseCache:
+    """按书籍版本缓存 API 响应（线程安全）"""
+
+    def __init__(self, cache_dir: str = ".cache"):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "weread_responses.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                book_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                version TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (book_id, kind)
+            )
+            """
+        )
+        # 增量同步的笔记集合：按 syncKey 拉取变化后合并保存
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS review_sets (
+                book_id TEXT PRIMARY KEY,
+                sync_key INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                reviews TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, book: Dict, kind: str) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            book: 笔记本列表中的书籍信息
+            kind: 数据类型（bookmarks / chapters / reviews / book_info）
+
+        Returns:
+            缓存的数据，不存在或书籍已变化时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, payload FROM responses WHERE book_id = ? AND kind = ?",
+                (str(book.get("bookId")), kind)
+            ).fetchone()
+            if row is None or row[0] != book_version(book):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[1])
+
+    def has(self, book: Dict, kind: str) -> bool:
+        """是否存在与当前书籍版本一致的缓存（不计入命中统计）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM responses WHERE book_id = ? AND kind = ?",
+                (str(book.get("bookId")), kind)
+            ).fetchone()
+        return row is not None and row[0] == book_version(book)
+
+    def set(self, book: Dict, kind: str, payload: Any):
+        """写入缓存"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (book_id, kind, version, payload, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(book.get("bookId")),
+                    kind,
+                    book_version(book),
+                    json.dumps(payload, ensure_ascii=False),
+                    time.time()
+                )
+            )
+            self._conn.commit()
+
+    def record_lookup(self, hit: bool):
+        """记录一次命中/未命中（供不经过 get 的缓存读取使用）"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_review_set(self, book: Dict) -> Optional[Dict]:
+        """
+        读取本地保存的笔记集合
+
+        Returns:
+            {"sync_key": int, "version": str, "reviews": [...]}，不存在返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sync_key, version, reviews FROM review_sets WHERE book_id = ?",
+                (str(book.get("bookId")),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"sync_key": row[0], "version": row[1], "reviews": json.loads(row[2])}
+
+    def merge_review_delta(self, book: Dict, delta: Dict) -> List[Dict]:
+        """
+        把增量笔记合并进本地笔记集合并保存
+
+        Args:
+            book: 笔记本列表中的书籍信息
+            delta: get_review_delta 的返回值
+
+        Returns:
+            合并后的完整笔记列表
+        """
+        stored = self.get_review_set(book)
+        merged = {}
+        if stored:
+            for review in stored["reviews"]:
+                merged[str(review.get("reviewId"))] = review
+        for review_id in delta.get("removed", []):
+            merged.pop(str(review_id), None)
+        for review in delta.get("reviews", []):
+            merged[str(review.get("reviewId"))] = review
+
+        reviews = list(merged.values())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO review_sets (book_id, sync_key, version, reviews, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(book.get("bookId")),
+                    delta.get("sync_key", 0),
+                    book_version(book),
+                    json.dumps(reviews, ensure_ascii=False),
+                    time.time()
+                )
+            )
+            self._conn.commit()
+        return reviews
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
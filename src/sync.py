@@ -5,9 +5,9 @@
 import os
 import sys
 import time
-import json
+import signal
 from datetime import datetime, timedelta
-from typing import Dict, List, Set, Optional
+from typing import Dict, List, Optional
 
 # 支持两种运行方式：直接运行和作为模块导入
 try:
@@ -15,16 +15,16 @@ try:
     from .weread_api import (
         initialize_api,
         get_notebooklist,
-        get_bookmark_list,
-        get_chapter_info,
-        get_bookinfo,
-        get_review_list
+        set_request_rate
     )
-    from .flomo_client import FlomoClient
-    from .config_manager import config
-    from .template_renderer import TemplateRenderer, TagGenerator
-    from .ai_tags import AITagGenerator
-    from .ai_summary import AISummaryGenerator
+    from .book_fetcher import BookPrefetcher, fetch_book_data
+    from .response_cache import BookResponseCache
+    from .sync_state import SyncStateStore, LEGACY_SYNCED_FILE
+    from .quota_ledger import QuotaLedger
+    from .outbox import OutboxDrainer
+    from .book_scheduler import BookScheduler, prefilter_books
+    from .config_manager import config, ConfigSnapshot, load_environment
+    from .template_renderer import TemplateRenderer, BookTagContext, CompiledTemplate, compile_template, load_templates
 except ImportError:
     # 如果相对导入失败，使用绝对导入（直接运行）
     # 将项目根目录添加到 sys.path
@@ -32,16 +32,16 @@ except ImportError:
     from src.weread_api import (
         initialize_api,
         get_notebooklist,
-        get_bookmark_list,
-        get_chapter_info,
-        get_bookinfo,
-        get_review_list
+        set_request_rate
     )
-    from src.flomo_client import FlomoClient
-    from src.config_manager import config
-    from src.template_renderer import TemplateRenderer, TagGenerator
-    from src.ai_tags import AITagGenerator
-    from src.ai_summary import AISummaryGenerator
+    from src.book_fetcher import BookPrefetcher, fetch_book_data
+    from src.response_cache import BookResponseCache
+    from src.sync_state import SyncStateStore, LEGACY_SYNCED_FILE
+    from src.quota_ledger import QuotaLedger
+    from src.outbox import OutboxDrainer
+    from src.book_scheduler import BookScheduler, prefilter_books
+    from src.config_manager import config, ConfigSnapshot, load_environment
+    from src.template_renderer import TemplateRenderer, BookTagContext, CompiledTemplate, compile_template, load_templates
 
 
 class SyncStatistics:
@@ -60,6 +60,8 @@ class SyncStatistics:
         self.ai_summary_attempted = 0
         self.ai_tags_generated = 0
         self.ai_tags_attempted = 0
+        self.ai_cache_hits = 0
+        self.ai_cache_misses = 0
         
         # 书籍详情
         self.book_details = []  # [(书名, 作者, 同步数量)]
@@ -95,7 +97,15 @@ class SyncStatistics:
 class WeRead2FlomoV2:
     """微信读书到 Flomo 的增强同步器"""
 
-    def __init__(self):
+    def __init__(self, settings: Optional[ConfigSnapshot] = None):
+        """
+        初始化同步器
+
+        Args:
+            settings: 配置快照，默认使用启动时解析好的全局配置
+        """
+        self.settings = settings or config.snapshot
+
         # 初始化微信读书API（获取cookie并初始化session）
         if not initialize_api():
             raise RuntimeError(
@@ -106,19 +116,70 @@ class WeRead2FlomoV2:
                 "参考文档：README.md 或 COOKIE_CLOUD_GUIDE.md"
             )
 
-        self.flomo_client = FlomoClient()
+        # flomo 客户端和 AI 模块按需导入，未启用的功能不拖慢启动
+        try:
+            from .flomo_client import FlomoClient
+        except ImportError:
+            from src.flomo_client import FlomoClient
+
+        self.flomo_rate_limit, flomo_burst = self.settings.flomo_rate_limit
+        self.flomo_client = FlomoClient(
+            rate_limit=self.flomo_rate_limit,
+            burst=flomo_burst,
+            max_retries=self.settings.max_retries,
+            quota_ledger=QuotaLedger(self.settings.quota_file, self.settings.flomo_daily_limit)
+        )
         self.template_renderer = TemplateRenderer()
-        self.tag_generator = TagGenerator()
-        self.ai_tag_generator = AITagGenerator()
-        self.ai_summary_generator = AISummaryGenerator()
-
-        self.synced_file = "synced_bookmarks.json"
-        self.synced_ids = self.load_synced_ids()
+        # 提前编译所有模板：占位符写错时在同步开始前报错，而不是发送到一半才失败
+        load_templates(self.settings)
+        # AI 相关组件，只有启用 AI 标签或摘要时才导入和创建
+        self.ai_cache = None
+        self.ai_tag_generator = None
+        self.ai_summary_generator = None
+        self.ai_batch = None
+        self.ai_stage = None
+        if self._ai_wanted():
+            self._init_ai()
+
+        self.sync_state = SyncStateStore(
+            self.settings.sync_state_path,
+            checkpoint_every=self.settings.checkpoint_every
+        )
+        imported = self.sync_state.import_json(LEGACY_SYNCED_FILE)
+        if imported:
+            print(f"✓ 从 {LEGACY_SYNCED_FILE} 导入了 {imported} 条同步记录")
+        # 书籍分类结果按 (书名, 作者) 保存在同步状态数据库中，分类配置变化时清空
+        self._book_categories = self.sync_state.load_book_categories(self.settings.category_fingerprint)
+
+        # 渲染好的 memo 进入发件箱，由后台线程发送到 flomo
+        self.outbox = OutboxDrainer(
+            self.sync_state,
+            self.flomo_client,
+            on_sent=self._on_memo_sent,
+            on_failed=self._on_memo_failed
+        )
+        self._sent_by_book: Dict[tuple, int] = {}
+
+        # 书籍调度：处理顺序和每本书的配额
+        self.scheduler = BookScheduler(
+            order=self.settings.schedule_order,
+            allocation=self.settings.schedule_allocation,
+            weight_func=self._book_weight
+        )
+
+        # 合并模式：同一章节的多条划线打包成一条 memo
+        self.coalesce = self.settings.coalesce_enabled
+        self.coalesce_max_highlights = max(1, self.settings.coalesce_max_highlights)
+        self.coalesce_max_chars = self.settings.coalesce_max_chars
 
         # 配置参数
-        self.days_limit = config.get_days_limit()
-        self.max_highlights = config.get_max_highlights()
-        self.request_delay = config.get_request_delay()
+        self.days_limit = self.settings.days_limit
+        self.max_highlights = self.settings.max_highlights
+        self.fetch_workers = self.settings.fetch_workers
+        set_request_rate(*self.settings.weread_rate_limit)
+        self.response_cache = (
+            BookResponseCache(self.settings.cache_dir) if self.settings.cache_enabled else None
+        )
         
         # 统计信息
         self.stats = SyncStatistics()
@@ -131,70 +192,113 @@ class WeRead2FlomoV2:
         print(f"\n📋 同步配置:")
         print(f"   - 时间限制: {self.days_limit}天" if self.days_limit > 0 else "   - 时间限制: 无限制（同步所有）")
         print(f"   - 每次最大划线数: {self.max_highlights}")
-        print(f"   - 同步笔记: {'是' if config.should_sync_reviews() else '否'}")
-        print(f"   - 请求延迟: {self.request_delay}秒")
+        print(f"   - 同步笔记: {'是' if self.settings.sync_reviews else '否'}")
+        print(f"   - 书籍调度: {self.scheduler.order} 排序，{self.scheduler.allocation} 分配")
+        print(f"   - 合并模式: 每条 memo 最多 {self.coalesce_max_highlights} 条划线" if self.coalesce else "   - 合并模式: 关闭")
+        print(f"   - flomo 速率: {self.flomo_rate_limit:g} 次/秒" if self.flomo_rate_limit > 0 else "   - flomo 速率: 不限制")
+        print(f"   - 并发预取: {self.fetch_workers} 线程")
+        print(f"   - 响应缓存: {'启用' if self.response_cache else '禁用'}")
         
         # 模板配置
         print(f"\n📝 模板配置:")
-        default_template = config.get('default_template', 'simple')
-        print(f"   - 默认模板: {default_template}")
-        print(f"   - 层级标签: {'启用' if config.get('tags.use_hierarchical_tags', True) else '禁用'}")
+        print(f"   - 默认模板: {self.settings.default_template}")
+        print(f"   - 层级标签: {'启用' if self.settings.use_hierarchical_tags else '禁用'}")
         
         # AI 配置
         print(f"\n🤖 AI 功能:")
-        ai_provider = config.get_ai_provider()
-        print(f"   - AI 提供商: {ai_provider}")
-        if self.ai_tag_generator.is_enabled():
+        print(f"   - AI 提供商: {self.settings.ai_provider}")
+        if self._ai_tags_enabled():
             print(f"   - AI 标签: ✅ 启用")
-            print(f"     · 最大标签数: {config.get('tags.max_ai_tags', 3)}")
+            print(f"     · 最大标签数: {self.settings.max_ai_tags}")
         else:
             print(f"   - AI 标签: ❌ 禁用")
         
-        if self.ai_summary_generator.is_enabled():
+        if self._ai_summary_enabled():
             print(f"   - AI 摘要: ✅ 启用")
-            print(f"     · 模型: {config.get_ai_model()}")
+            print(f"     · 模型: {self.settings.ai_model}")
             print(f"     · 最小长度: {self.ai_summary_generator.min_length} 字符")
         else:
             print(f"   - AI 摘要: ❌ 禁用")
         
         # Flomo 配置
         print(f"\n📤 Flomo 配置:")
-        print(f"   - 每日限制: {self.flomo_client.daily_limit} 次")
+        print(f"   - 每日限制: {self.flomo_client.daily_limit} 次（今日已用 {self.flomo_client.get_used_quota()} 次）")
         
         print(f"\n{'='*70}\n")
 
-    def load_synced_ids(self) -> Set[str]:
-        """加载已同步的划线ID"""
-        if os.path.exists(self.synced_file):
-            try:
-                with open(self.synced_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return set(data.get("synced_ids", []))
-            except Exception as e:
-                print(f"⚠️  加载同步记录失败: {e}")
-        return set()
+    def _ai_wanted(self) -> bool:
+        """配置中是否启用了 AI 标签或 AI 摘要（与各生成器的 is_enabled 条件一致）"""
+        s = self.settings
+        tags_wanted = s.enable_ai_tags and s.ai_provider != 'none'
+        summary_wanted = s.enable_ai_summary and s.ai_provider == 'openai' and bool(s.ai_api_key)
+        return tags_wanted or summary_wanted
 
-    def save_synced_ids(self):
-        """保存已同步的划线ID"""
+    def _init_ai(self):
+        """导入并创建 AI 缓存、生成器和处理阶段"""
         try:
-            with open(self.synced_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    "synced_ids": list(self.synced_ids),
-                    "last_sync": datetime.now().isoformat(),
-                    "total_synced": len(self.synced_ids)
-                }, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"⚠️  保存同步记录失败: {e}")
-
-    def get_chapter_name(self, chapters: List[Dict], chapterUid: int) -> str:
-        """根据章节UID获取章节名称"""
-        for chapter in chapters:
-            if chapter.get("chapterUid") == chapterUid:
-                title = chapter.get("title", "")
-                level = chapter.get("level", 1)
-                if title:
-                    return f"第{level}章 - {title}"
-        return ""
+            from .ai_tags import AITagGenerator
+            from .ai_summary import AISummaryGenerator
+            from .ai_cache import AIResponseCache
+            from .ai_batch import AIBatchEnricher
+            from .ai_enrichment import AIEnrichmentStage
+        except ImportError:
+            from src.ai_tags import AITagGenerator
+            from src.ai_summary import AISummaryGenerator
+            from src.ai_cache import AIResponseCache
+            from src.ai_batch import AIBatchEnricher
+            from src.ai_enrichment import AIEnrichmentStage
+
+        # AI 结果缓存（重试和重新运行时不重复调用 AI 接口）
+        if self.settings.cache_enabled and self.settings.ai_cache_max_entries > 0:
+            self.ai_cache = AIResponseCache(self.settings.cache_dir, self.settings.ai_cache_max_entries)
+        self.ai_tag_generator = AITagGenerator(cache=self.ai_cache, settings=self.settings)
+        self.ai_summary_generator = AISummaryGenerator(cache=self.ai_cache, settings=self.settings)
+        self.ai_batch = AIBatchEnricher(
+            self.ai_tag_generator,
+            self.ai_summary_generator,
+            batch_size=self.settings.ai_batch_size,
+            fallback=self.settings.ai_batch_fallback
+        )
+        # AI 处理阶段：渲染前并发生成整本书的 AI 标签和摘要
+        self.ai_stage = AIEnrichmentStage(
+            self.ai_tag_generator,
+            self.ai_summary_generator,
+            batcher=self.ai_batch,
+            max_in_flight=self.settings.ai_max_in_flight
+        )
+
+    def _ai_tags_enabled(self) -> bool:
+        """AI 标签是否启用"""
+        return self.ai_tag_generator is not None and self.ai_tag_generator.is_enabled()
+
+    def _ai_summary_enabled(self) -> bool:
+        """AI 摘要是否启用"""
+        return self.ai_summary_generator is not None and self.ai_summary_generator.is_enabled()
+
+    def book_category(self, book_title: str, author: str) -> Optional[str]:
+        """
+        判断书籍分类，同一本书只匹配一次，结果跨运行复用
+
+        Args:
+            book_title: 书名
+            author: 作者
+
+        Returns:
+            分类名称，如果无法分类则返回None
+        """
+        key = (book_title, author)
+        if key in self._book_categories:
+            return self._book_categories[key]
+        category = self.settings.book_category(book_title, author)
+        self._book_categories[key] = category
+        self.sync_state.save_book_category(book_title, author, category)
+        return category
+
+    def _book_weight(self, book: Dict) -> float:
+        """weighted 分配模式下书籍的权重"""
+        book_title = book.get("book", {}).get("title", "")
+        author = book.get("book", {}).get("author", "")
+        return self.settings.book_weight(book_title, author, self.book_category(book_title, author))
 
     def should_sync_bookmark(self, bookmark: Dict) -> bool:
         """
@@ -208,8 +312,8 @@ class WeRead2FlomoV2:
         """
         bookmark_id = bookmark.get("bookmarkId")
 
-        # 检查是否已同步
-        if bookmark_id in self.synced_ids:
+        # 检查是否已同步，或已在发件箱中等待发送（不重复渲染和 AI 处理）
+        if self.sync_state.is_synced(bookmark_id) or self.sync_state.is_queued(bookmark_id):
             return False
 
         # 检查时间限制
@@ -225,16 +329,36 @@ class WeRead2FlomoV2:
 
         return True
 
-    def sync_book(self, book: Dict, max_count: Optional[int] = None) -> int:
+    def fetch_book(self, book: Dict) -> Dict:
+        """拉取同步单本书所需的数据（可在预取线程中调用）
+
+        先拉取划线列表，只有存在需要同步的新划线时才继续获取章节和笔记；
+        同步时不使用书籍详细信息，不再请求。
+        """
+        return fetch_book_data(
+            book,
+            with_reviews=self.settings.sync_reviews,
+            with_book_info=False,
+            cache=self.response_cache,
+            needs_details=lambda bookmarks: any(self.should_sync_bookmark(bm) for bm in bookmarks)
+        )
+
+    def sync_book(
+        self,
+        book: Dict,
+        max_count: Optional[int] = None,
+        data: Optional[Dict] = None
+    ) -> int:
         """
         同步单本书的划线
 
         Args:
             book: 书籍信息
             max_count: 本次最多同步的划线数（全局配额）
+            data: 预取的书籍数据（见 fetch_book_data），不提供则当场拉取
 
         Returns:
-            int: 新同步的划线数量
+            int: 放入发件箱的划线数量
         """
         bookId = book.get("bookId")
         # 修复：从 book.book 对象中获取标题和作者
@@ -243,30 +367,25 @@ class WeRead2FlomoV2:
         author = book_info_obj.get("author", "未知作者")
 
         print(f"\n📚 处理书籍: 《{book_title}》- {author}")
-        
-        book_synced_count = 0  # 本书同步的划线数
 
         # 判断书籍分类
-        category = config.get_book_category(book_title, author)
+        category = self.book_category(book_title, author)
         if category:
             print(f"   分类: {category}")
 
-        # 获取适合的模板
-        if category:
-            template = config.get_category_template(category)
-        else:
-            template = config.get_template()
+        # 获取适合的模板（每本书只查一次编译好的模板）
+        template = compile_template(self.settings.book_template(category))
 
-        # 获取书籍信息
-        book_info = get_bookinfo(bookId)
+        # 这本书固定的标签只计算一次
+        tag_context = BookTagContext(book_title, author, category, settings=self.settings)
+
+        # 获取书籍数据（划线、章节、笔记、书籍信息）
+        if data is None:
+            data = self.fetch_book(book)
         book_url = f"https://weread.qq.com/web/reader/{bookId}"
 
-        # ⚠️ 关键修复：先获取划线列表，再获取章节信息
-        # 因为 get_chapter_info 会重置 session，影响后续 API 调用
-        bookmarks = get_bookmark_list(bookId)
-        
-        # 获取章节信息（放在划线列表之后）
-        chapters = get_chapter_info(bookId)
+        bookmarks = data["bookmarks"]
+        chapter_index = data["chapter_index"]
 
         if not bookmarks:
             print("   ⚠️  该书没有划线数据")
@@ -276,9 +395,8 @@ class WeRead2FlomoV2:
 
         # 获取笔记（如果启用）
         reviews = {}
-        if config.should_sync_reviews():
-            review_list = get_review_list(bookId)
-            for review in review_list:
+        if self.settings.sync_reviews:
+            for review in data["reviews"]:
                 bookmark_id = review.get("bookmarkId")
                 if bookmark_id:
                     reviews[bookmark_id] = review.get("content", "")
@@ -292,7 +410,7 @@ class WeRead2FlomoV2:
         # 详细输出过滤信息
         filtered_count = len(bookmarks) - len(new_bookmarks)
         if filtered_count > 0:
-            print(f"   ℹ️  过滤了 {filtered_count} 条划线（已同步或超出时间限制）")
+            print(f"   ℹ️  过滤了 {filtered_count} 条划线（已同步、等待发送或超出时间限制）")
 
         if not new_bookmarks:
             print(f"   ⚠️  没有新的划线需要同步")
@@ -306,119 +424,269 @@ class WeRead2FlomoV2:
         else:
             print(f"   找到 {len(new_bookmarks)} 条新划线")
 
-        synced_count = 0
+        # 先并发生成所有划线的 AI 标签和摘要（批量模式下多条划线共用一次请求）
+        ai_results = [None] * len(new_bookmarks)
+        if self.ai_stage is not None and self.ai_stage.is_enabled():
+            ai_results = self.ai_stage.enrich(
+                book_title, author, [bm.get("markText", "") for bm in new_bookmarks]
+            )
 
-        for bookmark in new_bookmarks:
-            bookmark_id = bookmark.get("bookmarkId")
-            marked_text = bookmark.get("markText", "")
-            chapter_uid = bookmark.get("chapterUid", 0)
-            create_time = bookmark.get("createTime", 0)
+        highlights = [
+            self._enrich_highlight(bm, book_title, author, chapter_index, reviews, ai_result)
+            for bm, ai_result in zip(new_bookmarks, ai_results)
+        ]
 
-            # 获取章节名称
-            chapter_name = self.get_chapter_name(chapters, chapter_uid)
+        if self.coalesce:
+            return self._queue_coalesced(highlights, book, template, tag_context, book_url)
 
-            # 获取笔记
-            note_text = reviews.get(bookmark_id, "")
+        for item in highlights:
+            # 生成所有标签（书名、分类等固定标签 + AI 标签）
+            tags = tag_context.generate_tags(item["ai_tags"])
 
-            # 格式化时间
-            if create_time > 0:
-                create_time_str = datetime.fromtimestamp(create_time).strftime("%Y-%m-%d")
-            else:
-                create_time_str = datetime.now().strftime("%Y-%m-%d")
+            # 渲染内容（AI 摘要作为独立参数传递）
+            content = self.template_renderer.render(
+                template=template,
+                book_title=book_title,
+                author=author,
+                highlight_text=item["highlight_text"],
+                chapter_name=item["chapter_name"],
+                book_url=book_url,
+                note_text=item["note_text"],
+                create_time=item["create_time"],
+                tags=tags,
+                ai_summary=item["ai_summary"]
+            )
 
-            # 生成AI标签
-            ai_tags = []
-            if self.ai_tag_generator.is_enabled():
-                self.stats.ai_tags_attempted += 1
-                try:
+            # 放入发件箱，由后台线程发送到 flomo
+            self.sync_state.enqueue(
+                item["bookmark_id"],
+                content,
+                book_id=bookId,
+                book_title=book_title,
+                author=author
+            )
+            self.outbox.notify()
+
+        return len(highlights)
+
+    def _enrich_highlight(
+        self,
+        bookmark: Dict,
+        book_title: str,
+        author: str,
+        chapter_index,
+        reviews: Dict[str, str],
+        ai_result: Optional[Dict] = None
+    ) -> Dict:
+        """
+        整理单条划线的渲染数据（章节、笔记、时间、AI 标签和摘要）
+
+        Args:
+            ai_result: AI 处理阶段已生成的标签和摘要，不提供则当场调用
+
+        Returns:
+            渲染所需字段组成的字典
+        """
+        bookmark_id = bookmark.get("bookmarkId")
+        marked_text = bookmark.get("markText", "")
+        chapter_uid = bookmark.get("chapterUid", 0)
+        create_time = bookmark.get("createTime", 0)
+
+        # 格式化时间
+        if create_time > 0:
+            create_time_str = datetime.fromtimestamp(create_time).strftime("%Y-%m-%d")
+        else:
+            create_time_str = datetime.now().strftime("%Y-%m-%d")
+
+        # 生成AI标签
+        ai_tags = []
+        if self._ai_tags_enabled():
+            self.stats.ai_tags_attempted += 1
+            try:
+                if ai_result is not None:
+                    ai_tags = ai_result["ai_tags"]
+                else:
                     ai_tags = self.ai_tag_generator.generate_tags(
                         book_title=book_title,
                         author=author,
                         highlight_text=marked_text
                     )
-                    if ai_tags:
-                        self.stats.ai_tags_generated += 1
-                except Exception as e:
-                    error_msg = f"AI标签生成失败: {e}"
-                    print(f"   ⚠️  {error_msg}")
-                    self.stats.warnings.append(error_msg)
-
-            # 生成AI摘要
-            ai_summary = None
-            if self.ai_summary_generator.is_enabled():
-                self.stats.ai_summary_attempted += 1
-                try:
+                if ai_tags:
+                    self.stats.ai_tags_generated += 1
+            except Exception as e:
+                error_msg = f"AI标签生成失败: {e}"
+                print(f"   ⚠️  {error_msg}")
+                self.stats.warnings.append(error_msg)
+
+        # 生成AI摘要
+        ai_summary = None
+        if self._ai_summary_enabled():
+            self.stats.ai_summary_attempted += 1
+            try:
+                if ai_result is not None:
+                    ai_summary = ai_result["ai_summary"]
+                else:
                     ai_summary = self.ai_summary_generator.generate_summary(
                         highlight_text=marked_text,
                         book_title=book_title,
                         author=author
                     )
-                    if ai_summary:
-                        self.stats.ai_summary_generated += 1
-                        print(f"   🤖 AI提炼: {ai_summary[:50]}...")
-                except Exception as e:
-                    error_msg = f"AI摘要生成失败: {e}"
-                    print(f"   ⚠️  {error_msg}")
-                    self.stats.warnings.append(error_msg)
+                if ai_summary:
+                    self.stats.ai_summary_generated += 1
+                    print(f"   🤖 AI提炼: {ai_summary[:50]}...")
+            except Exception as e:
+                error_msg = f"AI摘要生成失败: {e}"
+                print(f"   ⚠️  {error_msg}")
+                self.stats.warnings.append(error_msg)
+
+        return {
+            "bookmark_id": bookmark_id,
+            "highlight_text": marked_text,
+            "chapter_uid": chapter_uid,
+            "chapter_name": chapter_index.get_display_name(chapter_uid),
+            "chapter_sort_key": chapter_index.sort_key(chapter_uid),
+            "note_text": reviews.get(bookmark_id, ""),
+            "create_time": create_time_str,
+            "ai_tags": ai_tags,
+            "ai_summary": ai_summary or ""
+        }
+
+    def _queue_coalesced(
+        self,
+        highlights: List[Dict],
+        book: Dict,
+        template: CompiledTemplate,
+        tag_context: BookTagContext,
+        book_url: str
+    ) -> int:
+        """
+        合并模式：按章节把划线打包成若干条 memo 放入发件箱
 
-            # 生成所有标签
-            tags = self.tag_generator.generate_tags(
-                book_title=book_title,
-                author=author,
-                highlight_text=marked_text,
-                category=category,
-                ai_tags=ai_tags
-            )
+        Returns:
+            放入发件箱的划线数量
+        """
+        bookId = book.get("bookId")
+        book_info_obj = book.get("book", {})
+        book_title = book_info_obj.get("title", "未知书名")
+        author = book_info_obj.get("author", "未知作者")
 
-            # 渲染内容（AI 摘要作为独立参数传递）
-            content = self.template_renderer.render(
+        memo_count = 0
+        for group in self._coalesce_groups(highlights):
+            # 合并所有划线的 AI 标签
+            ai_tags = []
+            for item in group:
+                ai_tags.extend(item["ai_tags"])
+
+            tags = tag_context.generate_tags(ai_tags)
+            content = self.template_renderer.render_coalesced(
                 template=template,
                 book_title=book_title,
                 author=author,
-                highlight_text=marked_text,
-                chapter_name=chapter_name,
+                highlights=group,
+                chapter_name=group[0]["chapter_name"],
                 book_url=book_url,
-                note_text=note_text,
-                create_time=create_time_str,
-                tags=tags,
-                ai_summary=ai_summary or ""
+                create_time=max(item["create_time"] for item in group),
+                tags=tags
             )
 
-            # 发送到 flomo
-            success = self.flomo_client.send_memo(content)
-
-            if success:
-                self.synced_ids.add(bookmark_id)
-                synced_count += 1
-                book_synced_count += 1
-                # 添加延迟
-                time.sleep(self.request_delay)
-            else:
-                self.stats.failed_highlights += 1
-                error_msg = f"发送失败: {marked_text[:30]}..."
-                print(f"   跳过划线: {marked_text[:30]}...")
-                self.stats.errors.append(error_msg)
-                break
-
-            # 检查是否达到每日限制
-            if self.flomo_client.get_request_count() >= self.flomo_client.daily_limit:
-                warning_msg = "已达到 flomo 每日API调用限制"
-                print(f"\n⚠️  {warning_msg}")
-                self.stats.warnings.append(warning_msg)
-                break
-
-        # 记录本书的同步详情
-        if book_synced_count > 0:
-            self.stats.book_details.append((book_title, author, book_synced_count))
-
-        return synced_count
+            self.sync_state.enqueue(
+                group[0]["bookmark_id"],
+                content,
+                book_id=bookId,
+                book_title=book_title,
+                author=author,
+                member_ids=[item["bookmark_id"] for item in group[1:]]
+            )
+            self.outbox.notify()
+            memo_count += 1
+
+        print(f"   📦 {len(highlights)} 条划线合并为 {memo_count} 条 memo")
+        return len(highlights)
+
+    def _coalesce_groups(self, highlights: List[Dict]) -> List[List[Dict]]:
+        """按章节分组，每组不超过 coalesce_max_highlights 条、coalesce_max_chars 个字符"""
+        by_chapter: Dict = {}
+        for item in highlights:
+            by_chapter.setdefault(item["chapter_uid"], []).append(item)
+
+        groups = []
+        for chapter_items in sorted(by_chapter.values(), key=lambda items: items[0]["chapter_sort_key"]):
+            group, size = [], 0
+            for item in chapter_items:
+                item_size = len(item["highlight_text"]) + len(item["note_text"]) + len(item["ai_summary"])
+                if group and (
+                    len(group) >= self.coalesce_max_highlights
+                    or size + item_size > self.coalesce_max_chars
+                ):
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(item)
+                size += item_size
+            if group:
+                groups.append(group)
+        return groups
+
+    def _on_memo_sent(self, item: Dict):
+        """发件箱中的 memo 发送成功（在发送线程中调用）"""
+        highlight_count = 1 + len(item["member_ids"])
+        self.stats.synced_highlights += highlight_count
+        key = (item["book_title"], item["author"])
+        if key not in self._sent_by_book:
+            self._sent_by_book[key] = 0
+        self._sent_by_book[key] += highlight_count
+
+    def _on_memo_failed(self, item: Dict, error: str):
+        """发件箱中的 memo 发送失败（在发送线程中调用）"""
+        # 合并模式下一条 memo 包含多条划线，与 _on_memo_sent 一致按划线数统计
+        self.stats.failed_highlights += 1 + len(item["member_ids"])
+        self.stats.errors.append(f"发送失败: {item['content'][:30]}... ({error})")
 
     def sync_all(self):
         """同步所有书籍的划线"""
+        try:
+            self._sync_all()
+        except BaseException:
+            # 中途出错或被中断时不再等待，未发送的 memo 留在发件箱中
+            self.outbox.abort()
+            raise
+        finally:
+            self.outbox.finish()
+            # 同步记录已逐条写入日志，这里清理发件箱并合并 WAL（中途被中断也会执行）
+            self.sync_state.close()
+            self.flomo_client.close()
+            if self.ai_stage is not None:
+                self.ai_stage.close()
+            if self.ai_cache is not None:
+                self.ai_cache.close()
+            if self.response_cache is not None:
+                self.response_cache.close()
+
+    def _sync_all(self):
+        """同步流程主体"""
         print("=" * 70)
         print("🚀 开始同步微信读书划线到 flomo")
         print("=" * 70)
 
+        # 预先规划本次配额：取单次上限和 flomo 今日剩余次数中较小的一个，
+        # 发件箱里上次没发完的 memo 优先发送，后续只渲染、AI 处理剩下的额度
+        flomo_remaining = self.flomo_client.remaining_quota()
+        leftover_count = self.sync_state.outbox_count()
+        highlights_per_memo = self.coalesce_max_highlights if self.coalesce else 1
+        planned_count = max(
+            0, min(self.max_highlights, (flomo_remaining - leftover_count) * highlights_per_memo)
+        )
+        remaining_quota = planned_count  # 全局剩余配额
+        print(f"\n📊 本次计划同步最多 {planned_count} 条划线（flomo 今日剩余 {flomo_remaining} 次）")
+        if leftover_count:
+            print(f"📮 发件箱中有 {leftover_count} 条上次未发送的 memo，将优先发送")
+        if flomo_remaining <= 0:
+            warning_msg = f"flomo 今日配额已用完（{self.flomo_client.daily_limit} 次）"
+            print(f"\n⚠️  {warning_msg}，跳过本次同步")
+            self.stats.warnings.append(warning_msg)
+            return
+
+        self.outbox.start()
+
         # 获取书籍列表
         books = get_notebooklist()
 
@@ -429,49 +697,124 @@ class WeRead2FlomoV2:
         self.stats.total_books = len(books)
         print(f"\n📖 找到 {len(books)} 本书")
 
-        total_synced = 0
+        # 预筛选：根据笔记本列表、时间限制和同步状态跳过不可能有新划线的书
+        handled_counts = self.sync_state.handled_counts_by_book()
+        cutoff = None
+        if self.days_limit > 0:
+            cutoff = (datetime.now() - timedelta(days=self.days_limit)).timestamp()
+        books, skipped_books = prefilter_books(
+            books, handled_counts, self.sync_state.last_handled_at_by_book(), cutoff
+        )
+        if skipped_books:
+            print(f"⏭️  跳过 {len(skipped_books)} 本没有新划线或超出时间限制的书")
+        if not books:
+            print("✓ 没有需要同步的书籍")
+            return
+
+        # 根据笔记本列表排序并分配配额（不请求书籍详情）
+        books = self.scheduler.schedule(books, handled_counts)
+        allocation = self.scheduler.allocate(books, handled_counts, planned_count)
+        if allocation:
+            print(f"🗓️  配额分配给 {len(allocation)} 本书（{self.scheduler.allocation}）")
+
+        allocated_books = [book for book in books if str(book.get("bookId")) in allocation]
         processed_books = 0
-        remaining_quota = self.max_highlights  # 全局剩余配额
 
-        for book in books:
-            try:
+        # 后台并发拉取后续书籍的数据，这里按笔记本顺序逐本同步；
+        # 章节信息由 fetch_book 在确认这本书有需要同步的划线后再单独获取（优先用缓存）
+        prefetcher = BookPrefetcher(self.fetch_book, max_workers=self.fetch_workers)
+
+        # 先处理分配到配额的书（并发预取），它们没用完的配额再按顺序顺延给没有分配到配额的书；
+        # 后者逐本拉取，顺延的配额用完就停止，不为拿不到配额的书请求划线、章节和笔记
+        unfunded_books = [book for book in books if str(book.get("bookId")) not in allocation]
+
+        carry = 0  # 前面的书没用完的配额顺延给后面的书
+        stopped = False
+        for group in (allocated_books, unfunded_books):
+            if stopped or remaining_quota <= 0 or (group is unfunded_books and carry <= 0):
+                break
+
+            # 提前结束迭代时，预取器会取消尚未开始的拉取任务
+            if group is allocated_books:
+                book_iter = prefetcher.iter_books(group)
+            else:
+                book_iter = self._iter_books_sequential(group)
+            for book, data, fetch_error in book_iter:
+                try:
+                    book_quota = min(remaining_quota, allocation.get(str(book.get("bookId")), 0) + carry)
+
+                    # 出错时这本书的配额整体顺延
+                    carry = book_quota
+                    if fetch_error is not None:
+                        raise fetch_error
+
+                    queued_count = self.sync_book(book, max_count=book_quota, data=data)
+                    carry = book_quota - queued_count
+                    remaining_quota -= queued_count
+                    processed_books += 1
+                    self.stats.processed_books += 1
+
+                except Exception as e:
+                    error_msg = f"处理书籍时出错: {e}"
+                    print(f"\n⚠️  {error_msg}")
+                    self.stats.errors.append(error_msg)
+
                 # 如果已达到全局限制，停止处理
                 if remaining_quota <= 0:
-                    warning_msg = f"已达到全局划线限制 ({self.max_highlights} 条)"
+                    warning_msg = f"已达到本次划线限制 ({planned_count} 条)"
                     print(f"\n⚠️  {warning_msg}，停止同步")
                     self.stats.warnings.append(warning_msg)
+                    stopped = True
                     break
 
-                synced_count = self.sync_book(book, max_count=remaining_quota)
-                total_synced += synced_count
-                self.stats.synced_highlights += synced_count
-                remaining_quota -= synced_count
-                processed_books += 1
-                self.stats.processed_books += 1
+                # 发送线程因配额用完或服务不可用而停止时，不再继续渲染
+                if self.outbox.stop_reason:
+                    print(f"\n⚠️  发送已停止（{self.outbox.stop_reason}），停止同步")
+                    stopped = True
+                    break
 
-                # 检查是否达到每日限制
-                if self.flomo_client.get_request_count() >= self.flomo_client.daily_limit:
-                    print(f"\n⚠️  已达到每日同步限制，停止同步")
+                # 没有分配到配额的书只能使用顺延的配额，用完后不再拉取
+                if group is unfunded_books and carry <= 0:
                     break
 
-                # 书籍之间添加延迟
-                if synced_count > 0:
-                    time.sleep(2)
+        # 等待发件箱发送完毕
+        if self.outbox.is_running():
+            print(f"\n📮 等待发件箱发送完毕...")
+        self.outbox.finish()
+        if self.outbox.stop_reason:
+            self.stats.warnings.append(f"发送提前停止: {self.outbox.stop_reason}")
+        self.stats.book_details = [
+            (book_title, author, count)
+            for (book_title, author), count in self._sent_by_book.items()
+        ]
+        if self.ai_cache is not None:
+            self.stats.ai_cache_hits = self.ai_cache.hits
+            self.stats.ai_cache_misses = self.ai_cache.misses
+
+        # 输出详细统计信息
+        self._print_detailed_summary(self.outbox.sent_count, processed_books, len(books))
 
+    def _iter_books_sequential(self, books: List[Dict]):
+        """逐本拉取书籍数据（不提前拉取），按 (书籍, 数据, 异常) 产出"""
+        for book in books:
+            try:
+                data = self.fetch_book(book)
             except Exception as e:
-                error_msg = f"处理书籍时出错: {e}"
-                print(f"\n⚠️  {error_msg}")
-                self.stats.errors.append(error_msg)
+                yield book, None, e
                 continue
+            yield book, data, None
 
-        # 保存同步记录
-        self.save_synced_ids()
-
-        # 输出详细统计信息
-        self._print_detailed_summary(total_synced, processed_books, len(books))
+    def _print_detailed_summary(self, sent_memos: int, processed_books: int, total_books: int):
+        """
+        输出详细的同步摘要
 
-    def _print_detailed_summary(self, total_synced: int, processed_books: int, total_books: int):
-        """输出详细的同步摘要"""
+        Args:
+            sent_memos: 本次发送成功的 memo 数（合并模式下一条 memo 包含多条划线）
+            processed_books: 处理的书籍数
+            total_books: 书籍总数
+        """
+        # 同步数量和速度按划线统计
+        total_synced = self.stats.synced_highlights
         duration = self.stats.get_duration()
         speed = self.stats.get_speed()
         
@@ -483,8 +826,13 @@ class WeRead2FlomoV2:
         print(f"\n📊 基本统计:")
         print(f"   - 处理书籍: {processed_books}/{total_books}")
         print(f"   - 本次新同步: {total_synced} 条划线")
-        print(f"   - 累计已同步: {len(self.synced_ids)} 条划线")
+        if sent_memos != total_synced:
+            print(f"   - 发送 memo: {sent_memos} 条（合并模式）")
+        print(f"   - 累计已同步: {self.sync_state.count()} 条划线")
         print(f"   - 失败数量: {self.stats.failed_highlights} 条")
+        pending_count = self.sync_state.outbox_count()
+        if pending_count:
+            print(f"   - 发件箱剩余: {pending_count} 条（下次运行继续发送）")
         
         # 性能指标
         print(f"\n⏱️  性能指标:")
@@ -492,38 +840,47 @@ class WeRead2FlomoV2:
         if total_synced > 0:
             print(f"   - 平均速度: {speed:.1f} 条/分钟")
             print(f"   - 平均耗时: {duration/total_synced:.1f} 秒/条")
+        if self.response_cache:
+            print(f"   - 响应缓存: 命中 {self.response_cache.hits} 次，未命中 {self.response_cache.misses} 次")
         
-        # API 使用情况
-        api_count = self.flomo_client.get_request_count()
+        # API 使用情况（今日用量包括之前的运行和其他进程）
+        run_count = self.flomo_client.get_request_count()
+        api_count = self.flomo_client.get_used_quota()
         api_limit = self.flomo_client.daily_limit
-        api_usage = (api_count / api_limit) * 100
-        api_remaining = api_limit - api_count
+        api_usage = (api_count / api_limit) * 100 if api_limit > 0 else 0.0
+        api_remaining = max(0, api_limit - api_count)
         
         print(f"\n📤 API 使用情况:")
-        print(f"   - API 调用: {api_count}/{api_limit} 次")
+        print(f"   - API 调用: 今日 {api_count}/{api_limit} 次（本次 {run_count} 次）")
         print(f"   - 使用率: {api_usage:.1f}%")
         print(f"   - 剩余配额: {api_remaining} 次")
-        if api_remaining > 0 and total_synced > 0:
-            estimated_more = int(api_remaining / (api_count / total_synced))
+        if api_remaining > 0 and total_synced > 0 and run_count > 0:
+            estimated_more = int(api_remaining / (run_count / total_synced))
             print(f"   - 预计还可同步: 约 {estimated_more} 条")
         
         # AI 功能统计
-        if self.ai_summary_generator.is_enabled() or self.ai_tag_generator.is_enabled():
+        if self._ai_summary_enabled() or self._ai_tags_enabled():
             print(f"\n🤖 AI 功能统计:")
             
-            if self.ai_summary_generator.is_enabled():
+            if self._ai_summary_enabled():
                 summary_rate = self.stats.get_ai_summary_success_rate()
                 print(f"   - AI 摘要:")
                 print(f"     · 尝试: {self.stats.ai_summary_attempted} 次")
                 print(f"     · 成功: {self.stats.ai_summary_generated} 次")
                 print(f"     · 成功率: {summary_rate:.1f}%")
             
-            if self.ai_tag_generator.is_enabled():
+            if self._ai_tags_enabled():
                 tags_rate = self.stats.get_ai_tags_success_rate()
                 print(f"   - AI 标签:")
                 print(f"     · 尝试: {self.stats.ai_tags_attempted} 次")
                 print(f"     · 成功: {self.stats.ai_tags_generated} 次")
                 print(f"     · 成功率: {tags_rate:.1f}%")
+
+            if self.ai_batch is not None and self.ai_batch.batch_requests:
+                print(f"   - AI 批量请求: {self.ai_batch.batch_requests} 次，回退逐条调用 {self.ai_batch.fallback_items} 条")
+
+            if self.ai_cache is not None:
+                print(f"   - AI 缓存: 命中 {self.stats.ai_cache_hits} 次，未命中 {self.stats.ai_cache_misses} 次")
         
         # 书籍处理详情
         if self.stats.book_details:
@@ -556,8 +913,15 @@ class WeRead2FlomoV2:
         print("\n" + "=" * 70)
 
 
+def _handle_sigterm(signum, frame):
+    """收到 SIGTERM（如 Actions 超时或取消）时抛出 SystemExit，保证 finally 中的收尾逻辑执行"""
+    raise SystemExit(128 + signum)
+
+
 def main():
     """主函数"""
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    load_environment()
     try:
         syncer = WeRead2FlomoV2()
         syncer.sync_all()
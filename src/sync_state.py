@@ -0,0 +1,454 @@
+"""
+同步状态存储
+用 SQLite（WAL 模式）记录已同步的划线，每条 memo 发送成功后单独插入一行，
+不再在每次运行结束时整体重写 JSON 文件
+
+WAL 文件就是追加写的日志：每次提交只追加到 WAL（synchronous=NORMAL 不 fsync，
+进程被杀也不会丢失），每 checkpoint_every 条做一次检查点统一落盘，
+close() 时把 WAL 合并回主数据库。进程异常退出后，下次打开时 SQLite 会自动回放 WAL。
+
+同一个数据库中还有发件箱（outbox）：渲染好的 memo 先入队，由后台线程发送，
+发送成功后从发件箱删除并记入已同步；没发出去的留到下次运行继续发送。
+书籍分类的匹配结果也保存在这里，分类配置不变时跨运行复用。
+"""
+import os
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 发件箱状态
+OUTBOX_PENDING = "pending"
+OUTBOX_FAILED = "failed"
+
+# 发送失败（不可重试）的 memo 在发件箱中保留的时间（秒），过期后连同内容一起删除
+FAILED_OUTBOX_RETENTION = 7 * 24 * 3600
+
+# 关闭时空闲页超过数据库的这一比例才用 VACUUM 重写文件
+VACUUM_FREE_RATIO = 0.25
+
+# 旧版本使用的 JSON 同步记录
+LEGACY_SYNCED_FILE = "synced_bookmarks.json"
+
+
+class SyncStateStore:
+    """已同步划线和发件箱的存储（线程安全）"""
+
+    def __init__(self, db_path: str = "sync_state.db", checkpoint_every: int = 20):
+        """
+        初始化同步状态存储
+
+        Args:
+            db_path: SQLite 数据库文件路径
+            checkpoint_every: 每写入多少条记录做一次检查点（fsync），<=0 表示只在关闭时做
+        """
+        self.db_path = db_path
+        self.checkpoint_every = checkpoint_every
+        self._pending = 0
+        self._lock = threading.RLock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # 删除的记录（发件箱中的 memo 全文）立即用 0 覆盖，不会残留在空闲页中
+        self._conn.execute("PRAGMA secure_delete=ON")
+        # 检查点由 add() 按批次触发，关闭 SQLite 自带的按页数自动检查点
+        self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS synced (
+                bookmark_id TEXT NOT NULL,
+                target TEXT NOT NULL DEFAULT 'flomo',
+                book_id TEXT NOT NULL DEFAULT '',
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (bookmark_id, target)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_synced_book ON synced (book_id, target)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bookmark_id TEXT NOT NULL,
+                target TEXT NOT NULL DEFAULT 'flomo',
+                book_id TEXT NOT NULL DEFAULT '',
+                book_title TEXT NOT NULL DEFAULT '',
+                author TEXT NOT NULL DEFAULT '',
+                content TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (bookmark_id, target)
+            )
+            """
+        )
+        # 合并模式下一条 memo 包含的其他划线
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox_members (
+                outbox_id INTEGER NOT NULL,
+                bookmark_id TEXT NOT NULL,
+                target TEXT NOT NULL DEFAULT 'flomo',
+                PRIMARY KEY (bookmark_id, target)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_members ON outbox_members (outbox_id)")
+        # (书名, 作者) -> 书籍分类，category 为 NULL 表示没有匹配到分类
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS book_categories (
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                category TEXT,
+                PRIMARY KEY (title, author)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def is_synced(self, bookmark_id: str, target: str = "flomo") -> bool:
+        """划线是否已同步到指定目标"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM synced WHERE bookmark_id = ? AND target = ?",
+                (bookmark_id, target)
+            ).fetchone()
+        return row is not None
+
+    def __contains__(self, bookmark_id: str) -> bool:
+        return self.is_synced(bookmark_id)
+
+    def add(self, bookmark_id: str, book_id: str = "", target: str = "flomo"):
+        """记录一条已同步的划线（立即提交到 WAL，按批次 fsync）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO synced (bookmark_id, target, book_id, synced_at) VALUES (?, ?, ?, ?)",
+                (bookmark_id, target, str(book_id or ""), time.time())
+            )
+            self._conn.commit()
+            self._after_write()
+
+    def _after_write(self):
+        """累计写入条数，达到批次大小时做检查点（调用方持有锁）"""
+        self._pending += 1
+        if self.checkpoint_every > 0 and self._pending >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """把 WAL 中已提交的记录写回主数据库并 fsync"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self._pending = 0
+
+    def count(self, book_id: Optional[str] = None, target: str = "flomo") -> int:
+        """已同步的划线数量，可按书籍筛选"""
+        with self._lock:
+            if book_id is None:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM synced WHERE target = ?", (target,)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM synced WHERE book_id = ? AND target = ?",
+                    (str(book_id), target)
+                ).fetchone()
+        return row[0]
+
+    def enqueue(
+        self,
+        bookmark_id: str,
+        content: str,
+        book_id: str = "",
+        book_title: str = "",
+        author: str = "",
+        target: str = "flomo",
+        member_ids: Optional[List[str]] = None
+    ):
+        """
+        把渲染好的 memo 放入发件箱（同一条划线重新入队会覆盖之前失败的记录）
+
+        Args:
+            bookmark_id: memo 对应的划线 ID
+            content: 渲染好的内容
+            book_id: 书籍 ID
+            book_title: 书名
+            author: 作者
+            target: 同步目标
+            member_ids: 合并模式下同一条 memo 包含的其他划线 ID
+        """
+        now = time.time()
+        with self._lock:
+            self._delete_outbox_entries([bookmark_id] + list(member_ids or []), target)
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (bookmark_id, target, book_id, book_title, author, "
+                "content, status, attempts, last_error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, NULL, ?, ?)",
+                (bookmark_id, target, str(book_id or ""), book_title, author,
+                 content, OUTBOX_PENDING, now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO outbox_members (outbox_id, bookmark_id, target) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, member_id, target) for member_id in member_ids or []]
+            )
+            self._conn.commit()
+            self._after_write()
+
+    def _delete_outbox_entries(self, bookmark_ids: List[str], target: str):
+        """删除包含这些划线的旧发件箱记录（调用方持有锁）"""
+        for bookmark_id in bookmark_ids:
+            outbox_ids = [
+                row[0] for row in self._conn.execute(
+                    "SELECT id FROM outbox WHERE bookmark_id = ? AND target = ? "
+                    "UNION SELECT outbox_id FROM outbox_members WHERE bookmark_id = ? AND target = ?",
+                    (bookmark_id, target, bookmark_id, target)
+                )
+            ]
+            for outbox_id in outbox_ids:
+                self._conn.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+                self._conn.execute("DELETE FROM outbox_members WHERE outbox_id = ?", (outbox_id,))
+
+    def is_queued(self, bookmark_id: str, target: str = "flomo") -> bool:
+        """划线是否已在发件箱中等待发送（包括合并到其他 memo 中的划线）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM outbox WHERE bookmark_id = ? AND target = ? AND status = ? "
+                "UNION ALL "
+                "SELECT 1 FROM outbox_members m JOIN outbox o ON o.id = m.outbox_id "
+                "WHERE m.bookmark_id = ? AND m.target = ? AND o.status = ?",
+                (bookmark_id, target, OUTBOX_PENDING, bookmark_id, target, OUTBOX_PENDING)
+            ).fetchone()
+        return row is not None
+
+    def pending_outbox(self, limit: int = 20, target: str = "flomo") -> List[Dict]:
+        """按入队顺序取出等待发送的 memo"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, bookmark_id, book_id, book_title, author, content, attempts "
+                "FROM outbox WHERE target = ? AND status = ? ORDER BY id LIMIT ?",
+                (target, OUTBOX_PENDING, limit)
+            ).fetchall()
+            keys = ("id", "bookmark_id", "book_id", "book_title", "author", "content", "attempts")
+            items = [dict(zip(keys, row)) for row in rows]
+            for item in items:
+                item["member_ids"] = [
+                    row[0] for row in self._conn.execute(
+                        "SELECT bookmark_id FROM outbox_members WHERE outbox_id = ?", (item["id"],)
+                    )
+                ]
+        return items
+
+    def outbox_count(self, status: str = OUTBOX_PENDING, target: str = "flomo") -> int:
+        """发件箱中指定状态的 memo 数量"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE target = ? AND status = ?", (target, status)
+            ).fetchone()
+        return row[0]
+
+    def mark_sent(self, item: Dict, target: str = "flomo"):
+        """memo 发送成功：从发件箱删除并把其中所有划线记为已同步（同一事务）"""
+        now = time.time()
+        bookmark_ids = [item["bookmark_id"]] + list(item.get("member_ids", []))
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (item["id"],))
+            self._conn.execute("DELETE FROM outbox_members WHERE outbox_id = ?", (item["id"],))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO synced (bookmark_id, target, book_id, synced_at) VALUES (?, ?, ?, ?)",
+                [(bookmark_id, target, item.get("book_id", ""), now) for bookmark_id in bookmark_ids]
+            )
+            self._conn.commit()
+            self._after_write()
+
+    def mark_failed(self, item: Dict, error: str, retryable: bool):
+        """
+        记录发送失败
+
+        Args:
+            item: pending_outbox 返回的条目
+            error: 失败原因
+            retryable: 暂时性错误保持 pending 等待下次发送，否则标记为 failed
+        """
+        status = OUTBOX_PENDING if retryable else OUTBOX_FAILED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, error, time.time(), item["id"])
+            )
+            self._conn.commit()
+            self._after_write()
+
+    def prune_outbox(self, max_age: float = FAILED_OUTBOX_RETENTION) -> int:
+        """
+        删除过期的发送失败记录（其中有 memo 全文，不再需要保留）
+
+        Args:
+            max_age: 失败记录保留的秒数
+
+        Returns:
+            删除的记录数
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            outbox_ids = [
+                row[0] for row in self._conn.execute(
+                    "SELECT id FROM outbox WHERE status = ? AND updated_at < ?", (OUTBOX_FAILED, cutoff)
+                )
+            ]
+            for outbox_id in outbox_ids:
+                self._conn.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+                self._conn.execute("DELETE FROM outbox_members WHERE outbox_id = ?", (outbox_id,))
+            self._conn.commit()
+        return len(outbox_ids)
+
+    def handled_counts_by_book(self, target: str = "flomo") -> Dict[str, int]:
+        """每本书已同步和已在发件箱中等待发送的划线数（bookId -> 数量）"""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT book_id, COUNT(*) FROM synced WHERE target = ? GROUP BY book_id", (target,)
+            ).fetchall()
+            rows += self._conn.execute(
+                "SELECT o.book_id, COUNT(*) + ("
+                "SELECT COUNT(*) FROM outbox_members m WHERE m.outbox_id = o.id) "
+                "FROM outbox o WHERE o.target = ? AND o.status = ? GROUP BY o.id",
+                (target, OUTBOX_PENDING)
+            ).fetchall()
+        for book_id, count in rows:
+            if book_id:
+                counts[book_id] = counts.get(book_id, 0) + count
+        return counts
+
+    def last_handled_at_by_book(self, target: str = "flomo") -> Dict[str, float]:
+        """每本书最近一次同步或入队的时间（bookId -> 时间戳）"""
+        result: Dict[str, float] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT book_id, MAX(synced_at) FROM synced WHERE target = ? GROUP BY book_id", (target,)
+            ).fetchall()
+            rows += self._conn.execute(
+                "SELECT book_id, MAX(created_at) FROM outbox WHERE target = ? GROUP BY book_id", (target,)
+            ).fetchall()
+        for book_id, timestamp in rows:
+            if book_id and timestamp is not None:
+                result[book_id] = max(result.get(book_id, 0.0), timestamp)
+        return result
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取元数据"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        """写入元数据"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def load_book_categories(self, fingerprint: str) -> Dict[Tuple[str, str], Optional[str]]:
+        """
+        读取保存的书籍分类
+
+        Args:
+            fingerprint: 当前分类配置的指纹，与保存时不同则清空旧的分类结果
+
+        Returns:
+            (书名, 作者) -> 分类
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'book_categories_fingerprint'"
+            ).fetchone()
+            if row is None or row[0] != fingerprint:
+                self._conn.execute("DELETE FROM book_categories")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('book_categories_fingerprint', ?)",
+                    (fingerprint,)
+                )
+                self._conn.commit()
+                return {}
+            rows = self._conn.execute("SELECT title, author, category FROM book_categories").fetchall()
+        return {(title, author): category for title, author, category in rows}
+
+    def save_book_category(self, book_title: str, author: str, category: Optional[str]):
+        """保存一本书的分类"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO book_categories (title, author, category) VALUES (?, ?, ?)",
+                (book_title, author, category)
+            )
+            self._conn.commit()
+
+    def import_json(self, json_path: str = LEGACY_SYNCED_FILE, target: str = "flomo") -> int:
+        """
+        导入旧版 synced_bookmarks.json 中的同步记录
+
+        同一份文件内容只导入一次（按内容哈希判断是否已导入）。
+
+        Args:
+            json_path: JSON 文件路径
+            target: 记录所属的同步目标
+
+        Returns:
+            新导入的记录数
+        """
+        if not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'rb') as f:
+                raw = f.read()
+            marker = hashlib.sha1(raw).hexdigest()
+            if self.get_meta("imported_json") == marker:
+                return 0
+            data = json.loads(raw.decode('utf-8'))
+        except Exception as e:
+            print(f"⚠️  读取旧版同步记录失败: {e}")
+            return 0
+
+        synced_ids = data.get("synced_ids", [])
+        before = self.count(target=target)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO synced (bookmark_id, target, book_id, synced_at) VALUES (?, ?, '', ?)",
+                [(str(bookmark_id), target, now) for bookmark_id in synced_ids]
+            )
+            self._conn.commit()
+        self.set_meta("imported_json", marker)
+        return self.count(target=target) - before
+
+    def close(self):
+        """
+        清理发件箱后把 WAL 合并回主数据库文件并关闭连接，可重复调用
+
+        已发送的 memo 在 mark_sent 时已删除，这里再删除过期的失败记录
+        （secure_delete 下删除的内容已被覆盖）。VACUUM 要重写整个数据库，
+        只在空闲页超过 VACUUM_FREE_RATIO 时才做
+        """
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self.prune_outbox()
+                free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+                total_pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+                if free_pages > total_pages * VACUUM_FREE_RATIO:
+                    self._conn.execute("VACUUM")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                self._conn.close()
+                self._conn = None
@@ -2,8 +2,303 @@
 模板渲染器
 """
 from datetime import datetime
-from typing import Dict, Optional, List
-from .config_manager import config
+from operator import itemgetter
+from string import Formatter
+from typing import Callable, Dict, Optional, List, Tuple, Union
+from .config_manager import config, ConfigSnapshot
+
+# 模板中可用的占位符
+TEMPLATE_FIELDS = (
+    "book_title",
+    "author",
+    "highlight_text",
+    "chapter_info",
+    "book_url",
+    "ai_summary_section",
+    "note_section",
+    "create_time",
+    "tags",
+)
+
+
+def _collapse_blank_lines(content: str) -> str:
+    """把连续的空行合并为一行"""
+    cleaned_lines = []
+    prev_empty = False
+
+    for line in content.split('\n'):
+        is_empty = not line.strip()
+
+        if is_empty:
+            if not prev_empty:
+                cleaned_lines.append(line)
+            prev_empty = True
+        else:
+            cleaned_lines.append(line)
+            prev_empty = False
+
+    return '\n'.join(cleaned_lines)
+
+
+# 段落占位符：有内容时渲染为以换行结尾的一整行（如 "💭 我的思考：…\n"），否则为空
+SECTION_FIELDS = ("ai_summary_section", "note_section")
+
+# 取字符串的最后一个字符（空字符串得到空字符串）
+_last_char = itemgetter(slice(-1, None))
+
+
+def _tuple_getter(indexes: Tuple[int, ...]) -> Callable[[tuple], tuple]:
+    """按序号从值元组中取值，总是返回元组（itemgetter 只有一个序号时返回单个值）"""
+    if not indexes:
+        return lambda values: ()
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda values: (values[index],)
+    return itemgetter(*indexes)
+
+
+class _TemplateForm:
+    """
+    段落占位符有/无内容确定后的模板
+
+    空行的合并只取决于哪些 "只由空白和占位符组成的行" 渲染后为空，
+    按这些行的空/非空组合预先算出合并空行后的固定片段（按需生成并缓存），
+    渲染时把值填进片段之间再 join 一次。
+    """
+
+    def __init__(self, source: str, order: Tuple[str, ...], present: Tuple[str, ...]):
+        """
+        解析展开后的模板的行结构
+
+        Args:
+            source: 段落占位符已展开的模板（有内容的段落占位符后面跟着它自己的换行）
+            order: 值元组中各占位符的顺序
+            present: 有内容的段落占位符（值里带着上面那个换行）
+        """
+        self._order = order
+        self._present = present
+        # 值里应有的换行数（每个有内容的段落末尾一个）
+        self.newlines = len(present)
+        # 每行为 (模板行, 不含占位符时是否为空行, 可能变空的行的序号)
+        self._lines: List[Tuple[str, bool, Optional[int]]] = []
+        # 只由空白和占位符组成的行用到的占位符：占位符都为空时这一行会变成空行
+        blank_capable: List[Tuple[int, ...]] = []
+
+        for line in source.split('\n'):
+            parsed = list(Formatter().parse(line))
+            line_fields = [order.index(field) for _, field, _, _ in parsed if field is not None]
+
+            literal_blank = not ''.join(literal for literal, _, _, _ in parsed).strip()
+            if not line_fields:
+                self._lines.append((line, literal_blank, None))
+            elif literal_blank:
+                self._lines.append((line, False, len(blank_capable)))
+                blank_capable.append(tuple(line_fields))
+            else:
+                self._lines.append((line, False, None))
+
+        # 取出每个可能变空的行的内容（只有一个占位符的行直接取值）
+        if all(len(fields) == 1 for fields in blank_capable):
+            self.line_values = _tuple_getter(tuple(fields[0] for fields in blank_capable))
+        else:
+            getters = [_tuple_getter(fields) for fields in blank_capable]
+            self.line_values = lambda values: [''.join(get(values)) for get in getters]
+
+        # 可能变空的行的空/非空组合 -> (取值函数, 固定片段)，没有占位符时为 (None, 渲染结果)
+        self.variants: Dict[Tuple[bool, ...], Tuple[Optional[Callable], Union[str, List[str]]]] = {}
+
+    def variant(self, filled_flags: Tuple[bool, ...]):
+        """可能变空的行按 filled_flags 非空/为空时，合并空行后的 (取值函数, 固定片段)"""
+        lines = []
+        prev_empty = False
+        for line, static_blank, capable_index in self._lines:
+            is_empty = static_blank if capable_index is None else not filled_flags[capable_index]
+            if is_empty and prev_empty:
+                continue
+            lines.append(line)
+            prev_empty = is_empty
+
+        segments = ['']
+        indexes = []
+        skip_newline = False
+        for literal, field, _, _ in Formatter().parse('\n'.join(lines)):
+            if skip_newline and literal.startswith('\n'):
+                literal = literal[1:]
+            segments[-1] += literal
+            skip_newline = False
+            if field is not None:
+                indexes.append(self._order.index(field))
+                segments.append('')
+                # 有内容的段落的值已经带着它后面的换行
+                skip_newline = field in self._present
+
+        if indexes:
+            # 片段和值交替排列：[片段, 值, 片段, 值, ..., 片段]，值的位置渲染时填入
+            parts = [None] * (2 * len(segments) - 1)
+            parts[::2] = segments
+            variant = (_tuple_getter(tuple(indexes)), parts)
+        else:
+            variant = (None, segments[0].strip())
+        self.variants[filled_flags] = variant
+        return variant
+
+
+class CompiledTemplate:
+    """
+    预编译的模板
+
+    加载时解析出占位符并检查是否都可用。段落占位符（笔记、AI 摘要）按有无内容
+    展开成固定的行结构（_TemplateForm，按需生成并缓存），空行在编译时合并，
+    渲染时只需把值填进固定片段之间 join 一次；只有其他占位符的值带有换行时才逐行清理。
+    """
+
+    def __init__(self, source: str, name: str = ""):
+        """
+        编译模板
+
+        Args:
+            source: 模板字符串（str.format 语法）
+            name: 模板名称（用于错误信息）
+
+        Raises:
+            ValueError: 模板语法错误或使用了未知的占位符
+        """
+        self.source = source
+        self.name = name
+        label = f"模板 {name}" if name else "模板"
+
+        self.fields = set()
+        # 带转换或格式说明（如 {author!r}）的占位符渲染结果不等于原值，只能逐行清理
+        self._formatted_fields = False
+
+        for line in source.split('\n'):
+            try:
+                parsed = list(Formatter().parse(line))
+            except ValueError as e:
+                raise ValueError(f"{label}格式错误: {e}（行: {line.strip()}）") from e
+
+            for literal, field, format_spec, conversion in parsed:
+                if field is None:
+                    continue
+                if field not in TEMPLATE_FIELDS:
+                    raise ValueError(
+                        f"{label}中有未知的占位符 {{{field}}}，可用的占位符: "
+                        + ", ".join(f"{{{name}}}" for name in TEMPLATE_FIELDS)
+                    )
+                self.fields.add(field)
+                if format_spec or conversion:
+                    self._formatted_fields = True
+
+        self._plain_format = source.format_map
+        self._parsed = list(Formatter().parse(source))
+        # 模板用到的段落占位符排在值元组的最前面
+        self._sections = tuple(field for field in SECTION_FIELDS if field in self.fields)
+        self._order = self._sections + tuple(sorted(self.fields.difference(self._sections)))
+        if len(self._order) > 1:
+            self._values_of = itemgetter(*self._order)
+        else:
+            self._values_of = lambda values, fields=self._order: tuple(values[field] for field in fields)
+        # 各段落值的最后一个字符 -> 展开后的模板
+        self._forms: Dict[Tuple[str, ...], _TemplateForm] = {}
+
+        # {highlight_text} 所在行的前缀（合并模式下加到每一行上）
+        self.highlight_prefix = ""
+        for line in source.split('\n'):
+            if '{highlight_text}' in line:
+                self.highlight_prefix = line[:line.index('{highlight_text}')]
+                break
+
+    def _form(self, tails: Tuple[str, ...]) -> Optional[_TemplateForm]:
+        """
+        段落占位符按有/无内容展开后的模板：有内容时换行写进模板，没有内容时去掉占位符
+
+        Args:
+            tails: 各段落值的最后一个字符
+
+        Returns:
+            展开后的模板；有段落不以换行结尾时返回 None
+        """
+        if any(tail not in ('', '\n') for tail in tails):
+            return None
+        present = tuple(tail == '\n' for tail in tails)
+        parts = []
+        for literal, field, _, _ in self._parsed:
+            parts.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is None:
+                continue
+            if field not in self._sections:
+                parts.append(f"{{{field}}}")
+            elif present[self._sections.index(field)]:
+                parts.append(f"{{{field}}}\n")
+        form = _TemplateForm(
+            ''.join(parts),
+            self._order,
+            tuple(field for field, filled in zip(self._sections, present) if filled)
+        )
+        self._forms[tails] = form
+        return form
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        用占位符的值渲染模板
+
+        Args:
+            values: 占位符 -> 值（模板用到的占位符必须都提供）
+
+        Returns:
+            渲染后的内容
+        """
+        if not self._formatted_fields:
+            ordered = self._values_of(values)
+            # 按段落的最后一个字符（空或换行）选择行结构
+            tails = tuple(map(_last_char, ordered[:len(self._sections)]))
+            form = self._forms.get(tails) or self._form(tails)
+            # 只有有内容的段落末尾可以有换行，其他换行会改变行结构
+            if form is not None and ''.join(ordered).count('\n') == form.newlines:
+                filled_flags = tuple(map(bool, map(str.strip, form.line_values(ordered))))
+                get, segments = form.variants.get(filled_flags) or form.variant(filled_flags)
+                if get is None:
+                    return segments
+                parts = list(segments)
+                parts[1::2] = get(ordered)
+                return ''.join(parts).strip()
+
+        # 值里带有换行时无法预先确定空行位置
+        return _collapse_blank_lines(self._plain_format(values)).strip()
+
+
+_compiled_templates: Dict[str, CompiledTemplate] = {}
+
+
+def compile_template(source: str, name: str = "") -> CompiledTemplate:
+    """编译模板（同样的模板只编译一次）"""
+    compiled = _compiled_templates.get(source)
+    if compiled is None:
+        compiled = CompiledTemplate(source, name)
+        _compiled_templates[source] = compiled
+    return compiled
+
+
+def load_templates(settings: Optional[ConfigSnapshot] = None) -> Dict[str, CompiledTemplate]:
+    """
+    编译 config.yaml 中的所有模板和内置默认模板
+
+    在同步开始前调用，模板有错误时立即报错，而不是在同步途中才失败。
+
+    Args:
+        settings: 配置快照，默认使用当前的全局配置
+
+    Returns:
+        模板名称 -> 编译后的模板
+
+    Raises:
+        ValueError: 某个模板语法错误或使用了未知的占位符
+    """
+    settings = settings or config.snapshot
+    compiled = {"default": compile_template(settings.fallback_template, "default")}
+    for name, source in settings.templates.items():
+        compiled[name] = compile_template(source, name)
+    return compiled
 
 
 class TemplateRenderer:
@@ -11,7 +306,7 @@ class TemplateRenderer:
 
     @staticmethod
     def render(
-        template: str,
+        template: Union[str, CompiledTemplate],
         book_title: str,
         author: str,
         highlight_text: str,
@@ -26,7 +321,7 @@ class TemplateRenderer:
         渲染模板
 
         Args:
-            template: 模板字符串
+            template: 模板字符串或编译后的模板
             book_title: 书名
             author: 作者
             highlight_text: 划线内容
@@ -62,37 +357,83 @@ class TemplateRenderer:
         # 处理标签
         tags_str = " ".join(tags) if tags else ""
 
-        # 替换模板变量
-        content = template.format(
+        # 替换模板变量（空行已在编译时合并）
+        if not isinstance(template, CompiledTemplate):
+            template = compile_template(template)
+        return template.render({
+            "book_title": book_title,
+            "author": author,
+            "highlight_text": highlight_text,
+            "chapter_info": chapter_info,
+            "book_url": book_url,
+            "ai_summary_section": ai_summary_section,
+            "note_section": note_section,
+            "create_time": create_time,
+            "tags": tags_str
+        })
+
+    @staticmethod
+    def render_coalesced(
+        template: Union[str, CompiledTemplate],
+        book_title: str,
+        author: str,
+        highlights: List[Dict],
+        chapter_name: str = "",
+        book_url: str = "",
+        create_time: str = "",
+        tags: List[str] = None
+    ) -> str:
+        """
+        把同一章节的多条划线合并渲染成一条 memo
+
+        模板中 {highlight_text} 的位置换成多条划线（每条后面跟着各自的笔记和 AI 摘要），
+        {highlight_text} 所在行的前缀（如引用符号 "> "）会加到每一行上。
+
+        Args:
+            template: 模板字符串或编译后的模板
+            book_title: 书名
+            author: 作者
+            highlights: 划线列表，每项包含 highlight_text，可选 note_text、ai_summary
+            chapter_name: 章节名
+            book_url: 书籍链接
+            create_time: 创建时间
+            tags: 标签列表
+
+        Returns:
+            渲染后的内容
+        """
+        if not isinstance(template, CompiledTemplate):
+            template = compile_template(template)
+        # {highlight_text} 所在行的前缀
+        prefix = template.highlight_prefix
+
+        block_lines = []
+        for index, item in enumerate(highlights):
+            if index > 0:
+                block_lines.append("")
+            block_lines.extend(item.get("highlight_text", "").split('\n'))
+            if item.get("note_text"):
+                block_lines.append(f"💭 我的思考：{item['note_text']}")
+            if item.get("ai_summary"):
+                block_lines.append(f"✨ AI 摘要：{item['ai_summary']}")
+
+        # 第一行的前缀由模板本身提供
+        highlight_block = block_lines[0] if block_lines else ""
+        for line in block_lines[1:]:
+            highlight_block += "\n" + (prefix + line if line else prefix.rstrip())
+
+        # 笔记和摘要已经放进划线块中
+        return TemplateRenderer.render(
+            template=template,
             book_title=book_title,
             author=author,
-            highlight_text=highlight_text,
-            chapter_info=chapter_info,
+            highlight_text=highlight_block,
+            chapter_name=chapter_name,
             book_url=book_url,
-            ai_summary_section=ai_summary_section,
-            note_section=note_section,
             create_time=create_time,
-            tags=tags_str
+            tags=tags
         )
 
-        # 清理多余的空行
-        lines = content.split('\n')
-        cleaned_lines = []
-        prev_empty = False
-
-        for line in lines:
-            is_empty = not line.strip()
-
-            if is_empty:
-                if not prev_empty:
-                    cleaned_lines.append(line)
-                prev_empty = True
-            else:
-                cleaned_lines.append(line)
-                prev_empty = False
-
-        return '\n'.join(cleaned_lines).strip()
-
 
 class TagGenerator:
     """标签生成器"""
@@ -171,13 +512,45 @@ class TagGenerator:
         Returns:
             标签列表
         """
+        return BookTagContext(book_title, author, category).generate_tags(ai_tags)
+
+
+class BookTagContext:
+    """
+    一本书的标签上下文
+
+    书名、默认、分类、作者标签对同一本书的每条划线都相同，创建时计算一次；
+    每条划线只需把 AI 标签合并进去。
+    """
+
+    def __init__(
+        self,
+        book_title: str,
+        author: str,
+        category: Optional[str] = None,
+        settings: Optional[ConfigSnapshot] = None
+    ):
+        """
+        计算这本书固定的标签
+
+        Args:
+            book_title: 书名
+            author: 作者
+            category: 书籍分类
+            settings: 配置快照，默认使用当前的全局配置
+        """
+        self.book_title = book_title
+        self.author = author
+        self.category = category
+        settings = settings or config.snapshot
+
         tags = []
 
         # 检查是否启用层级标签
-        use_hierarchical = config.get('tags.use_hierarchical_tags', True)
+        use_hierarchical = settings.use_hierarchical_tags
 
         # 处理书名标签（层级或独立）
-        if config.should_add_book_title_tag():
+        if settings.add_book_title_tag:
             # 清理书名
             clean_title = TagGenerator._clean_book_title(book_title)
             
@@ -187,39 +560,56 @@ class TagGenerator:
                 tags.append(book_tag)
             else:
                 # 使用独立标签: #微信读书 #书名
-                default_tags = config.get('tags.default', ['#微信读书'])
+                default_tags = settings.default_tags
                 tags.extend(default_tags)
                 book_tag = f"#{clean_title}"
                 tags.append(book_tag)
         else:
             # 不添加书名标签时，只添加默认标签
-            default_tags = config.get('tags.default', ['#微信读书'])
+            default_tags = settings.default_tags
             tags.extend(default_tags)
 
         # 添加分类标签
         if category:
-            category_tags = config.get_category_tags(category)
+            category_tags = settings.category_tags.get(category, ())
             tags.extend(category_tags)
 
-        # 添加AI标签
-        if ai_tags:
-            tags.extend(ai_tags)
+        # AI 标签排在分类标签之后、作者标签之前
+        self._prefix = _unique(tags)
+        self._prefix_set = frozenset(self._prefix)
 
         # 添加作者标签
-        if config.should_add_author_tag():
+        self._suffix = []
+        if settings.add_author_tag:
             author_clean = author.replace(' ', '_')
             author_tag = f"#{author_clean}"
-            tags.append(author_tag)
+            if author_tag not in self._prefix_set:
+                self._suffix.append(author_tag)
 
-        # 去重并保持顺序
-        seen = set()
-        unique_tags = []
-        for tag in tags:
-            if tag not in seen:
-                seen.add(tag)
-                unique_tags.append(tag)
+    def generate_tags(self, ai_tags: List[str] = None) -> List[str]:
+        """
+        生成一条划线的标签列表（固定标签 + AI 标签，去重并保持顺序）
 
-        return unique_tags
+        Args:
+            ai_tags: AI生成的标签
+
+        Returns:
+            标签列表
+        """
+        if not ai_tags:
+            return self._prefix + self._suffix
+        return _unique(self._prefix + ai_tags + self._suffix)
+
+
+def _unique(tags: List[str]) -> List[str]:
+    """去重并保持顺序"""
+    seen = set()
+    unique_tags = []
+    for tag in tags:
+        if tag not in seen:
+            seen.add(tag)
+            unique_tags.append(tag)
+    return unique_tags
 
 
 if __name__ == "__main__":
@@ -2,18 +2,19 @@
 微信读书数据提取工具
 """
 import os
+import re
 import time
+import threading
 import requests
 import json
 from http.cookies import SimpleCookie
 from requests.utils import cookiejar_from_dict
 from typing import Dict, List, Optional
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+from .rate_limiter import rate_limiter, RateLimitedSession
 
 # 微信读书 API 端点（参考 mcp-server-weread 项目）
+WEREAD_HOST = "weread.qq.com"
 WEREAD_URL = "https://weread.qq.com/"
 WEREAD_NOTEBOOKS_URL = "https://weread.qq.com/api/user/notebook"
 WEREAD_BOOKMARKLIST_URL = "https://weread.qq.com/web/book/bookmarklist"
@@ -22,10 +23,29 @@ WEREAD_READ_INFO_URL = "https://weread.qq.com/web/book/getProgress"
 WEREAD_REVIEW_LIST_URL = "https://weread.qq.com/web/review/list"
 WEREAD_BOOK_INFO = "https://weread.qq.com/api/book/info"
 
+# 会话预热的默认有效期（秒），过期后才重新访问主页和笔记本列表刷新 wr_skey
+SESSION_WARMUP_TTL = 600
+
+# chapterInfos 接口每次请求包含的书籍数量
+CHAPTER_INFO_CHUNK_SIZE = 20
+
+# 表示登录态失效的错误码（-2012: 登录超时，-2010: 用户不存在/未登录）
+WEREAD_AUTH_ERROR_CODES = {-2010, -2012}
+
 # 全局 session 对象
 _session = None
 
 
+def session_warmup_ttl() -> int:
+    """会话预热的有效期（秒），可通过 WEREAD_SESSION_TTL 环境变量修改"""
+    return int(os.getenv("WEREAD_SESSION_TTL", str(SESSION_WARMUP_TTL)))
+
+
+def set_request_rate(rate: float, burst: float = 1):
+    """设置微信读书 API 的速率限制（请求/秒，0 表示不限制）"""
+    rate_limiter.configure(WEREAD_HOST, rate, burst)
+
+
 def parse_cookie_string(cookie_string: str):
     """解析 Cookie 字符串，返回 cookiejar"""
     cookie = SimpleCookie()
@@ -56,10 +76,26 @@ def init_session(cookie_string: str):
     - 设置完整的浏览器 headers，模拟真实浏览器行为
     """
     global _session
-    _session = requests.Session()
+    _session = RateLimitedSession()
 
     # ⚠️ 关键修改：直接在 headers 中设置 Cookie（mcp-server-weread 的做法）
-    _session.headers.update({
+    _session.headers.update(_build_session_headers(cookie_string))
+
+    # 先访问主页建立会话 - 使用完整的浏览器headers（参考MCP的visitHomepage）
+    try:
+        _session.get(WEREAD_URL, headers=_build_homepage_headers(cookie_string), timeout=30)
+    except Exception as e:
+        print(f"⚠️ 访问主页失败: {e}")
+
+    # 新 session 需要重新预热
+    _warmup.invalidate()
+
+    return _session
+
+
+def _build_session_headers(cookie_string: str) -> Dict[str, str]:
+    """session 默认请求头，模拟真实浏览器行为"""
+    return {
         'Cookie': cookie_string,  # 直接设置 Cookie 字符串
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
         'Accept': 'application/json, text/plain, */*',
@@ -73,31 +109,27 @@ def init_session(cookie_string: str):
         'Sec-Fetch-Dest': 'empty',
         'Sec-Fetch-Mode': 'cors',
         'Sec-Fetch-Site': 'same-origin',
-    })
+    }
 
-    # 先访问主页建立会话 - 使用完整的浏览器headers（参考MCP的visitHomepage）
-    try:
-        homepage_headers = {
-            'Cookie': cookie_string,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-            'Connection': 'keep-alive',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'cache-control': 'no-cache',
-            'pragma': 'no-cache',
-            'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"Windows"',
-            'sec-fetch-dest': 'document',
-            'sec-fetch-mode': 'navigate',
-            'sec-fetch-site': 'same-origin',
-            'upgrade-insecure-requests': '1'
-        }
-        _session.get(WEREAD_URL, headers=homepage_headers, timeout=30)
-    except Exception as e:
-        print(f"⚠️ 访问主页失败: {e}")
 
-    return _session
+def _build_homepage_headers(cookie_string: str) -> Dict[str, str]:
+    """访问主页使用的请求头（参考MCP的visitHomepage）"""
+    return {
+        'Cookie': cookie_string,
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
+        'Connection': 'keep-alive',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'cache-control': 'no-cache',
+        'pragma': 'no-cache',
+        'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"Windows"',
+        'sec-fetch-dest': 'document',
+        'sec-fetch-mode': 'navigate',
+        'sec-fetch-site': 'same-origin',
+        'upgrade-insecure-requests': '1'
+    }
 
 
 def _refresh_session_cookie() -> str:
@@ -137,46 +169,233 @@ def _refresh_session_cookie() -> str:
         
         # 4. 更新 cookie 字符串中的 wr_skey
         if new_wr_skey:
-            import re
-            cookie_string = re.sub(
-                r'wr_skey=[^;]+',
-                f'wr_skey={new_wr_skey}',
-                cookie_string
-            )
+            cookie_string = _replace_wr_skey(cookie_string, new_wr_skey)
     except Exception as e:
         print(f"⚠️ 刷新会话失败: {e}")
     
     return cookie_string
 
 
+def _replace_wr_skey(cookie_string: str, wr_skey: str) -> str:
+    """替换 cookie 字符串中的 wr_skey"""
+    return re.sub(r'wr_skey=[^;]+', f'wr_skey={wr_skey}', cookie_string)
+
+
+class SessionWarmup:
+    """会话预热管理器
+
+    记录当前的 wr_skey 及其获取时间，只有在 TTL 过期或 API 返回登录失效
+    错误码时才重新预热，避免每个请求前都访问主页和笔记本列表。
+    """
+
+    def __init__(self, ttl: Optional[int] = None):
+        # 不指定时在首次使用时读取 WEREAD_SESSION_TTL（导入模块时环境变量可能还未加载）
+        self.ttl = ttl
+        self.cookie_string: Optional[str] = None
+        self.wr_skey: Optional[str] = None
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_expired(self) -> bool:
+        """预热结果是否已过期"""
+        if self.cookie_string is None:
+            return True
+        if self.ttl is None:
+            self.ttl = session_warmup_ttl()
+        return time.time() - self.fetched_at >= self.ttl
+
+    def invalidate(self):
+        """使当前预热结果失效，下次请求时重新预热"""
+        with self._lock:
+            self.cookie_string = None
+            self.wr_skey = None
+            self.fetched_at = 0.0
+
+    def get_cookie(self, force: bool = False) -> str:
+        """获取预热后的 cookie 字符串
+
+        Args:
+            force: 是否忽略 TTL 强制重新预热
+
+        Returns:
+            包含最新 wr_skey 的 cookie 字符串
+        """
+        with self._lock:
+            if force or self.is_expired():
+                print("→ 预热会话并获取最新 cookie...")
+                self.cookie_string = _refresh_session_cookie()
+                match = re.search(r'wr_skey=([^;]+)', self.cookie_string)
+                self.wr_skey = match.group(1) if match else None
+                self.fetched_at = time.time()
+            return self.cookie_string
+
+
+_warmup = SessionWarmup()
+
+
+def _is_auth_error(response: requests.Response) -> bool:
+    """判断响应是否表示登录态失效"""
+    if response.status_code == 401:
+        return True
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return _is_auth_error_data(data)
+
+
+def _is_auth_error_data(data) -> bool:
+    """判断响应数据中的错误码是否表示登录态失效"""
+    if not isinstance(data, dict):
+        return False
+    errcode = data.get('errCode', data.get('errcode'))
+    return errcode in WEREAD_AUTH_ERROR_CODES
+
+
+def _request_with_warmup(method: str, url: str, build_headers, **kwargs) -> requests.Response:
+    """使用预热后的 cookie 发送请求，登录失效时重新预热并重试一次
+
+    Args:
+        method: HTTP 方法
+        url: 请求地址
+        build_headers: 根据 cookie 字符串构建请求头的函数
+        **kwargs: 传给 session.request 的其他参数
+
+    Returns:
+        最后一次请求的响应
+    """
+    session = get_session()
+    response = session.request(
+        method, url, headers=build_headers(_warmup.get_cookie()), **kwargs
+    )
+    if _is_auth_error(response):
+        print("⚠️ 会话已失效，重新预热后重试...")
+        response = session.request(
+            method, url, headers=build_headers(_warmup.get_cookie(force=True)), **kwargs
+        )
+    return response
+
+
+def _build_api_headers(cookie: str) -> Dict[str, str]:
+    """划线、笔记接口使用的请求头"""
+    return {
+        'Cookie': cookie,
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    }
+
+
+def _build_chapter_headers(cookie: str, bookId: str) -> Dict[str, str]:
+    """章节接口使用的请求头（MCP 项目在 getChapterInfo 中完全重新设置 headers）"""
+    return {
+        'Cookie': cookie,
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
+        'Content-Type': 'application/json;charset=UTF-8',
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Origin': 'https://weread.qq.com',
+        'Referer': f'https://weread.qq.com/web/reader/{bookId}',
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache',
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-origin',
+    }
+
+
+def _bookmark_list_params(bookId: str) -> Dict:
+    """划线列表请求参数"""
+    return {
+        "bookId": bookId,
+        "_": int(time.time() * 1000)
+    }
+
+
+def _review_list_params(bookId: str, sync_key: int = 0) -> Dict:
+    """笔记列表请求参数（参考 weread-mcp 项目：listType=11, mine=1）
+
+    sync_key 为 0 时返回全部笔记，否则只返回该 syncKey 之后的变化
+    """
+    return {
+        "bookId": bookId,
+        "listType": 11,  # weread-mcp 使用 11
+        "mine": 1,        # weread-mcp 添加了 mine=1
+        "syncKey": sync_key,
+        "_": int(time.time() * 1000)
+    }
+
+
+def _api_error(data) -> Optional[str]:
+    """提取 API 返回的错误信息，没有错误返回 None"""
+    if isinstance(data, dict) and 'errCode' in data and data['errCode'] != 0:
+        return f"{data.get('errMsg')} (code: {data.get('errCode')})"
+    return None
+
+
+def _parse_bookmark_list(data: Dict) -> List[Dict]:
+    """解析划线列表响应，过滤掉无效的划线"""
+    bookmarks = data.get("updated", [])
+    return [bm for bm in bookmarks if bm.get("markText") and bm.get("chapterUid")]
+
+
+def _parse_review_list(data: Dict) -> List[Dict]:
+    """解析笔记列表响应"""
+    reviews = data.get("reviews", [])
+
+    # MCP 项目的处理方式：提取 review 对象
+    reviews = [r.get("review") for r in reviews if r.get("review")]
+
+    # 为书评添加 chapterUid（MCP 项目的逻辑）
+    for review in reviews:
+        if review.get("type") == 4:
+            review["chapterUid"] = 1000000
+
+    return reviews
+
+
+def _parse_review_delta(data: Dict) -> Dict:
+    """解析增量笔记列表响应
+
+    Returns:
+        {"reviews": 新增或更新的笔记, "sync_key": 新的 syncKey, "removed": 已删除的笔记 ID}
+    """
+    removed = []
+    for item in data.get("removed") or []:
+        review_id = item.get("reviewId") if isinstance(item, dict) else item
+        if review_id:
+            removed.append(str(review_id))
+    return {
+        "reviews": _parse_review_list(data),
+        "sync_key": data.get("synckey", data.get("syncKey", 0)) or 0,
+        "removed": removed
+    }
+
+
+def _parse_notebooklist(data) -> List[Dict]:
+    """解析笔记本列表响应
+
+    MCP 项目的 API 返回格式可能不同，需要兼容处理
+    可能是 {books: [...]} 或者直接是数组
+    """
+    if isinstance(data, dict):
+        return data.get("books", [])
+    elif isinstance(data, list):
+        return data
+    return []
+
+
 def get_bookmark_list(bookId: str) -> List[Dict]:
     """获取书籍的划线列表
     
     注意：此 API 需要会话预热和最新的 wr_skey
     """
     try:
-        session = get_session()
-        
-        # 刷新会话并获取最新 cookie
-        print(f"→ 刷新会话并获取最新 cookie...")
-        fresh_cookie = _refresh_session_cookie()
-        
-        # 使用最新的 cookie 请求
-        headers = {
-            'Cookie': fresh_cookie,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        }
-        
-        params = {
-            "bookId": bookId,
-            "_": int(time.time() * 1000)
-        }
-        
         print(f"→ 请求划线列表: {WEREAD_BOOKMARKLIST_URL}")
-        response = session.get(
+        # 使用预热后的 cookie 请求
+        response = _request_with_warmup(
+            'GET',
             WEREAD_BOOKMARKLIST_URL,
-            params=params,
-            headers=headers,
+            _build_api_headers,
+            params=_bookmark_list_params(bookId),
             timeout=30
         )
         
@@ -186,16 +405,16 @@ def get_bookmark_list(bookId: str) -> List[Dict]:
             data = response.json()
             
             # 检查错误码
-            if 'errCode' in data and data['errCode'] != 0:
-                print(f"❌ API 返回错误: {data.get('errMsg')} (code: {data.get('errCode')})")
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
                 return []
             
-            bookmarks = data.get("updated", [])
-            print(f"✓ API 返回 {len(bookmarks)} 条原始划线")
+            print(f"✓ API 返回 {len(data.get('updated', []))} 条原始划线")
             
             # 过滤掉无效的划线
-            valid_bookmarks = [bm for bm in bookmarks if bm.get("markText") and bm.get("chapterUid")]
-            if len(valid_bookmarks) != len(bookmarks):
+            valid_bookmarks = _parse_bookmark_list(data)
+            if len(valid_bookmarks) != len(data.get("updated", [])):
                 print(f"✓ 过滤后剩余 {len(valid_bookmarks)} 条有效划线")
             
             return valid_bookmarks
@@ -209,125 +428,152 @@ def get_bookmark_list(bookId: str) -> List[Dict]:
     return []
 
 
-def get_chapter_info(bookId: str) -> List[Dict]:
-    """获取书籍章节信息
+def _review_chapter() -> Dict:
+    """构造"点评"特殊章节（书评统一归入该章节）"""
+    return {
+        'chapterUid': 1000000,
+        'chapterIdx': 1000000,
+        'updateTime': 1683825006,
+        'readAhead': 0,
+        'title': '点评',
+        'level': 1
+    }
 
-    **关键发现**：MCP 项目在 getChapterInfo 中绕过了 axiosInstance，
-    直接使用原始 axios，并完全重新设置 headers！
 
-    参考 mcp-server-weread 的实现（WeReadApi.ts:428-548）：
-    1. 先访问主页建立会话
-    2. 获取笔记本列表预热会话
-    3. 添加随机延迟模拟真实用户
-    4. **使用 session 而不是独立请求，保持会话连贯性**
-    5. 使用正确的请求头和请求体格式
+def _parse_chapter_infos(data, book_ids: List[str]) -> Optional[Dict[str, List[Dict]]]:
+    """解析 chapterInfos 响应，返回 bookId -> 章节列表
+
+    处理多种可能的响应格式（参考 MCP 项目的处理逻辑），格式不符合预期时返回 None
     """
-    try:
-        session = get_session()
-        
-        # 刷新会话并获取最新 cookie（与 get_bookmark_list 保持一致）
-        fresh_cookie = _refresh_session_cookie()
-        
-        # 使用正确的请求体格式
-        params = {'_': int(time.time() * 1000)}  # 时间戳避免缓存
-        body = {'bookIds': [bookId]}
-        
-        # 使用最新的 cookie 请求
-        api_headers = {
-            'Cookie': fresh_cookie,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
-            'Content-Type': 'application/json;charset=UTF-8',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Origin': 'https://weread.qq.com',
-            'Referer': f'https://weread.qq.com/web/reader/{bookId}',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'same-origin',
-        }
+    # 格式1: {data: [{bookId: "xxx", updated: []}, ...]}
+    if isinstance(data, dict) and isinstance(data.get('data'), list) and len(data['data']) > 0:
+        items = data['data']
+    # 格式3: 直接是数组
+    elif isinstance(data, list) and len(data) > 0:
+        if 'chapterUid' in data[0]:
+            return {book_ids[0]: data} if len(book_ids) == 1 else None
+        items = data
+    # 格式2: {updated: []}（没有 bookId，只能对应单本书的请求）
+    elif isinstance(data, dict) and isinstance(data.get('updated'), list):
+        return {book_ids[0]: data['updated']} if len(book_ids) == 1 else None
+    else:
+        return None
 
-        print(f"→ 请求章节信息: {WEREAD_CHAPTER_INFO}")
-        response = session.post(
-            WEREAD_CHAPTER_INFO,
-            params=params,
-            headers=api_headers,
-            json=body,
-            timeout=60
-        )
+    result = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or 'updated' not in item:
+            continue
+        book_id = item.get('bookId')
+        if book_id is None and len(book_ids) == 1:
+            book_id = book_ids[0]
+        elif book_id is None and index < len(book_ids):
+            book_id = book_ids[index]
+        if book_id is not None:
+            result[str(book_id)] = item.get('updated') or []
+    return result
 
-        print(f"✓ 响应状态: {response.status_code}")
 
-        if response.ok:
+def get_chapter_infos(book_ids: List[str], chunk_size: int = CHAPTER_INFO_CHUNK_SIZE) -> Dict[str, List[Dict]]:
+    """批量获取多本书的章节信息
+
+    chapterInfos 接口的请求体本身就是 bookIds 数组，按 chunk_size 分批请求，
+    把 O(书籍数) 次请求降为 O(书籍数 / chunk_size) 次。
+
+    Args:
+        book_ids: 书籍 ID 列表
+        chunk_size: 每次请求包含的书籍数量
+
+    Returns:
+        bookId -> 章节列表（已追加"点评"特殊章节），获取失败的书籍不在结果中
+    """
+    # 去重并保持顺序
+    book_ids = list(dict.fromkeys(str(book_id) for book_id in book_ids if book_id))
+    chunk_size = max(1, chunk_size)
+    result = {}
+
+    for offset in range(0, len(book_ids), chunk_size):
+        chunk = book_ids[offset:offset + chunk_size]
+        try:
+            # 使用正确的请求体格式
+            params = {'_': int(time.time() * 1000)}  # 时间戳避免缓存
+            body = {'bookIds': chunk}
+
+            # 使用预热后的 cookie 请求（与 get_bookmark_list 保持一致）
+            def build_headers(cookie: str) -> Dict[str, str]:
+                return _build_chapter_headers(cookie, chunk[0])
+
+            print(f"→ 请求章节信息: {WEREAD_CHAPTER_INFO} ({len(chunk)} 本书)")
+            response = _request_with_warmup(
+                'POST',
+                WEREAD_CHAPTER_INFO,
+                build_headers,
+                params=params,
+                json=body,
+                timeout=60
+            )
+
+            print(f"✓ 响应状态: {response.status_code}")
+
+            if not response.ok:
+                print(f"❌ 请求失败: HTTP {response.status_code}")
+                print(f"响应内容: {response.text[:500]}")
+                continue
+
             data = response.json()
+            chapters_by_book = _parse_chapter_infos(data, chunk)
 
-            # 7. 处理多种可能的响应格式（参考 MCP 项目的处理逻辑）
-            chapters = None
-
-            # 格式1: {data: [{bookId: "xxx", updated: []}]}
-            if isinstance(data.get('data'), list) and len(data['data']) > 0:
-                chapters = data['data'][0].get('updated', [])
-            # 格式2: {updated: []}
-            elif 'updated' in data and isinstance(data['updated'], list):
-                chapters = data['updated']
-            # 格式3: 直接是数组
-            elif isinstance(data, list) and len(data) > 0:
-                if 'updated' in data[0]:
-                    chapters = data[0]['updated']
-                elif 'chapterUid' in data[0]:
-                    chapters = data
-
-            if chapters is not None:
-                print(f"✓ 获取到 {len(chapters)} 个章节")
-                # 添加"点评"特殊章节
-                chapters.append({
-                    'chapterUid': 1000000,
-                    'chapterIdx': 1000000,
-                    'updateTime': 1683825006,
-                    'readAhead': 0,
-                    'title': '点评',
-                    'level': 1
-                })
-                return chapters
+            if chapters_by_book is not None:
+                for book_id, chapters in chapters_by_book.items():
+                    # 添加"点评"特殊章节
+                    chapters.append(_review_chapter())
+                    result[book_id] = chapters
+                print(f"✓ 获取到 {len(chapters_by_book)} 本书的章节信息")
+                continue
 
             # 检查错误码
-            if 'errcode' in data or 'errCode' in data:
+            if isinstance(data, dict) and ('errcode' in data or 'errCode' in data):
                 errcode = data.get('errcode') or data.get('errCode')
                 errmsg = data.get('errmsg') or data.get('errMsg', 'Unknown error')
                 print(f"❌ API 返回错误: {errmsg} (code: {errcode})")
-                return []
+                continue
 
             print(f"⚠️ 获取章节信息失败: 返回格式不符合预期")
             print(f"响应数据: {data}")
-            return []
-        else:
-            print(f"❌ 请求失败: HTTP {response.status_code}")
-            print(f"响应内容: {response.text[:500]}")
-            return []
 
-    except Exception as e:
-        print(f"❌ 获取章节信息失败: {e}")
-        import traceback
-        traceback.print_exc()
-    return []
+        except Exception as e:
+            print(f"❌ 获取章节信息失败: {e}")
+            import traceback
+            traceback.print_exc()
+
+    return result
+
+
+def get_chapter_info(bookId: str) -> List[Dict]:
+    """获取单本书的章节信息（get_chapter_infos 的单本书版本）"""
+    return get_chapter_infos([bookId]).get(str(bookId), [])
 
 
 def get_bookinfo(bookId: str) -> Optional[Dict]:
-    """获取书籍详细信息"""
+    """获取书籍详细信息（登录失效时重新预热并重试一次）"""
     params = {
         "bookId": bookId,
         "_": int(time.time() * 1000)  # 添加时间戳避免缓存
     }
     try:
-        session = get_session()
-        response = session.get(
+        response = _request_with_warmup(
+            'GET',
             WEREAD_BOOK_INFO,
+            _build_api_headers,
             params=params,
             timeout=30
         )
         if response.ok:
-            return response.json()
+            data = response.json()
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return None
+            return data
     except Exception as e:
         print(f"获取书籍信息失败: {e}")
     return None
@@ -336,59 +582,53 @@ def get_bookinfo(bookId: str) -> Optional[Dict]:
 def get_notebooklist() -> List[Dict]:
     """获取笔记本列表
 
+    每次运行的第一个请求：缓存的 wr_skey 过期时重新预热并重试一次，
+    而不是把登录失效当成没有书籍。
+
     注意：
     - MCP 项目在所有 GET 请求中添加时间戳参数避免缓存
     - 返回的是完整的 data 对象，包含 books 数组
     """
     try:
-        session = get_session()
         # 添加时间戳参数避免缓存（MCP 项目的做法）
         params = {'_': int(time.time() * 1000)}
-        response = session.get(WEREAD_NOTEBOOKS_URL, params=params, timeout=30)
+        response = _request_with_warmup(
+            'GET',
+            WEREAD_NOTEBOOKS_URL,
+            _build_api_headers,
+            params=params,
+            timeout=30
+        )
         if response.ok:
             data = response.json()
-            # MCP 项目的 API 返回格式可能不同，需要兼容处理
-            # 可能是 {books: [...]} 或者直接是数组
-            if isinstance(data, dict):
-                return data.get("books", [])
-            elif isinstance(data, list):
-                return data
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return []
+            return _parse_notebooklist(data)
+        print(f"❌ 获取笔记本列表失败: HTTP {response.status_code}")
     except Exception as e:
         print(f"获取笔记本列表失败: {e}")
     return []
 
 
-def get_review_list(bookId: str) -> List[Dict]:
-    """获取书籍的笔记列表
+def get_review_delta(bookId: str, sync_key: int = 0) -> Optional[Dict]:
+    """获取书籍笔记列表自 sync_key 之后的变化
 
     参考 weread-mcp 项目的参数设置
     关键参数: listType=11, mine=1
     注意：此 API 需要会话预热和最新的 wr_skey
+
+    Returns:
+        {"reviews": [...], "sync_key": int, "removed": [...]}，失败返回 None
     """
     try:
-        session = get_session()
-        
-        # 刷新会话并获取最新 cookie
-        fresh_cookie = _refresh_session_cookie()
-        
-        # 使用最新的 cookie 请求
-        headers = {
-            'Cookie': fresh_cookie,
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        }
-        
-        params = {
-            "bookId": bookId,
-            "listType": 11,  # weread-mcp 使用 11
-            "mine": 1,        # weread-mcp 添加了 mine=1
-            "syncKey": 0,
-            "_": int(time.time() * 1000)
-        }
-        
-        response = session.get(
+        # 使用预热后的 cookie 请求
+        response = _request_with_warmup(
+            'GET',
             WEREAD_REVIEW_LIST_URL,
-            params=params,
-            headers=headers,
+            _build_api_headers,
+            params=_review_list_params(bookId, sync_key),
             timeout=30
         )
         
@@ -396,24 +636,21 @@ def get_review_list(bookId: str) -> List[Dict]:
             data = response.json()
             
             # 检查错误码
-            if 'errCode' in data and data['errCode'] != 0:
-                print(f"❌ API 返回错误: {data.get('errMsg')} (code: {data.get('errCode')})")
-                return []
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return None
             
-            reviews = data.get("reviews", [])
-
-            # MCP 项目的处理方式：提取 review 对象
-            reviews = [r.get("review") for r in reviews if r.get("review")]
-
-            # 为书评添加 chapterUid（MCP 项目的逻辑）
-            for review in reviews:
-                if review.get("type") == 4:
-                    review["chapterUid"] = 1000000
-
-            return reviews
+            return _parse_review_delta(data)
     except Exception as e:
         print(f"获取笔记列表失败: {e}")
-    return []
+    return None
+
+
+def get_review_list(bookId: str) -> List[Dict]:
+    """获取书籍的全部笔记列表"""
+    delta = get_review_delta(bookId)
+    return delta["reviews"] if delta else []
 
 
 def try_get_cloud_cookie(cc_url: str, cc_id: str, cc_password: str) -> Optional[str]:
@@ -0,0 +1,308 @@
+"""
+微信读书异步 API 客户端
+基于 aiohttp，每个实例拥有独立的 session 和 cookie 状态，
+适合在一个进程中并发处理大量请求或多个账号
+
+依赖：pip install aiohttp（可选依赖，只有使用本模块时才需要）
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from .weread_api import (
+    WEREAD_URL,
+    WEREAD_NOTEBOOKS_URL,
+    WEREAD_BOOKMARKLIST_URL,
+    WEREAD_CHAPTER_INFO,
+    WEREAD_REVIEW_LIST_URL,
+    WEREAD_BOOK_INFO,
+    session_warmup_ttl,
+    CHAPTER_INFO_CHUNK_SIZE,
+    _build_session_headers,
+    _build_homepage_headers,
+    _build_api_headers,
+    _build_chapter_headers,
+    _bookmark_list_params,
+    _review_list_params,
+    _replace_wr_skey,
+    _review_chapter,
+    _api_error,
+    _is_auth_error_data,
+    _parse_bookmark_list,
+    _parse_chapter_infos,
+    _parse_review_list,
+    _parse_notebooklist
+)
+
+
+class AsyncWeReadClient:
+    """微信读书异步客户端
+
+    用法：
+        async with AsyncWeReadClient(cookie) as client:
+            books = await client.notebooks()
+            results = await asyncio.gather(*(client.bookmarks(b["bookId"]) for b in books))
+    """
+
+    def __init__(
+        self,
+        cookie_string: str,
+        max_concurrency: int = 8,
+        warmup_ttl: Optional[int] = None
+    ):
+        """
+        初始化异步客户端
+
+        Args:
+            cookie_string: 微信读书 Cookie 字符串
+            max_concurrency: 同时进行中的最大请求数
+            warmup_ttl: 会话预热有效期（秒），默认读取 WEREAD_SESSION_TTL
+        """
+        self.cookie_string = cookie_string
+        self.max_concurrency = max(1, max_concurrency)
+        self.warmup_ttl = warmup_ttl if warmup_ttl is not None else session_warmup_ttl()
+
+        # 会话预热状态（每个实例独立）
+        self.wr_skey: Optional[str] = None
+        self.warmed_at = 0.0
+        self._warm_cookie: Optional[str] = None
+
+        self._session = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._warmup_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "AsyncWeReadClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """创建 HTTP session 并访问主页建立会话"""
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("AsyncWeReadClient 需要 aiohttp，请先运行: pip install aiohttp") from e
+
+        if self._session is not None:
+            return
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._warmup_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(
+            headers=_build_session_headers(self.cookie_string),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+
+        try:
+            async with self._session.get(
+                WEREAD_URL, headers=_build_homepage_headers(self.cookie_string)
+            ) as response:
+                await response.read()
+        except Exception as e:
+            print(f"⚠️ 访问主页失败: {e}")
+
+    async def close(self):
+        """关闭 HTTP session"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            raise RuntimeError("Session 未初始化，请先调用 open() 或使用 async with")
+        return self._session
+
+    async def _get_cookie(self, force: bool = False) -> str:
+        """获取预热后的 cookie，仅在 TTL 过期或强制刷新时重新预热"""
+        async with self._warmup_lock:
+            expired = (
+                self._warm_cookie is None
+                or time.time() - self.warmed_at >= self.warmup_ttl
+            )
+            if force or expired:
+                self._warm_cookie = await self._refresh_session_cookie()
+                self.warmed_at = time.time()
+            return self._warm_cookie
+
+    async def _refresh_session_cookie(self) -> str:
+        """访问主页和笔记本列表预热会话，返回包含最新 wr_skey 的 cookie"""
+        session = self._get_session()
+        cookie_string = self.cookie_string
+        try:
+            async with self._semaphore:
+                async with session.get(WEREAD_URL, headers={
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                    'Accept-Language': 'zh-CN,zh;q=0.9',
+                }) as response:
+                    await response.read()
+                async with session.get(
+                    WEREAD_NOTEBOOKS_URL, params={'_': int(time.time() * 1000)}
+                ) as response:
+                    await response.read()
+
+            for cookie in session.cookie_jar:
+                if cookie.key == 'wr_skey':
+                    self.wr_skey = cookie.value
+                    cookie_string = _replace_wr_skey(cookie_string, cookie.value)
+                    break
+        except Exception as e:
+            print(f"⚠️ 刷新会话失败: {e}")
+        return cookie_string
+
+    async def _request_json(self, method: str, url: str, build_headers, **kwargs):
+        """发送请求并返回 JSON，登录失效时重新预热并重试一次
+
+        Returns:
+            响应 JSON，HTTP 失败返回 None
+        """
+        session = self._get_session()
+        for attempt in range(2):
+            cookie = await self._get_cookie(force=attempt > 0)
+            async with self._semaphore:
+                async with session.request(
+                    method, url, headers=build_headers(cookie), **kwargs
+                ) as response:
+                    if response.status == 401 and attempt == 0:
+                        continue
+                    if response.status >= 400:
+                        text = await response.text()
+                        print(f"❌ 请求失败: HTTP {response.status}")
+                        print(f"响应内容: {text[:200]}")
+                        return None
+                    data = await response.json(content_type=None)
+            if attempt == 0 and _is_auth_error_data(data):
+                print("⚠️ 会话已失效，重新预热后重试...")
+                continue
+            return data
+        return None
+
+    async def notebooks(self) -> List[Dict]:
+        """获取笔记本列表"""
+        try:
+            data = await self._request_json(
+                'GET',
+                WEREAD_NOTEBOOKS_URL,
+                _build_api_headers,
+                params={'_': int(time.time() * 1000)}
+            )
+            if data is None:
+                return []
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return []
+            return _parse_notebooklist(data)
+        except Exception as e:
+            print(f"获取笔记本列表失败: {e}")
+        return []
+
+    async def bookmarks(self, book_id: str) -> List[Dict]:
+        """获取书籍的划线列表"""
+        try:
+            data = await self._request_json(
+                'GET',
+                WEREAD_BOOKMARKLIST_URL,
+                _build_api_headers,
+                params=_bookmark_list_params(book_id)
+            )
+            if data is None:
+                return []
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return []
+            return _parse_bookmark_list(data)
+        except Exception as e:
+            print(f"❌ 获取划线列表失败: {e}")
+        return []
+
+    async def chapter_infos(
+        self,
+        book_ids: List[str],
+        chunk_size: int = CHAPTER_INFO_CHUNK_SIZE
+    ) -> Dict[str, List[Dict]]:
+        """批量获取多本书的章节信息，返回 bookId -> 章节列表"""
+        book_ids = list(dict.fromkeys(str(book_id) for book_id in book_ids if book_id))
+        chunks = [
+            book_ids[offset:offset + max(1, chunk_size)]
+            for offset in range(0, len(book_ids), max(1, chunk_size))
+        ]
+
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, List[Dict]]:
+            try:
+                data = await self._request_json(
+                    'POST',
+                    WEREAD_CHAPTER_INFO,
+                    lambda cookie: _build_chapter_headers(cookie, chunk[0]),
+                    params={'_': int(time.time() * 1000)},
+                    json={'bookIds': chunk},
+                    timeout=_client_timeout(60)
+                )
+                chapters_by_book = _parse_chapter_infos(data, chunk) if data is not None else None
+                if chapters_by_book is None:
+                    print(f"⚠️ 获取章节信息失败: {data}")
+                    return {}
+                for chapters in chapters_by_book.values():
+                    # 添加"点评"特殊章节
+                    chapters.append(_review_chapter())
+                return chapters_by_book
+            except Exception as e:
+                print(f"❌ 获取章节信息失败: {e}")
+                return {}
+
+        result = {}
+        for chapters_by_book in await asyncio.gather(*(fetch_chunk(c) for c in chunks)):
+            result.update(chapters_by_book)
+        return result
+
+    async def chapters(self, book_id: str) -> List[Dict]:
+        """获取单本书的章节信息"""
+        return (await self.chapter_infos([book_id])).get(str(book_id), [])
+
+    async def reviews(self, book_id: str) -> List[Dict]:
+        """获取书籍的笔记列表"""
+        try:
+            data = await self._request_json(
+                'GET',
+                WEREAD_REVIEW_LIST_URL,
+                _build_api_headers,
+                params=_review_list_params(book_id)
+            )
+            if data is None:
+                return []
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return []
+            return _parse_review_list(data)
+        except Exception as e:
+            print(f"获取笔记列表失败: {e}")
+        return []
+
+    async def book_info(self, book_id: str) -> Optional[Dict]:
+        """获取书籍详细信息"""
+        try:
+            data = await self._request_json(
+                'GET',
+                WEREAD_BOOK_INFO,
+                _build_api_headers,
+                params={"bookId": book_id, "_": int(time.time() * 1000)}
+            )
+            if data is None:
+                return None
+            error = _api_error(data)
+            if error:
+                print(f"❌ API 返回错误: {error}")
+                return None
+            return data
+        except Exception as e:
+            print(f"获取书籍信息失败: {e}")
+        return None
+
+
+def _client_timeout(total: float):
+    """构造 aiohttp 超时对象（aiohttp 在 open() 中已确认可用）"""
+    import aiohttp
+    return aiohttp.ClientTimeout(total=total)
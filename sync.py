@@ -2,7 +2,21 @@
 主入口文件 - 用于启动同步任务
 保持根目录简洁，实际代码在src目录
 """
-from src.sync import main
+import argparse
+
+
+def main():
+    """解析命令行参数后再导入同步模块，--help 不需要加载任何依赖"""
+    argparse.ArgumentParser(
+        description="同步微信读书划线到 flomo（配置见 config.yaml 和 .env）"
+    ).parse_args()
+
+    from src.config_manager import load_environment
+    from src.sync import main as sync_main
+
+    load_environment()
+    sync_main()
+
 
 if __name__ == "__main__":
     main()
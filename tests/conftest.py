@@ -0,0 +1,7 @@
+"""
+测试公共配置：把项目根目录加入 sys.path，以 src.xxx 的方式导入模块
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+"""
+AIBatchEnricher 的缓存统计和缺失结果回退测试
+"""
+from types import SimpleNamespace
+
+from src.ai_batch import AIBatchEnricher
+from src.ai_cache import AIResponseCache
+
+
+class FakeTagGenerator:
+    provider = "openai"
+    api_key = "key"
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.calls = []
+
+    def is_enabled(self):
+        return True
+
+    def cache_key(self, book_title, text):
+        return f"tags:{text}"
+
+    def generate_tags(self, book_title, author, text):
+        self.calls.append(text)
+        return ["#逐条"]
+
+
+class FakeSummaryGenerator:
+    api_key = "key"
+    api_base = "https://example.invalid"
+    model = "model"
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.settings = SimpleNamespace(ai_batch_prompt="", ai_summary_prompt="")
+        self.calls = []
+
+    def is_enabled(self):
+        return True
+
+    def should_summarize(self, text):
+        return True
+
+    def cache_key(self, book_title, text):
+        return f"summary:{text}"
+
+    def generate_summary(self, text, book_title, author):
+        self.calls.append(text)
+        return "逐条摘要"
+
+
+def make_enricher(cache=None, fallback=True):
+    return AIBatchEnricher(FakeTagGenerator(cache), FakeSummaryGenerator(cache), batch_size=5, fallback=fallback)
+
+
+def test_empty_batch_fields_fall_back_to_single_calls(monkeypatch):
+    enricher = make_enricher()
+    monkeypatch.setattr(enricher, "_request_batch", lambda *args: {
+        0: {"tags": [], "summary": "批量摘要"},
+        1: {"tags": ["#批量"], "summary": ""},
+        2: {"tags": ["#批量"], "summary": "批量摘要"},
+    })
+
+    results = enricher.enrich("书", "作者", ["a", "b", "c", "d"])
+
+    assert results[0] == {"ai_tags": ["#逐条"], "ai_summary": "批量摘要"}
+    assert results[1] == {"ai_tags": ["#批量"], "ai_summary": "逐条摘要"}
+    assert results[2] == {"ai_tags": ["#批量"], "ai_summary": "批量摘要"}
+    assert results[3] == {"ai_tags": ["#逐条"], "ai_summary": "逐条摘要"}
+    assert enricher.tag_generator.calls == ["a", "d"]
+    assert enricher.summary_generator.calls == ["b", "d"]
+    assert enricher.fallback_items == 3
+
+
+def test_empty_batch_fields_kept_empty_without_fallback(monkeypatch):
+    enricher = make_enricher(fallback=False)
+    monkeypatch.setattr(enricher, "_request_batch", lambda *args: {0: {"tags": [], "summary": ""}})
+
+    assert enricher.enrich("书", "作者", ["a"]) == [{"ai_tags": [], "ai_summary": None}]
+    assert enricher.fallback_items == 0
+
+
+def test_cache_lookup_counts_once_per_field(tmp_path, monkeypatch):
+    cache = AIResponseCache(str(tmp_path))
+    try:
+        enricher = make_enricher(cache)
+        cache.set(enricher._batch_cache_key("tags", "书", "a"), ["#缓存"])
+        cache.set("summary:a", "缓存摘要")
+        monkeypatch.setattr(enricher, "_request_batch", lambda *args: {})
+
+        enricher.enrich("书", "作者", ["a", "b"])
+
+        # a 的标签命中批量键、摘要命中逐条键；b 的两项都未命中
+        assert (cache.hits, cache.misses) == (2, 2)
+    finally:
+        cache.close()
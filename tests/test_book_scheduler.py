@@ -0,0 +1,82 @@
+"""
+BookScheduler 的排序、配额分配和预筛选测试
+"""
+from src.book_scheduler import BookScheduler, prefilter_books
+
+
+def book(book_id, note_count, sort=0, title=""):
+    return {"bookId": book_id, "noteCount": note_count, "sort": sort, "book": {"title": title}}
+
+
+def test_greedy_fills_books_in_order():
+    books = [book("a", 10), book("b", 2), book("c", 10)]
+    scheduler = BookScheduler(allocation="greedy")
+
+    assert scheduler.allocate(books, {}, 12) == {"a": 10, "b": 2}
+    assert scheduler.allocate(books, {}, 5) == {"a": 5}
+
+
+def test_fair_redistributes_unused_share():
+    books = [book("a", 10), book("b", 2), book("c", 10)]
+    scheduler = BookScheduler(allocation="fair")
+
+    assert scheduler.allocate(books, {}, 12) == {"a": 5, "b": 2, "c": 5}
+
+
+def test_fair_gives_remainder_to_earlier_books():
+    books = [book("a", 10), book("b", 10), book("c", 10)]
+
+    assert BookScheduler(allocation="fair").allocate(books, {}, 5) == {"a": 2, "b": 2, "c": 1}
+
+
+def test_weighted_follows_weights():
+    books = [book("a", 10, title="重要"), book("b", 10), book("c", 10, title="忽略")]
+    weights = {"重要": 3.0, "忽略": 0.0}
+    scheduler = BookScheduler(
+        allocation="weighted",
+        weight_func=lambda b: weights.get(b["book"]["title"], 1.0)
+    )
+
+    assert scheduler.allocate(books, {}, 8) == {"a": 6, "b": 2}
+
+
+def test_allocation_respects_handled_counts():
+    books = [book("a", 5), book("b", 3)]
+    # b 的划线都已处理但仍是候选（有新的活动），按 1 条计算
+    handled = {"a": 2, "b": 3}
+
+    assert BookScheduler(allocation="fair").allocate(books, handled, 10) == {"a": 3, "b": 1}
+
+
+def test_allocate_without_quota_or_books():
+    scheduler = BookScheduler()
+
+    assert scheduler.allocate([book("a", 5)], {}, 0) == {}
+    assert scheduler.allocate([], {}, 10) == {}
+
+
+def test_recent_order_puts_pending_books_first():
+    books = [book("old", 5, sort=100), book("done", 3, sort=300), book("new", 5, sort=200)]
+
+    ordered = BookScheduler(order="recent").schedule(books, {"done": 3})
+    assert [b["bookId"] for b in ordered] == ["new", "old", "done"]
+
+    ordered = BookScheduler(order="api").schedule(books, {"done": 3})
+    assert [b["bookId"] for b in ordered] == ["old", "done", "new"]
+
+
+def test_prefilter_skips_books_without_new_highlights():
+    books = [
+        book("stale", 5, sort=50),
+        book("empty", 0, sort=500),
+        book("done", 3, sort=200),
+        book("active", 3, sort=400),
+        book("fresh", 2, sort=300),
+    ]
+    handled = {"done": 3, "active": 3}
+    last_handled_at = {"done": 250.0, "active": 350.0}
+
+    candidates, skipped = prefilter_books(books, handled, last_handled_at, cutoff=100)
+
+    assert [b["bookId"] for b in candidates] == ["active", "fresh"]
+    assert [b["bookId"] for b in skipped] == ["stale", "empty", "done"]
@@ -0,0 +1,62 @@
+"""
+ConfigSnapshot 与 ConfigManager 读取结果的一致性测试
+"""
+import pytest
+
+from src.config_manager import ConfigManager
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "\n".join([
+            "default_template: simple",
+            "templates:",
+            "  simple:",
+            "    format: '{highlight_text}'",
+            "  detailed:",
+            "    format: '{highlight_text} {tags}'",
+            "tags:",
+            "  max_ai_tags: 5",
+            "book_categories:",
+            "  tech:",
+            "    keywords: ['代码']",
+            "    tags: ['#技术']",
+            "    template: detailed",
+            "sync:",
+            "  schedule:",
+            "    weights:",
+            "      tech: 2",
+        ]),
+        encoding="utf-8"
+    )
+    return str(path)
+
+
+def test_snapshot_honours_env_overrides(monkeypatch, config_file):
+    monkeypatch.setenv("MAX_AI_TAGS", "2")
+    monkeypatch.setenv("MAX_RETRIES", "7")
+    monkeypatch.setenv("WEREAD_RATE_LIMIT", "1.5")
+    manager = ConfigManager(config_file)
+    snapshot = manager.snapshot
+
+    assert snapshot.max_ai_tags == int(manager.get_max_ai_tags()) == 2
+    assert snapshot.max_retries == int(manager.get_max_retries()) == 7
+    assert snapshot.weread_rate_limit == manager.get_rate_limit('weread', 3.0, 3) == (1.5, 3.0)
+
+
+def test_snapshot_book_lookups_match_manager(monkeypatch, config_file):
+    monkeypatch.delenv("DEFAULT_TEMPLATE", raising=False)
+    manager = ConfigManager(config_file)
+    snapshot = manager.snapshot
+
+    for title, author in [("代码大全", "麦康奈尔"), ("三体", "刘慈欣")]:
+        category = snapshot.book_category(title, author)
+        assert category == manager.get_book_category(title, author)
+        assert snapshot.book_weight(title, author) == manager.get_book_weight(title, author)
+        expected = manager.get_category_template(category) if category else manager.get_template()
+        assert snapshot.book_template(category) == expected
+
+    assert list(snapshot.category_tags["tech"]) == manager.get_category_tags("tech")
+    assert snapshot.template("missing") == manager.get_template("missing")
@@ -0,0 +1,130 @@
+"""
+FlomoClient 的重试和配额测试（用假的 session 代替网络请求）
+"""
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from src.flomo_client import FlomoClient
+from src.quota_ledger import QuotaLedger
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, text: str = "", retry_after: str = None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+
+class FakeSession:
+    """按顺序返回预设的结果：异常实例会被抛出，其余作为响应返回"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        pass
+
+
+def make_client(tmp_path, outcomes, max_retries=3, daily_limit=100):
+    ledger = QuotaLedger(str(tmp_path / "quota.json"), daily_limit)
+    client = FlomoClient(
+        api_url="https://flomo.test/iwh/x",
+        max_retries=max_retries,
+        backoff_factor=0,
+        quota_ledger=ledger
+    )
+    client.session = FakeSession(outcomes)
+    return client, ledger
+
+
+def refused():
+    """无法建立连接（请求没有发出）"""
+    return requests.ConnectionError(
+        MaxRetryError(None, "/iwh/x", reason=NewConnectionError(None, "Connection refused"))
+    )
+
+
+def test_connect_failures_retry_on_one_quota_slot(tmp_path):
+    client, ledger = make_client(tmp_path, [
+        requests.ConnectTimeout("connect timeout"),
+        refused(),
+        FakeResponse(200),
+    ])
+
+    assert client.send_memo("memo") is True
+    assert client.session.calls == 3
+    assert ledger.used() == 1
+
+
+def test_connect_failures_refund_quota(tmp_path):
+    client, ledger = make_client(tmp_path, [refused()] * 3, max_retries=2)
+
+    assert client.send_memo("memo") is False
+    assert client.last_error_retryable is True
+    assert client.session.calls == 3
+    assert ledger.used() == 0
+
+
+def test_rate_limited_retries_reserve_a_slot_per_request(tmp_path):
+    client, ledger = make_client(tmp_path, [
+        FakeResponse(429),
+        FakeResponse(503, retry_after="0"),
+        FakeResponse(200),
+    ])
+
+    assert client.send_memo("memo") is True
+    assert client.session.calls == 3
+    assert ledger.used() == 3
+
+
+def test_retry_stops_when_quota_runs_out(tmp_path):
+    client, ledger = make_client(tmp_path, [FakeResponse(429), FakeResponse(200)], daily_limit=1)
+
+    assert client.send_memo("memo") is False
+    assert client.session.calls == 1
+    assert client.last_error_retryable is True
+    assert ledger.used() == 1
+
+
+@pytest.mark.parametrize("outcome", [
+    requests.ReadTimeout("read timeout"),
+    requests.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError())),
+    FakeResponse(502, "bad gateway"),
+    FakeResponse(503, "unavailable"),
+])
+def test_possibly_delivered_memo_is_not_resent(tmp_path, outcome):
+    client, ledger = make_client(tmp_path, [outcome, FakeResponse(200)])
+
+    assert client.send_memo("memo") is False
+    assert client.session.calls == 1
+    assert client.last_error_retryable is False
+    assert ledger.used() == 1
+
+
+def test_non_retryable_error_stops_immediately(tmp_path):
+    client, ledger = make_client(tmp_path, [FakeResponse(400, "bad request")])
+
+    assert client.send_memo("memo") is False
+    assert client.last_error_retryable is False
+    assert client.session.calls == 1
+
+
+def test_exhausted_quota_does_not_send(tmp_path):
+    client, ledger = make_client(tmp_path, [FakeResponse(200)], daily_limit=0)
+
+    assert client.send_memo("memo") is False
+    assert client.last_error_retryable is True
+    assert client.session.calls == 0
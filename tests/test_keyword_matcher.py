@@ -0,0 +1,71 @@
+"""
+KeywordMatcher 与逐个关键词查找的结果一致性测试
+"""
+import random
+
+from src.config_manager import build_category_matcher
+from src.keyword_matcher import KeywordMatcher
+
+
+def naive_find_all(entries, text, ignore_case=True):
+    """逐个关键词用 in 查找（原来的实现方式）"""
+    if ignore_case:
+        text = text.lower()
+    values = []
+    for keyword, value in entries:
+        keyword = keyword.lower() if ignore_case else keyword
+        if keyword in text and value not in values:
+            values.append(value)
+    return values
+
+
+def test_overlapping_keywords_follow_priority():
+    entries = [("hers", 1), ("he", 2), ("she", 3), ("his", 4)]
+    matcher = KeywordMatcher(entries)
+
+    assert matcher.find_all("ushers") == [1, 2, 3]
+    assert matcher.first("ushers") == 1
+    assert matcher.first("this") == 4
+    assert matcher.first("xyz") is None
+
+
+def test_ignore_case():
+    entries = [("Python", "#编程")]
+
+    assert KeywordMatcher(entries).first("learning PYTHON") == "#编程"
+    assert KeywordMatcher(entries, ignore_case=False).first("learning PYTHON") is None
+
+
+def test_empty_keyword_always_matches():
+    matcher = KeywordMatcher([("心理", "#心理学"), ("", "#其他")])
+
+    assert matcher.find_all("随便一段文字") == ["#其他"]
+    assert matcher.find_all("心理学入门") == ["#心理学", "#其他"]
+
+
+def test_random_texts_match_naive_scan():
+    rng = random.Random(22)
+    alphabet = "abc心理思维"
+    for _ in range(200):
+        entries = [
+            ("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))), rng.randint(0, 5))
+            for _ in range(rng.randint(1, 8))
+        ]
+        matcher = KeywordMatcher(entries)
+        for _ in range(10):
+            text = "".join(rng.choice(alphabet + "AB ") for _ in range(rng.randint(0, 20)))
+            expected = naive_find_all(entries, text)
+            assert matcher.find_all(text) == expected
+            assert matcher.first(text) == (expected[0] if expected else None)
+
+
+def test_category_matcher_prefers_earlier_categories():
+    matcher = build_category_matcher({
+        "growth": {"keywords": ["习惯", "成长"]},
+        "tech": {"keywords": ["代码", "习惯"]},
+        "empty": None,
+    })
+
+    assert matcher.first("代码大全 史蒂夫") == "tech"
+    assert matcher.first("高效能人士的七个习惯 柯维") == "growth"
+    assert matcher.first("三体 刘慈欣") is None
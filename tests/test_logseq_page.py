@@ -0,0 +1,85 @@
+"""
+LogseqPage 的解析、序列化和增量合并测试
+"""
+from src.logseq_page import LogseqPage
+
+PAGE = "\n".join([
+    "title:: 思考，快与慢",
+    "作者:: [[丹尼尔·卡尼曼]]",
+    "",
+    "- [[简介]]",
+    "  heading:: true",
+    "\t- 一本关于认知偏差的书",
+    "- [[笔记]]",
+    "  heading:: true",
+    "  部分:: 笔记",
+    "\t- 第一章",
+    "\t  heading:: true",
+    "\t\t- 第一条划线",
+    "\t\t  划线id:: h1",
+    "\t\t- 我的想法",
+    "\t\t  想法id:: t1",
+    "\t- 第二章",
+    "\t  heading:: true",
+    "\t\t- 第二条划线",
+    "\t\t  划线id:: h2",
+    "-",
+    "",
+])
+
+
+def test_round_trip_keeps_page_unchanged():
+    page = LogseqPage(PAGE)
+
+    assert page.render() == PAGE
+    assert LogseqPage("").render() == ""
+
+
+def test_parse_collects_ids_and_chapters():
+    page = LogseqPage(PAGE)
+
+    assert page.highlight_ids == {"h1", "h2"}
+    assert page.thought_ids == {"t1"}
+    assert page.find_chapter("第一章") is not None
+    assert page.find_chapter("一本关于认知偏差的书") is None
+    assert len(page.sections) == 3
+
+
+def test_add_blocks_appends_to_existing_chapter():
+    page = LogseqPage(PAGE)
+    page.add_blocks("第一章", ["\t\t- 新划线\n\t\t  划线id:: h3"])
+
+    lines = page.render().split("\n")
+    assert lines.index("\t\t  划线id:: h3") == lines.index("\t- 第二章") - 1
+    assert "h3" in page.highlight_ids
+
+
+def test_new_chapter_goes_before_trailing_block():
+    page = LogseqPage(PAGE)
+    page.add_blocks("第三章", ["\t\t- 第三条划线\n\t\t  划线id:: h4"])
+
+    rendered = page.render()
+    assert rendered.endswith("\t- 第三章\n\t  heading:: true\n\t\t- 第三条划线\n\t\t  划线id:: h4\n-\n")
+    # 再次解析得到同样的结构
+    reparsed = LogseqPage(rendered)
+    assert reparsed.render() == rendered
+    assert reparsed.highlight_ids == {"h1", "h2", "h4"}
+    assert reparsed.find_chapter("第三章") is not None
+
+
+def test_missing_notes_section_is_created():
+    page = LogseqPage("title:: 书\n-\n")
+    page.add_blocks("第一章", ["\t\t- 划线\n\t\t  划线id:: h1"])
+
+    assert page.render() == "\n".join([
+        "title:: 书",
+        "- [[笔记]]",
+        "  heading:: true",
+        "  部分:: 笔记",
+        "\t- 第一章",
+        "\t  heading:: true",
+        "\t\t- 划线",
+        "\t\t  划线id:: h1",
+        "-",
+        "",
+    ])
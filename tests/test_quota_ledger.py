@@ -0,0 +1,88 @@
+"""
+QuotaLedger 的扣减、退还和北京时间零点切换测试
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from src import quota_ledger
+from src.quota_ledger import QuotaLedger
+
+
+class FakeClock:
+    """可以调整的 datetime.now（按 UTC 时间设置）"""
+
+    def __init__(self, utc: datetime):
+        self.utc = utc
+
+    def install(self, monkeypatch):
+        clock = self
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.utc.astimezone(tz) if tz else clock.utc
+
+        monkeypatch.setattr(quota_ledger, "datetime", FakeDatetime)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 北京时间 2026-03-01 23:59
+    fake = FakeClock(datetime(2026, 3, 1, 15, 59, tzinfo=timezone.utc))
+    fake.install(monkeypatch)
+    return fake
+
+
+def test_try_consume_stops_at_daily_limit(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.json"), daily_limit=3)
+
+    assert ledger.try_consume(2)
+    assert not ledger.try_consume(2)
+    assert ledger.try_consume()
+    assert not ledger.try_consume()
+    assert ledger.used() == 3
+    assert ledger.remaining() == 0
+
+
+def test_usage_shared_through_file(tmp_path):
+    path = str(tmp_path / "quota.json")
+    QuotaLedger(path, daily_limit=10).try_consume(4)
+
+    assert QuotaLedger(path, daily_limit=10).remaining() == 6
+
+
+def test_refund_returns_reserved_quota(tmp_path):
+    ledger = QuotaLedger(str(tmp_path / "quota.json"), daily_limit=5)
+    ledger.try_consume(3)
+
+    ledger.refund(date=ledger.today())
+    assert ledger.used() == 2
+
+    ledger.refund(10)
+    assert ledger.used() == 0
+
+
+def test_rollover_at_beijing_midnight(tmp_path, clock):
+    ledger = QuotaLedger(str(tmp_path / "quota.json"), daily_limit=2)
+    assert ledger.today() == "2026-03-01"
+    assert ledger.try_consume(2)
+    assert not ledger.try_consume()
+
+    # UTC 16:00 是北京时间次日零点
+    clock.utc = datetime(2026, 3, 1, 16, 0, tzinfo=timezone.utc)
+    assert ledger.today() == "2026-03-02"
+    assert ledger.used() == 0
+    assert ledger.try_consume()
+
+
+def test_refund_skipped_after_rollover(tmp_path, clock):
+    ledger = QuotaLedger(str(tmp_path / "quota.json"), daily_limit=5)
+    reserved_on = ledger.today()
+    ledger.try_consume()
+
+    clock.utc = datetime(2026, 3, 1, 16, 30, tzinfo=timezone.utc)
+    ledger.try_consume()
+    ledger.refund(date=reserved_on)
+
+    assert ledger.used() == 1
@@ -0,0 +1,174 @@
+"""
+SyncStateStore 的同步记录、旧版 JSON 迁移和发件箱测试
+"""
+import json
+
+import pytest
+
+from src.sync_state import SyncStateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    state = SyncStateStore(str(tmp_path / "sync_state.db"), checkpoint_every=2)
+    yield state
+    state.close()
+
+
+def write_legacy(path, synced_ids):
+    path.write_text(json.dumps({"synced_ids": synced_ids}), encoding="utf-8")
+
+
+def test_add_and_count(store):
+    store.add("b1", book_id="book-a")
+    store.add("b2", book_id="book-a")
+    store.add("b2", book_id="book-a")
+    store.add("b3", book_id="book-b")
+
+    assert "b1" in store
+    assert not store.is_synced("b1", target="logseq")
+    assert store.count() == 3
+    assert store.count(book_id="book-a") == 2
+
+
+def test_records_survive_reopen(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    store = SyncStateStore(path)
+    store.add("b1", book_id="book-a")
+    store.close()
+    store.close()
+
+    reopened = SyncStateStore(path)
+    try:
+        assert reopened.is_synced("b1")
+    finally:
+        reopened.close()
+
+
+def test_import_json_migrates_legacy_ids(tmp_path, store):
+    legacy = tmp_path / "synced_bookmarks.json"
+    write_legacy(legacy, ["b1", "b2", 3])
+    store.add("b1")
+
+    assert store.import_json(str(legacy)) == 2
+    assert store.is_synced("b2")
+    assert store.is_synced("3")
+    assert store.count() == 3
+
+
+def test_import_json_runs_once_per_content(tmp_path, store):
+    legacy = tmp_path / "synced_bookmarks.json"
+    write_legacy(legacy, ["b1"])
+
+    assert store.import_json(str(legacy)) == 1
+    assert store.import_json(str(legacy)) == 0
+
+    # 文件内容变了才会再导入
+    write_legacy(legacy, ["b1", "b2"])
+    assert store.import_json(str(legacy)) == 1
+
+
+def test_import_json_ignores_missing_or_broken_file(tmp_path, store):
+    assert store.import_json(str(tmp_path / "missing.json")) == 0
+
+    broken = tmp_path / "broken.json"
+    broken.write_text("{not json", encoding="utf-8")
+    assert store.import_json(str(broken)) == 0
+    assert store.get_meta("imported_json") is None
+
+
+def test_outbox_enqueue_and_mark_sent(store):
+    store.enqueue("b1", "memo 1", book_id="book-a", book_title="书", author="作者")
+    store.enqueue("b2", "memo 2", book_id="book-a", member_ids=["b3", "b4"])
+
+    assert store.is_queued("b1")
+    assert store.is_queued("b4")
+    assert store.outbox_count() == 2
+    assert store.handled_counts_by_book() == {"book-a": 4}
+
+    first, second = store.pending_outbox()
+    assert (first["bookmark_id"], first["content"], first["member_ids"]) == ("b1", "memo 1", [])
+    assert second["member_ids"] == ["b3", "b4"]
+
+    store.mark_sent(second)
+    assert store.outbox_count() == 1
+    assert not store.is_queued("b3")
+    assert all(store.is_synced(bookmark_id) for bookmark_id in ("b2", "b3", "b4"))
+    assert store.count(book_id="book-a") == 3
+
+
+def test_outbox_retryable_failure_stays_pending(store):
+    store.enqueue("b1", "memo")
+    item = store.pending_outbox()[0]
+
+    store.mark_failed(item, "timeout", retryable=True)
+    assert store.pending_outbox()[0]["attempts"] == 1
+
+    store.mark_failed(item, "bad request", retryable=False)
+    assert store.pending_outbox() == []
+    assert not store.is_queued("b1")
+    assert store.outbox_count(status="failed") == 1
+
+
+def test_outbox_requeue_replaces_entries_with_same_highlights(store):
+    store.enqueue("b1", "old", member_ids=["b2"])
+    store.enqueue("b2", "new")
+
+    items = store.pending_outbox()
+    assert [(item["bookmark_id"], item["content"]) for item in items] == [("b2", "new")]
+    assert not store.is_queued("b1")
+
+
+def test_prune_outbox_drops_only_expired_failures(store):
+    store.enqueue("b1", "secret memo", member_ids=["b2"])
+    store.enqueue("b3", "pending memo")
+    store.mark_failed(store.pending_outbox()[0], "bad request", retryable=False)
+
+    assert store.prune_outbox(max_age=3600) == 0
+    assert store.prune_outbox(max_age=-1) == 1
+    assert store.outbox_count(status="failed") == 0
+    assert [item["bookmark_id"] for item in store.pending_outbox()] == ["b3"]
+
+
+def test_close_removes_failed_memo_content_from_file(tmp_path):
+    path = tmp_path / "sync_state.db"
+    store = SyncStateStore(str(path))
+    store.enqueue("b1", "secret memo content")
+    store.mark_failed(store.pending_outbox()[0], "bad request", retryable=False)
+    store.prune_outbox(max_age=-1)
+    store.close()
+
+    assert b"secret memo content" not in path.read_bytes()
+
+
+def test_close_removes_sent_memo_content_from_file(tmp_path):
+    path = tmp_path / "sync_state.db"
+    store = SyncStateStore(str(path))
+    for index in range(50):
+        store.add(f"old{index}", book_id="book-a")
+    store.enqueue("b1", "sent memo content")
+    store.mark_sent(store.pending_outbox()[0])
+    store.close()
+
+    assert b"sent memo content" not in path.read_bytes()
+
+
+def test_book_categories_persist_until_config_changes(tmp_path):
+    path = str(tmp_path / "sync_state.db")
+    store = SyncStateStore(path)
+    assert store.load_book_categories("v1") == {}
+    store.save_book_category("代码大全", "麦康奈尔", "tech")
+    store.save_book_category("三体", "刘慈欣", None)
+    store.close()
+
+    reopened = SyncStateStore(path)
+    try:
+        assert reopened.load_book_categories("v1") == {
+            ("代码大全", "麦康奈尔"): "tech",
+            ("三体", "刘慈欣"): None,
+        }
+        # 分类配置变化后旧结果失效
+        assert reopened.load_book_categories("v2") == {}
+        assert reopened.load_book_categories("v1") == {}
+    finally:
+        reopened.close()
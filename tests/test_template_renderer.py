@@ -0,0 +1,63 @@
+"""
+CompiledTemplate 与逐行清理的渲染结果一致性测试
+"""
+import itertools
+import random
+
+import pytest
+
+from src import template_renderer
+from src.template_renderer import (
+    CompiledTemplate,
+    TEMPLATE_FIELDS,
+    _collapse_blank_lines,
+    load_templates,
+)
+
+VALUES = ["", "x", " ", "a b", "x\n", "\n", " \n", "l1\nl2", "l1\nl2\n", "💭 我的思考：想法\n"]
+PIECES = [
+    "{book_title}", "{author}", "{highlight_text}", "{note_section}", "{ai_summary_section}",
+    "{tags}", "\n", "\n\n", "  ", "- ", "> ", "文字", "{{x}}", " \n",
+]
+
+
+def reference_render(source: str, values) -> str:
+    """原来的渲染方式：format 后合并连续空行再去掉首尾空白"""
+    return _collapse_blank_lines(source.format_map(values)).strip()
+
+
+def test_builtin_templates_match_reference():
+    for template in load_templates().values():
+        for section_values in itertools.product(VALUES, repeat=2):
+            values = {field: "内容" for field in TEMPLATE_FIELDS}
+            values["note_section"], values["ai_summary_section"] = section_values
+            assert template.render(values) == reference_render(template.source, values)
+
+
+def test_random_templates_match_reference():
+    rng = random.Random(20)
+    for _ in range(500):
+        source = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 14)))
+        template = CompiledTemplate(source)
+        for _ in range(20):
+            values = {field: rng.choice(VALUES) for field in TEMPLATE_FIELDS}
+            assert template.render(values) == reference_render(source, values)
+
+
+def test_sections_use_fast_path(monkeypatch):
+    def fail(content):
+        raise AssertionError("不应逐行清理")
+
+    template = CompiledTemplate("{highlight_text}\n\n{note_section}\n{ai_summary_section}\n{tags}")
+    values = {field: "x" for field in TEMPLATE_FIELDS}
+    values["note_section"] = "💭 我的思考：想法\n"
+    values["ai_summary_section"] = ""
+    expected = reference_render(template.source, values)
+
+    monkeypatch.setattr(template_renderer, "_collapse_blank_lines", fail)
+    assert template.render(values) == expected
+
+
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError):
+        CompiledTemplate("{book_title} {unknown}", name="bad")
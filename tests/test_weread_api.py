@@ -0,0 +1,79 @@
+"""
+微信读书同步接口的会话预热重试测试（用假的 session 代替网络请求）
+"""
+import pytest
+
+from src import weread_api
+
+
+class FakeResponse:
+    def __init__(self, data, status_code: int = 200):
+        self._data = data
+        self.status_code = status_code
+        self.text = str(data)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """按顺序返回预设的响应，记录每次请求使用的 cookie"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.cookies = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.cookies.append(headers["Cookie"])
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def warmup(monkeypatch):
+    """预热一次得到一个新的 wr_skey"""
+    refreshed = []
+
+    def refresh():
+        refreshed.append(True)
+        return f"wr_skey=skey{len(refreshed)}"
+
+    monkeypatch.setattr(weread_api, "_refresh_session_cookie", refresh)
+    monkeypatch.setattr(weread_api, "_warmup", weread_api.SessionWarmup(ttl=3600))
+    return refreshed
+
+
+def use_session(monkeypatch, responses):
+    session = FakeSession(responses)
+    monkeypatch.setattr(weread_api, "get_session", lambda: session)
+    return session
+
+
+def test_notebooklist_rewarms_once_on_expired_session(monkeypatch, warmup):
+    session = use_session(monkeypatch, [
+        FakeResponse({"errCode": -2012, "errMsg": "登录超时"}),
+        FakeResponse({"books": [{"bookId": "1"}]}),
+    ])
+
+    assert weread_api.get_notebooklist() == [{"bookId": "1"}]
+    assert session.cookies == ["wr_skey=skey1", "wr_skey=skey2"]
+
+
+def test_notebooklist_auth_error_after_retry_returns_empty(monkeypatch, warmup):
+    use_session(monkeypatch, [FakeResponse({"errCode": -2012, "errMsg": "登录超时"})] * 2)
+
+    assert weread_api.get_notebooklist() == []
+    assert len(warmup) == 2
+
+
+def test_bookinfo_rewarms_once_on_expired_session(monkeypatch, warmup):
+    session = use_session(monkeypatch, [
+        FakeResponse({"errcode": -2010}, status_code=401),
+        FakeResponse({"bookId": "1", "title": "书"}),
+    ])
+
+    assert weread_api.get_bookinfo("1") == {"bookId": "1", "title": "书"}
+    assert len(session.cookies) == 2